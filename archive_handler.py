@@ -4,11 +4,20 @@ import zipfile
 import tarfile
 import gzip
 import shutil
-from pathlib import Path
-from typing import List
+from pathlib import Path, PurePosixPath
+from typing import IO, Iterator, List, Optional, Tuple
 
+from file_tree import VirtualFileTree
 
-def extract_archive(archive_path: str, extract_to_dir: str) -> Path:
+# 解析器实际会读取的文件类型；其余成员（图片、PDF、数据集等）在流式读取时直接跳过
+RELEVANT_SUFFIXES = ('.tex', '.bib', '.bbl')
+# 防御 zip 炸弹与恶意归档的限制
+MAX_MEMBER_BYTES = 20 * 1024 * 1024      # 单个文本成员解压后的最大字节数
+MAX_TOTAL_BYTES = 200 * 1024 * 1024      # 所有保留成员解压后的总字节数
+MAX_MEMBERS = 20000                      # 归档中允许的成员总数（包括被跳过的成员）
+
+
+def extract_archive(archive_path: str, extract_to_dir: str, clean: bool = False) -> Path:
     """
     解压指定的归档文件到目标目录。
     支持的格式: .zip, .tar, .gz, .tar.gz, .tgz, .tar.bz2, .tbz2
@@ -17,6 +26,7 @@ def extract_archive(archive_path: str, extract_to_dir: str) -> Path:
     Args:
         archive_path (str): 归档文件的路径。
         extract_to_dir (str): 解压到的目标目录路径。
+        clean (bool): 为 True 时先清空目标目录，避免上一次解压的残留文件混入本次项目。
 
     Returns:
         Path: 解压后目录的Path对象。
@@ -32,6 +42,8 @@ def extract_archive(archive_path: str, extract_to_dir: str) -> Path:
         raise FileNotFoundError(f"❌ 错误: 归档文件未找到: {archive_path}")
 
     print(f"--- 正在解压 '{archive_file.name}' 到 '{extract_path}'... ---")
+    if clean and extract_path.exists():
+        shutil.rmtree(extract_path)
     # 确保目标目录存在
     extract_path.mkdir(parents=True, exist_ok=True)
 
@@ -80,6 +92,124 @@ def extract_archive(archive_path: str, extract_to_dir: str) -> Path:
     return extract_path
 
 
+def _safe_member_path(name: str) -> Optional[PurePosixPath]:
+    """将成员名规范化为相对路径；绝对路径、盘符或包含 '..' 的路径（路径穿越）返回 None。"""
+    path = PurePosixPath(name.replace('\\', '/'))
+    if path.is_absolute() or '..' in path.parts or (path.parts and ':' in path.parts[0]):
+        return None
+    parts = [part for part in path.parts if part not in ('', '.')]
+    return PurePosixPath(*parts) if parts else None
+
+
+def _read_limited(stream: IO[bytes], name: str, limit: int) -> bytes:
+    """最多读取 limit 字节；超出时报错，而不是相信归档头中声明的大小。"""
+    data = stream.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f"归档成员 '{name}' 解压后超过 {limit} 字节的限制。")
+    return data
+
+
+def _iter_relevant_members(archive_file: Path, suffixes: Tuple[str, ...], max_member_bytes: int,
+                           max_members: int) -> Iterator[Tuple[str, bytes]]:
+    """
+    流式遍历归档，仅读取后缀在 suffixes 中的普通文件成员，产出 (相对路径, 原始字节)。
+    zip 只读取中央目录和相关成员；tar 以流模式顺序读取，不会把跳过的成员写入磁盘或内存。
+    """
+    file_name = archive_file.name
+
+    def _check_count(count: int) -> None:
+        if count > max_members:
+            raise ValueError(f"归档成员数超过 {max_members} 的限制。")
+
+    if file_name.endswith('.zip'):
+        with zipfile.ZipFile(archive_file, 'r') as zip_ref:
+            infos = zip_ref.infolist()
+            _check_count(len(infos))
+            for info in infos:
+                if info.is_dir() or not info.filename.lower().endswith(suffixes):
+                    continue
+                if (path := _safe_member_path(info.filename)) is None:
+                    print(f"   └── ⚠️ 跳过不安全的成员路径: {info.filename}")
+                    continue
+                if info.file_size > max_member_bytes:
+                    raise ValueError(f"归档成员 '{info.filename}' 声明的大小超过 {max_member_bytes} 字节的限制。")
+                with zip_ref.open(info) as member:
+                    yield path.as_posix(), _read_limited(member, info.filename, max_member_bytes)
+        return
+
+    if not file_name.endswith(('.tar.gz', '.tar', '.tgz', '.tar.bz2', '.tbz2', '.gz')):
+        raise ValueError(f"不支持的归档格式: '{archive_file.suffix}'")
+
+    count = 0
+    try:
+        # 'r|*' 为流模式：按顺序读取一次，自动识别 gzip/bzip2 压缩
+        with tarfile.open(archive_file, 'r|*') as tar_ref:
+            for member in tar_ref:
+                count += 1
+                _check_count(count)
+                # 只接受普通文件，符号链接、硬链接与设备文件一律跳过
+                if not member.isfile() or not member.name.lower().endswith(suffixes):
+                    continue
+                if (path := _safe_member_path(member.name)) is None:
+                    print(f"   └── ⚠️ 跳过不安全的成员路径: {member.name}")
+                    continue
+                if member.size > max_member_bytes:
+                    raise ValueError(f"归档成员 '{member.name}' 的大小超过 {max_member_bytes} 字节的限制。")
+                yield path.as_posix(), _read_limited(tar_ref.extractfile(member), member.name, max_member_bytes)
+    except tarfile.ReadError:
+        if count or not file_name.endswith('.gz') or file_name.endswith(('.tar.gz', '.tgz')):
+            raise
+        # 与 extract_archive 一致：不是 tar 归档的 .gz 视为单个压缩文件
+        output_filename = archive_file.stem
+        if output_filename.lower().endswith(suffixes):
+            with gzip.open(archive_file, 'rb') as f_in:
+                yield output_filename, _read_limited(f_in, output_filename, max_member_bytes)
+
+
+def load_archive_tree(archive_path: str, base_dir: str,
+                      suffixes: Tuple[str, ...] = RELEVANT_SUFFIXES,
+                      max_member_bytes: int = MAX_MEMBER_BYTES,
+                      max_total_bytes: int = MAX_TOTAL_BYTES,
+                      max_members: int = MAX_MEMBERS) -> VirtualFileTree:
+    """
+    以流式方式读取归档，只把相关的文本成员保存在内存中，不向磁盘写入任何文件。
+
+    Args:
+        archive_path (str): 归档文件的路径。
+        base_dir (str): 虚拟文件树名义上的根目录（用于日志与路径计算，不会被创建）。
+        suffixes (Tuple[str, ...]): 需要保留的文件后缀。
+        max_member_bytes (int): 单个成员解压后的最大字节数。
+        max_total_bytes (int): 所有保留成员解压后的总字节数上限。
+        max_members (int): 归档中允许的成员总数。
+
+    Returns:
+        VirtualFileTree: 由相关文本成员构成的虚拟文件树。
+
+    Raises:
+        FileNotFoundError: 如果归档文件不存在。
+        ValueError: 如果是不支持的归档格式，或超出了大小/数量限制。
+    """
+    archive_file = Path(archive_path)
+    if not archive_file.exists():
+        raise FileNotFoundError(f"❌ 错误: 归档文件未找到: {archive_path}")
+
+    print(f"--- 正在流式读取 '{archive_file.name}' 中的文本成员 ({', '.join(suffixes)})... ---")
+    tree = VirtualFileTree(Path(base_dir))
+    total_bytes = 0
+    try:
+        for relative_path, data in _iter_relevant_members(archive_file, suffixes, max_member_bytes, max_members):
+            total_bytes += len(data)
+            if total_bytes > max_total_bytes:
+                raise ValueError(f"相关成员解压后的总大小超过 {max_total_bytes} 字节的限制。")
+            tree.add(relative_path, data.decode('utf-8', errors='ignore'))
+    except Exception as e:
+        print(f"❌ 读取归档 '{archive_file.name}' 时发生错误: {e}")
+        raise
+
+    print(f"✅ 已载入 {len(tree)} 个文本文件（共 {total_bytes / 1024:.1f} KiB），未写入磁盘。")
+    return tree
+
+
 def list_files_recursive(directory: Path) -> List[str]:
     """
     递归地列出指定目录下的所有文件路径（相对于该目录）。
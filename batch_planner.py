@@ -0,0 +1,86 @@
+# batch_planner.py
+
+from typing import List, Dict, Any, Callable, Iterable, TypeVar
+
+T = TypeVar("T")
+
+# --- 输出 token 估算参数 ---
+# 每篇参考文献的固定输出开销（key、推断的作者/标题/来源等字段）
+OUTPUT_TOKENS_PER_REFERENCE = 120
+# 每处引用的输出开销（章节、前文、引文句、后文）
+OUTPUT_TOKENS_PER_CITATION = 160
+
+
+def plan_token_batches(items: Iterable[T],
+                       prompt_cost: Callable[[T], int],
+                       output_cost: Callable[[T], int],
+                       prompt_budget: int,
+                       output_budget: int,
+                       max_items: int) -> List[List[T]]:
+    """
+    按顺序贪心地将条目分组，使每组的估算输入与输出 token 都不超过预算。
+    单个条目即使超出预算也会独占一组，而不会被丢弃。
+
+    Args:
+        items (Iterable[T]): 待分组的条目，分组后保持原有顺序。
+        prompt_cost (Callable[[T], int]): 估算单个条目占用的输入 token 数。
+        output_cost (Callable[[T], int]): 估算单个条目产生的输出 token 数。
+        prompt_budget (int): 每个请求的输入 token 预算。
+        output_budget (int): 每个请求的输出 token 预算（应小于 max_tokens 并留有余量）。
+        max_items (int): 每个请求最多包含的条目数。
+
+    Returns:
+        List[List[T]]: 分组结果。
+    """
+    batches: List[List[T]] = []
+    current: List[T] = []
+    current_prompt, current_output = 0, 0
+    for item in items:
+        p_cost, o_cost = prompt_cost(item), output_cost(item)
+        if current and (len(current) >= max_items
+                        or current_prompt + p_cost > prompt_budget
+                        or current_output + o_cost > output_budget):
+            batches.append(current)
+            current, current_prompt, current_output = [], 0, 0
+        current.append(item)
+        current_prompt += p_cost
+        current_output += o_cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def estimate_extraction_output_tokens(citation_count: int) -> int:
+    """估算一篇参考文献的抽取结果所需的输出 token 数。"""
+    return OUTPUT_TOKENS_PER_REFERENCE + OUTPUT_TOKENS_PER_CITATION * max(citation_count, 1)
+
+
+def merge_analysis_results(chunks: Iterable[Dict[str, Any] | None]) -> Dict[str, Dict[str, Any]]:
+    """
+    将多个批次响应中的 analysis_results 按 key 合并。
+    同一个 key 出现在多个响应中时（例如被截断的批次经续写补全），citations 会去重后合并。
+
+    Returns:
+        Dict[str, Dict[str, Any]]: key -> 该参考文献的分析结果。
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for chunk in chunks:
+        if not chunk or not isinstance(results := chunk.get("analysis_results"), list):
+            continue
+        for result in results:
+            if not isinstance(result, dict) or not (key := result.get("key")):
+                continue
+            if key not in merged:
+                merged[key] = dict(result)
+                merged[key]["citations"] = list(result.get("citations") or [])
+                continue
+            existing = merged[key]
+            for field, value in result.items():
+                if field != "citations" and value and not existing.get(field):
+                    existing[field] = value
+            seen = {c.get("citation_sentence") for c in existing["citations"] if isinstance(c, dict)}
+            for citation in result.get("citations") or []:
+                if isinstance(citation, dict) and citation.get("citation_sentence") not in seen:
+                    existing["citations"].append(citation)
+                    seen.add(citation.get("citation_sentence"))
+    return merged
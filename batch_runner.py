@@ -0,0 +1,180 @@
+# batch_runner.py
+
+import os
+import re
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+from pathlib import Path
+from typing import List, Dict, Any
+
+from dotenv import load_dotenv
+
+import main
+import llm_agent
+import cache_handler
+import executors
+from incremental import ProjectManifest, default_project_id
+
+SUPPORTED_EXTENSIONS = ('.zip', '.tar', '.gz', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2')
+DEFAULT_OUTPUT_DIR = './batch_runs'
+SUMMARY_FILE_NAME = 'batch_summary.json'
+# 同时处理的归档数上限：限制同时打开的报告写入器、驻留内存的解析结果与在途论文数
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+
+def discover_archives(source: Path) -> List[Path]:
+    """
+    获取待处理的归档列表。
+
+    Args:
+        source (Path): 包含归档文件的目录，或一个清单文件。清单可以是 JSON 路径数组，
+            也可以是每行一个路径的文本文件（以 # 开头的行会被忽略）；相对路径相对于清单所在目录。
+
+    Returns:
+        List[Path]: 归档文件路径列表。
+    """
+    if source.is_dir():
+        return sorted(p for p in source.iterdir() if p.is_file() and p.name.endswith(SUPPORTED_EXTENSIONS))
+
+    text = source.read_text(encoding='utf-8')
+    try:
+        entries = json.loads(text)
+    except json.JSONDecodeError:
+        entries = [line.strip() for line in text.splitlines() if line.strip() and not line.strip().startswith('#')]
+    return [p if (p := Path(entry)).is_absolute() else source.parent / p for entry in entries]
+
+
+def _workspace_name(archive: Path, used_names: set) -> str:
+    """由归档文件名生成唯一的工作区目录名。"""
+    base = archive.name
+    for suffix in sorted(SUPPORTED_EXTENSIONS, key=len, reverse=True):
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+            break
+    base = re.sub(r'[^A-Za-z0-9._-]', '_', base) or 'archive'
+    name, counter = base, 1
+    while name in used_names:
+        counter += 1
+        name = f"{base}_{counter}"
+    used_names.add(name)
+    return name
+
+
+async def run_batch(archives: List[Path], output_dir: Path, workers: int, incremental: bool = False,
+                    concurrency: int = BATCH_CONCURRENCY) -> Dict[str, Any]:
+    """
+    批量分析多个归档。每个归档使用独立的工作区与报告路径；解压与项目解析在共享的 CPU 进程池中执行，
+    所有论文的 LLM 请求共用同一个 LLMAgent，因而共用同一个限流调度队列。
+    同时处理的归档数不超过 concurrency；增量模式下共用同一清单的修订版按顺序依次处理。
+    运行期间由 LoopLagMonitor 监视事件循环延迟，结果写入摘要的 loop_lag 字段。
+
+    Returns:
+        Dict[str, Any]: 批处理摘要（同时写入 output_dir/batch_summary.json）。
+    """
+    load_dotenv(".env")
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    if not api_key:
+        raise RuntimeError("错误：请在.env文件中设置DEEPSEEK_API_KEY。")
+
+    cache_handler.ensure_cache_dir_exists()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    agent = llm_agent.LLMAgent(api_key=api_key)
+    executors.CPU_EXECUTOR_WORKERS = workers
+    used_names: set = set()
+    jobs = [(archive, output_dir / _workspace_name(archive, used_names)) for archive in archives]
+    slots = asyncio.Semaphore(max(1, concurrency))
+    # 同一论文的不同修订版共用一个清单，并发读写会互相覆盖：按清单路径串行化
+    manifest_locks: Dict[Path, asyncio.Lock] = {}
+
+    def manifest_lock(archive: Path):
+        if not incremental:
+            return contextlib.nullcontext()
+        path = ProjectManifest(default_project_id(str(archive))).path
+        return manifest_locks.setdefault(path, asyncio.Lock())
+
+    async def process(archive: Path, workspace: Path) -> Dict[str, Any]:
+        # 先取清单锁再占用并发名额，等待同一清单的修订版不会空占名额
+        async with manifest_lock(archive):
+            async with slots:
+                return await process_archive(archive, workspace)
+
+    async def process_archive(archive: Path, workspace: Path) -> Dict[str, Any]:
+        extract_dir = workspace / 'data'
+        report_path = workspace / main.OUTPUT_HTML_FILE
+        started = time.perf_counter()
+        record = {"archive": str(archive), "workspace": str(workspace), "report": str(report_path)}
+        try:
+            # 各归档已在独立进程中解析，单个归档内部不再另开进程池
+            parser = await main.prepare_project_async(str(archive), str(extract_dir), 1)
+            record["parse_seconds"] = round(time.perf_counter() - started, 3)
+            record["summary"] = await main.analyze_prepared_project(
+                agent, str(archive), parser, str(report_path), incremental=incremental)
+            record["status"] = "ok"
+        except Exception as e:
+            print(f"❌ 分析 '{archive}' 时发生错误: {e}")
+            record["status"] = "failed"
+            record["error"] = str(e)
+        record["seconds"] = round(time.perf_counter() - started, 3)
+        return record
+
+    started = time.perf_counter()
+    try:
+        async with executors.LoopLagMonitor() as monitor:
+            records = await asyncio.gather(*(process(archive, workspace) for archive, workspace in jobs))
+    finally:
+        executors.shutdown_executors()
+        await agent.aclose()
+    elapsed = time.perf_counter() - started
+
+    scheduler_stats = agent.scheduler.stats()
+    total_tokens = scheduler_stats["prompt_tokens"] + scheduler_stats["completion_tokens"]
+    minutes = max(elapsed / 60.0, 1e-9)
+    succeeded = sum(1 for r in records if r["status"] == "ok")
+    summary = {
+        "papers": len(records),
+        "succeeded": succeeded,
+        "failed": len(records) - succeeded,
+        "elapsed_seconds": round(elapsed, 3),
+        "papers_per_minute": round(succeeded / minutes, 3),
+        "prompt_tokens": scheduler_stats["prompt_tokens"],
+        "completion_tokens": scheduler_stats["completion_tokens"],
+        "tokens_per_minute": round(total_tokens / minutes, 1),
+        "llm": scheduler_stats,
+        "loop_lag": monitor.stats(),
+        "results": records,
+    }
+    summary_path = output_dir / SUMMARY_FILE_NAME
+    summary_path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    print("\n" + "=" * 50)
+    print(f"批处理完成: {succeeded}/{len(records)} 篇论文成功，耗时 {elapsed:.1f}s")
+    print(f"吞吐量: {summary['papers_per_minute']} 篇/分钟，{summary['tokens_per_minute']} tokens/分钟")
+    print(monitor.describe())
+    print(f"摘要已保存至: {summary_path}")
+    print("=" * 50)
+    return summary
+
+
+def cli():
+    arg_parser = argparse.ArgumentParser(description="批量分析多个 LaTeX 项目归档。")
+    arg_parser.add_argument("source", help="包含归档文件的目录，或列出归档路径的清单文件（JSON 数组或每行一个路径）。")
+    arg_parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="各归档独立工作区与报告的根目录。")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="解压与解析使用的进程数。")
+    arg_parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="同时处理的归档数上限。")
+    arg_parser.add_argument("--incremental", action="store_true", help="对每个项目启用增量分析。")
+    args = arg_parser.parse_args()
+
+    archives = discover_archives(Path(args.source))
+    if not archives:
+        print(f"在 '{args.source}' 中没有找到任何归档文件。")
+        return
+    print(f"--- 共找到 {len(archives)} 个归档，使用 {args.workers} 个解析进程，同时处理 {args.concurrency} 个归档。 ---")
+    asyncio.run(run_batch(archives, Path(args.output_dir), args.workers, incremental=args.incremental,
+                          concurrency=args.concurrency))
+
+
+if __name__ == "__main__":
+    cli()
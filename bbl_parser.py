@@ -0,0 +1,173 @@
+# bbl_parser.py
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from latex_preprocessor import read_group
+
+_COMMENT = re.compile(r'(?<!\\)%.*$', re.MULTILINE)
+_BIBITEM = re.compile(r'\\bibitem(?![A-Za-z])')
+_BIBLATEX_ENTRY = re.compile(r'\\entry\s*\{(?P<key>[^{}]+)\}\s*\{(?P<type>[^{}]*)\}(?P<body>.*?)\\endentry', re.DOTALL)
+_NEWBLOCK = re.compile(r'\\newblock(?![A-Za-z])')
+_QUOTED_TITLE = re.compile(r"``(?P<title>.+?)(?:,|\.)?''", re.DOTALL)
+_EMPH = re.compile(r'\\emph\s*\{(?P<title>(?:[^{}]|\{[^{}]*\})+)\}|\{\\(?:em|it|itshape)\s+(?P<title2>(?:[^{}]|\{[^{}]*\})+)\}')
+_BIBINFO_TITLE = re.compile(r'\\bibinfo\s*\{title\}\s*(?=\{)')
+_BIBINFO_PERSON = re.compile(r'\\bibinfo\s*\{person\}\s*\{((?:[^{}]|\{[^{}]*\})*)\}')
+_BIBLATEX_TITLE = re.compile(r'\\field\s*\{title\}\s*(?=\{)')
+_BIBLATEX_FAMILY = re.compile(r'family=\{([^{}]*)\}')
+_BIBLATEX_GIVEN = re.compile(r'given=\{([^{}]*)\}')
+
+_LATEX_COMMAND = re.compile(r'\\[A-Za-z@]+\*?\s*')
+_WHITESPACE = re.compile(r'\s+')
+# 视为可信标题的最少字母数
+MIN_TITLE_LETTERS = 4
+
+
+def _to_plain_text(latex: str) -> str:
+    """将一小段 LaTeX 清理为纯文本：去掉命令与花括号，处理常见的转义与不换行空格。"""
+    text = latex.replace('~', ' ').replace('\\&', '&').replace('\\%', '%').replace('\\_', '_')
+    text = text.replace('--', '–').replace("``", '"').replace("''", '"')
+    text = _LATEX_COMMAND.sub('', text)
+    text = text.replace('{', '').replace('}', '').replace('\\', '')
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def _clean_title(latex: str) -> str:
+    return _to_plain_text(latex).strip(' .,;:"')
+
+
+def _is_confident_title(title: Optional[str]) -> bool:
+    return bool(title) and sum(c.isalpha() for c in title) >= MIN_TITLE_LETTERS
+
+
+def split_bibitems(text_block: str) -> List[str]:
+    """按 \\bibitem 切分 thebibliography/.bbl 文本；被 % 注释掉的条目会被忽略。"""
+    text = _COMMENT.sub('', text_block)
+    starts = [m.start() for m in _BIBITEM.finditer(text)]
+    items = []
+    for start, end in zip(starts, starts[1:] + [len(text)]):
+        item = text[start:end]
+        item = re.split(r'\\end\s*\{thebibliography\}', item)[0]
+        if item.strip():
+            items.append(item.rstrip())
+    return items
+
+
+def _read_label(text: str, pos: int) -> Tuple[Optional[str], int]:
+    """读取 \\bibitem 的可选标签 [..]（允许标签内含有花括号与方括号分组）。"""
+    while pos < len(text) and text[pos].isspace():
+        pos += 1
+    if pos >= len(text) or text[pos] != '[':
+        return None, pos
+    depth, i = 0, pos
+    while i < len(text):
+        char = text[i]
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif char == ']' and depth == 0:
+            return text[pos + 1:i], i + 1
+        i += 1
+    return None, pos
+
+
+def _extract_title(content: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    按风格特征推断标题与作者。依次尝试：ACM 的 \\bibinfo{title}、IEEE 的 ``引号标题''、
+    natbib/plain 的 \\newblock 分段（第二段为标题）、\\emph/\\em 强调的标题。
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: (标题, 作者)，无法推断时为 None。
+    """
+    blocks = _NEWBLOCK.split(content)
+    authors = _clean_title(blocks[0]) if len(blocks) > 1 else None
+
+    if (match := _BIBINFO_TITLE.search(content)) and (group := read_group(content, match.end())):
+        persons = [_to_plain_text(p) for p in _BIBINFO_PERSON.findall(content)]
+        return _clean_title(group[0]), ", ".join(persons) or None
+    if match := _QUOTED_TITLE.search(content):
+        quoted_authors = authors or _clean_title(content[:match.start()])
+        return _clean_title(match.group('title')), quoted_authors or None
+    if len(blocks) > 1:
+        return _clean_title(blocks[1]), authors
+    if match := _EMPH.search(content):
+        emph_authors = _clean_title(content[:match.start()])
+        return _clean_title(match.group('title') or match.group('title2')), emph_authors or None
+    return None, authors
+
+
+def parse_bibitem(item: str) -> Dict[str, Any]:
+    """
+    解析一个 \\bibitem 条目。
+
+    Returns:
+        Dict[str, Any]: 至少包含 key（可能为 None）与 content；
+        能够可靠推断标题时还包含 title 与 inferred_author，并设置 confident=True。
+    """
+    match = _BIBITEM.match(item)
+    pos = match.end() if match else 0
+    _, pos = _read_label(item, pos)
+    group = read_group(item, pos)
+    if group is None:
+        return {"key": None, "content": item, "confident": False}
+    key, pos = group[0].strip(), group[1]
+    content = item[pos:].strip()
+    title, authors = _extract_title(content)
+    result = {"key": key, "content": content, "confident": bool(key) and _is_confident_title(title)}
+    if result["confident"]:
+        result["title"] = title
+        if authors:
+            result["inferred_author"] = authors
+    return result
+
+
+def bibitem_key(item: str) -> Optional[str]:
+    """返回一个 \\bibitem 条目或 biblatex \\entry 块的引用键；无法识别时返回 None。"""
+    text = item.lstrip()
+    if match := _BIBLATEX_ENTRY.match(text):
+        return match.group('key').strip()
+    if not (match := _BIBITEM.match(text)):
+        return None
+    _, pos = _read_label(text, match.end())
+    group = read_group(text, pos)
+    return group[0].strip() if group else None
+
+
+def parse_biblatex_entries(text_block: str) -> List[Dict[str, Any]]:
+    """解析 biblatex 生成的 .bbl 中的 \\entry{key}{type}{...} ... \\endentry 块。"""
+    references = []
+    for match in _BIBLATEX_ENTRY.finditer(text_block):
+        body = match.group('body')
+        title = None
+        if (title_match := _BIBLATEX_TITLE.search(body)) and (group := read_group(body, title_match.end())):
+            title = _clean_title(group[0])
+        names = [f"{given} {family}".strip()
+                 for family, given in zip(_BIBLATEX_FAMILY.findall(body), _BIBLATEX_GIVEN.findall(body))]
+        reference = {"key": match.group('key').strip(), "content": match.group(0),
+                     "confident": _is_confident_title(title)}
+        if reference["confident"]:
+            reference["title"] = title
+            if names:
+                reference["inferred_author"] = _to_plain_text(" and ".join(names))
+        references.append(reference)
+    return references
+
+
+def parse_references_block(text_block: str) -> List[Dict[str, Any]]:
+    """
+    在本地解析 thebibliography 环境或 .bbl 文件（natbib/plain/IEEE/ACM 风格的 \\bibitem，或 biblatex 的 \\entry）。
+
+    Returns:
+        List[Dict[str, Any]]: 按原文顺序排列的条目。confident 为 False 的条目需要交由 LLM 解析，
+        其 content 为条目的完整原文（以 \\bibitem 开头）。
+    """
+    if _BIBLATEX_ENTRY.search(text_block):
+        return parse_biblatex_entries(text_block)
+    references = []
+    for item in split_bibitems(text_block):
+        parsed = parse_bibitem(item)
+        if not parsed["confident"]:
+            parsed["content"] = item
+        references.append(parsed)
+    return references
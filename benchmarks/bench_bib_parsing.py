@@ -0,0 +1,92 @@
+# benchmarks/bench_bib_parsing.py
+"""
+对比旧版 .bib 解析路径（bibtexparser.loads + 每条目 dumps）与 bib_reader 流式读取器的耗时。
+
+用法:
+    python benchmarks/bench_bib_parsing.py --entries 10000 --cited 300
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bib_reader import entry_to_reference, read_bib_entries  # noqa: E402
+
+
+def generate_bib(entries: int, seed: int = 0) -> str:
+    """生成一个包含 @string、crossref 与多种字段写法的合成 .bib 文件。"""
+    rng = random.Random(seed)
+    parts = ['@string{neurips = "Advances in Neural Information Processing Systems"}\n']
+    for i in range(entries):
+        authors = " and ".join(f"Author{rng.randint(0, 999)}, First{j}" for j in range(rng.randint(1, 6)))
+        words = " ".join(rng.choice(["Deep", "{L}earning", "Graph", "Attention", "Models", "of", "the"])
+                         for _ in range(rng.randint(4, 12)))
+        if i % 50 == 0:
+            parts.append(f"@proceedings{{proc{i},\n  title = {{Proceedings {i}}},\n  year = {2000 + i % 25}\n}}\n")
+            parts.append(f"@inproceedings{{key{i},\n  author = {{{authors}}},\n  title = {{{words}}},\n"
+                         f"  crossref = {{proc{i}}},\n  pages = {{{i}--{i + 10}}}\n}}\n")
+        else:
+            parts.append(f"@article{{key{i},\n  author = {{{authors}}},\n  title = \"{words}\",\n"
+                         f"  journal = neurips,\n  month = jan,\n  year = {2000 + i % 25},\n"
+                         f"  abstract = {{{' '.join(['lorem ipsum'] * rng.randint(10, 60))}}}\n}}\n")
+    return "".join(parts)
+
+
+def legacy_parse(text: str) -> list:
+    """旧版 latex_parser.parse_bib_files 的核心路径。"""
+    import bibtexparser
+    parser = bibtexparser.bparser.BibTexParser(common_strings=True)
+    db = bibtexparser.loads(text, parser=parser)
+    references = []
+    for entry in db.entries:
+        authors = re.sub(r'[\s\n]+', ' ', entry.get('author', '未知作者')).strip()
+        title = re.sub(r'[\s\n]+', ' ', entry.get('title', '无标题').replace('{', '').replace('}', '')).strip()
+        temp_db = bibtexparser.bibdatabase.BibDatabase()
+        temp_db.entries = [entry]
+        references.append({"key": entry.get('ID', 'N/A'), "inferred_title": title, "inferred_author": authors,
+                           "content": bibtexparser.dumps(temp_db)})
+    return references
+
+
+def _timed(label: str, func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<32} {best * 1000:10.1f} ms   ({len(result)} 条)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 .bib 解析路径的耗时。")
+    parser.add_argument("--entries", type=int, default=10000, help="合成 .bib 中的条目数")
+    parser.add_argument("--cited", type=int, default=300, help="正文中引用的条目数")
+    parser.add_argument("--repeat", type=int, default=3, help="每种路径的重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    text = generate_bib(args.entries)
+    cited = {f"key{i}" for i in random.Random(1).sample(range(args.entries), min(args.cited, args.entries))}
+    print(f"合成 .bib: {args.entries} 条，{len(text) / 1024 / 1024:.1f} MiB；引用 {len(cited)} 条\n")
+
+    results = {}
+    try:
+        results["legacy"] = _timed("bibtexparser (旧路径)", lambda: legacy_parse(text), args.repeat)
+    except ImportError:
+        print("未安装 bibtexparser，跳过旧路径。")
+    results["all"] = _timed("bib_reader (全部条目)",
+                            lambda: [entry_to_reference(e) for e in read_bib_entries([text])], args.repeat)
+    results["cited"] = _timed("bib_reader (仅被引用条目)",
+                              lambda: [entry_to_reference(e) for e in read_bib_entries([text], cited)], args.repeat)
+    if "legacy" in results:
+        print(f"\n加速比: 全部条目 {results['legacy'] / results['all']:.1f}x，"
+              f"仅被引用条目 {results['legacy'] / results['cited']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_loop_lag.py
+"""
+事件循环延迟基准：用 batch_runner 在本地替身 LLM 服务器上并发分析多篇合成论文，
+由 LoopLagMonitor 采样事件循环的唤醒延迟，验证解析与缓存 I/O 不会阻塞其他论文的 LLM 请求。
+最大延迟超过 --threshold 时以退出码 1 结束，便于在 CI 中作为回归检查。
+正式测量前先分析一篇小论文预热：openai SDK 在进程内首次请求时会惰性导入模块并构建 pydantic 模型，
+这是每个进程一次性的开销（约 100ms），不属于稳态下的事件循环阻塞。
+
+用法:
+    python benchmarks/bench_loop_lag.py --papers 4 --references 300 --threshold 0.1
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import batch_runner  # noqa: E402
+import cache_handler  # noqa: E402
+import executors  # noqa: E402
+import result_export  # noqa: E402
+from cache_backends import SQLiteCacheBackend  # noqa: E402
+from mock_llm_server import MockLLMServer  # noqa: E402
+from synthetic_project import generate_project, write_archive  # noqa: E402
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="并发分析多篇合成论文并测量事件循环延迟。")
+    parser.add_argument("--papers", type=int, default=4, help="并发分析的论文数")
+    parser.add_argument("--files", type=int, default=20, help="每篇论文的章节文件数")
+    parser.add_argument("--references", type=int, default=300, help="每篇论文的参考文献数")
+    parser.add_argument("--citations", type=int, default=5, help="每篇参考文献的引用次数")
+    parser.add_argument("--llm-fraction", type=float, default=0.2, help="需要 LLM 处理的参考文献比例")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="解析进程数")
+    parser.add_argument("--latency", type=float, default=0.05, help="替身服务器的每请求延迟（秒）")
+    parser.add_argument("--threshold", type=float, default=executors.LOOP_LAG_THRESHOLD,
+                        help="允许的最大事件循环延迟（秒）")
+    parser.add_argument("--no-warmup", action="store_true", help="跳过预热，把进程首次请求的一次性开销计入测量")
+    parser.add_argument("--verbose", action="store_true", help="显示流水线自身的输出")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    executors.LOOP_LAG_THRESHOLD = args.threshold
+    with tempfile.TemporaryDirectory(prefix="bench-loop-lag-") as tmp:
+        tmp_dir = Path(tmp)
+        archives = []
+        for i in range(args.papers):
+            # 不同的种子使各论文的内容与缓存键互不相同
+            project = generate_project(files=args.files, references=args.references, citations=args.citations,
+                                       bibliography="bib" if i % 2 == 0 else "thebibliography",
+                                       llm_fraction=args.llm_fraction, seed=i)
+            archives.append(write_archive(project, str(tmp_dir / f"paper{i}.tar.gz")))
+        cache_handler.set_backend(SQLiteCacheBackend(tmp_dir / "cache.sqlite3"))
+        result_export.RESULTS_STORE_FILE = str(tmp_dir / "results.sqlite3")
+        with MockLLMServer(latency=args.latency) as server:
+            os.environ["DEEPSEEK_API_BASE"] = server.url
+            os.environ["DEEPSEEK_API_KEY"] = "mock"
+            output = io.StringIO()
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else output):
+                if not args.no_warmup:
+                    warmup = generate_project(files=2, references=10, llm_fraction=0.5, seed=-1)
+                    warmup_archive = write_archive(warmup, str(tmp_dir / "warmup.tar.gz"))
+                    asyncio.run(batch_runner.run_batch([warmup_archive], tmp_dir / "warmup", 1))
+                summary = asyncio.run(batch_runner.run_batch(archives, tmp_dir / "runs", args.workers))
+
+    lag = summary["loop_lag"]
+    print(json.dumps({"papers": summary["papers"], "succeeded": summary["succeeded"],
+                      "elapsed_seconds": summary["elapsed_seconds"], "loop_lag": lag}, ensure_ascii=False, indent=2))
+    if summary["succeeded"] != summary["papers"] or lag["max_lag"] > args.threshold:
+        print(f"❌ 最大事件循环延迟 {lag['max_lag'] * 1000:.1f}ms 超过阈值 {args.threshold * 1000:.0f}ms，"
+              f"或有论文分析失败。")
+        sys.exit(1)
+    print(f"✅ 最大事件循环延迟 {lag['max_lag'] * 1000:.1f}ms，低于阈值 {args.threshold * 1000:.0f}ms。")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,206 @@
+# benchmarks/bench_pipeline.py
+"""
+端到端吞吐量基准：在本地替身 LLM 服务器上运行完整流水线，记录各阶段耗时。
+
+每个场景生成一个合成项目，在独立的临时目录与空缓存中运行 prepare_project + analyze_prepared_project，
+按阶段（extract / parse / normalize / bib / llm / render）统计耗时；结果写入 JSON 文件，
+可通过 --baseline 与之前的结果比较。场景可通过 "main" 覆盖 main 模块的配置常量（如 PROMPT_LAYOUT），
+并记录替身服务器报告的提示词 token 与前缀缓存命中 token。
+
+用法:
+    python benchmarks/bench_pipeline.py --references 300 --citations 5 --repeat 3
+    python benchmarks/bench_pipeline.py --scenarios llm-bib,flaky --baseline benchmarks/results/pipeline-old.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import cache_handler  # noqa: E402
+import llm_agent  # noqa: E402
+import main  # noqa: E402
+import result_export  # noqa: E402
+from cache_backends import SQLiteCacheBackend  # noqa: E402
+from llm_scheduler import LLMScheduler  # noqa: E402
+from mock_llm_server import MockLLMServer  # noqa: E402
+from synthetic_project import generate_project, write_archive  # noqa: E402
+
+DEFAULT_RESULTS_DIR = Path(__file__).resolve().parent / "results"
+STAGES = ("extract", "parse", "normalize", "bib", "llm", "render")
+
+# 场景: 项目参数、替身服务器参数、main 模块的配置覆盖，以及是否在同一缓存上再运行一次以测量缓存命中时的耗时
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "local-bib": {"project": {"bibliography": "bib", "llm_fraction": 0.0}, "server": {}, "warm": False},
+    "llm-bib": {"project": {"bibliography": "bib", "llm_fraction": 0.2}, "server": {}, "warm": True},
+    "llm-bib-prefix": {"project": {"bibliography": "bib", "llm_fraction": 0.2}, "server": {},
+                       "main": {"PROMPT_LAYOUT": "prefix"}, "warm": False},
+    "thebibliography": {"project": {"bibliography": "thebibliography", "llm_fraction": 0.2}, "server": {},
+                        "warm": True},
+    "flaky": {"project": {"bibliography": "bib", "llm_fraction": 0.2},
+              "server": {"error_rate": 0.1, "requests_per_minute": 300}, "warm": False},
+    "truncated": {"project": {"bibliography": "thebibliography", "llm_fraction": 0.2},
+                  "server": {"max_output_tokens": 1000}, "warm": False},
+}
+
+
+async def _run_once(archive: Path, workdir: Path, server_url: str, concurrency: int,
+                    parse_workers: int) -> Dict[str, Any]:
+    """运行一次完整流水线，返回各阶段耗时与 LLM 调度统计。"""
+    os.environ["DEEPSEEK_API_BASE"] = server_url
+    scheduler = LLMScheduler(max_concurrency=concurrency, max_retries=8, base_delay=0.05, max_delay=2.0)
+    agent = llm_agent.LLMAgent(api_key="mock", scheduler=scheduler)
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    try:
+        parser = main.prepare_project(str(archive), str(workdir / "data"), parse_workers, stage_timings=timings)
+        await main.analyze_prepared_project(agent, str(archive), parser, str(workdir / "report.html"),
+                                            stage_timings=timings)
+    finally:
+        await agent.aclose()
+    timings["total"] = time.perf_counter() - started
+    return {"timings": {name: round(value, 4) for name, value in timings.items()}, "llm": scheduler.stats()}
+
+
+def _fresh_cache(workdir: Path) -> None:
+    cache_handler.set_backend(SQLiteCacheBackend(workdir / "cache.sqlite3"))
+    cache_handler.reset_memory_tier()
+
+
+def _median_timings(runs: List[Dict[str, Any]]) -> Dict[str, float]:
+    names = [name for name in STAGES + ("total",) if any(name in run["timings"] for run in runs)]
+    return {name: round(statistics.median(run["timings"].get(name, 0.0) for run in runs), 4) for name in names}
+
+
+def run_scenario(name: str, scenario: Dict[str, Any], args) -> Dict[str, Any]:
+    """运行一个场景的全部重复，返回其配置、每次运行的结果与中位数。"""
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as tmp:
+        tmp_dir = Path(tmp)
+        project_config = dict(files=args.files, references=args.references, citations=args.citations,
+                              seed=args.seed, **scenario["project"])
+        archive = write_archive(generate_project(**project_config), str(tmp_dir / "project.tar.gz"))
+        server_config = dict(latency=args.latency, jitter=args.jitter, **scenario["server"])
+        cold_runs, warm_runs = [], []
+        overrides = scenario.get("main", {})
+        saved = {attr: getattr(main, attr) for attr in overrides}
+        with MockLLMServer(**server_config) as server:
+            for attr, value in overrides.items():
+                setattr(main, attr, value)
+            for i in range(args.repeat):
+                workdir = tmp_dir / f"run{i}"
+                workdir.mkdir()
+                _fresh_cache(workdir)
+                result_export.RESULTS_STORE_FILE = str(workdir / "results.sqlite3")
+                output = io.StringIO()
+                with contextlib.redirect_stdout(sys.stdout if args.verbose else output):
+                    cold_runs.append(asyncio.run(_run_once(archive, workdir, server.url, args.concurrency,
+                                                           args.parse_workers)))
+                    if scenario["warm"]:
+                        # 同一缓存上的第二次运行：LLM 结果全部命中缓存
+                        cache_handler.reset_memory_tier()
+                        warm_runs.append(asyncio.run(_run_once(archive, workdir, server.url, args.concurrency,
+                                                               args.parse_workers)))
+            server_stats = server.stats()
+            for attr, value in saved.items():
+                setattr(main, attr, value)
+    result = {"project": project_config, "server": server_config, "main": overrides, "runs": cold_runs,
+              "median": _median_timings(cold_runs), "mock_server": server_stats}
+    if warm_runs:
+        result["warm_runs"] = warm_runs
+        result["warm_median"] = _median_timings(warm_runs)
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _print_table(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    columns = STAGES + ("total",)
+    print(f"\n{'场景':<20}" + "".join(f"{c:>11}" for c in columns))
+    for name, result in results.items():
+        for label, medians in (("", result["median"]), (" (warm)", result.get("warm_median"))):
+            if not medians:
+                continue
+            print(f"{name + label:<20}" + "".join(f"{medians.get(c, 0.0) * 1000:>9.1f}ms" for c in columns))
+            base = baseline.get(name, {}).get("warm_median" if label else "median")
+            if base:
+                print(f"{'  vs baseline':<20}" + "".join(
+                    f"{medians.get(c, 0.0) / base[c]:>10.2f}x" if base.get(c) else f"{'-':>11}" for c in columns))
+    print(f"\n{'场景':<20}{'prompt tokens':>15}{'缓存命中':>12}{'命中率':>10}")
+    for name, result in results.items():
+        stats = result["mock_server"]
+        prompt_tokens, hit_tokens = stats.get("prompt_tokens", 0), stats.get("prompt_cache_hit_tokens", 0)
+        rate = f"{hit_tokens / prompt_tokens:.1%}" if prompt_tokens else "-"
+        print(f"{name:<20}{prompt_tokens:>15}{hit_tokens:>12}{rate:>10}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="在本地替身 LLM 服务器上运行端到端流水线基准。")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔的场景名")
+    parser.add_argument("--files", type=int, default=20, help="合成项目的章节文件数")
+    parser.add_argument("--references", type=int, default=300, help="合成项目的参考文献数")
+    parser.add_argument("--citations", type=int, default=5, help="每篇参考文献的引用次数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.05, help="替身服务器的每请求延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02, help="替身服务器的随机延迟上限（秒）")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM 调度器的并发上限")
+    parser.add_argument("--parse-workers", type=int, default=1, help="LaTeX 解析进程数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个场景的重复次数（报告中位数）")
+    parser.add_argument("--output", help="结果 JSON 路径；默认写入 benchmarks/results/pipeline-<时间>.json")
+    parser.add_argument("--baseline", help="用于比较的旧结果 JSON")
+    parser.add_argument("--verbose", action="store_true", help="显示流水线自身的输出")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # 解析器与 HTTP 客户端的 INFO 日志（每个文件、每个请求一行）会淹没结果表格
+        logging.getLogger().setLevel(logging.WARNING)
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}（可选: {', '.join(SCENARIOS)}）")
+
+    results = {}
+    for name in names:
+        print(f"--- 场景 {name} ---", flush=True)
+        results[name] = run_scenario(name, SCENARIOS[name], args)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "scenarios": results,
+    }
+    output = Path(args.output) if args.output else DEFAULT_RESULTS_DIR / f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    baseline = {}
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")).get("scenarios", {})
+    _print_table(results, baseline)
+    print(f"\n✅ 结果已保存至: {output}")
+
+
+if __name__ == "__main__":
+    main_cli()
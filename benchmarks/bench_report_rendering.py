@@ -0,0 +1,116 @@
+# benchmarks/bench_report_rendering.py
+"""
+对比旧版报告渲染（每处引用重新构建并编译正则、拼接 f-string）与 report_renderer 的耗时。
+
+用法:
+    python benchmarks/bench_report_rendering.py --references 1000 --citations 10
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import report_renderer  # noqa: E402
+from report_renderer import render_html_from_data  # noqa: E402
+
+
+def generate_report_data(references: int, citations: int, seed: int = 0) -> list:
+    """
+    生成合成的分析结果。与本地引用索引的输出一致：一句引文同时引用多篇文献时，
+    该句及其前后文会出现在每一篇被引文献的 citations 中；上下文中含有需要转义的字符。
+    """
+    rng = random.Random(seed)
+    keys = [f"author{i}:{2000 + i % 25}" for i in range(references)]
+    paragraphs = [f"Paragraph {p}: we compare <models> & baselines under the same budget; "
+                  f"results differ by {p % 10}% on average." for p in range(max(references // 2, 1))]
+    per_key = {key: [] for key in keys}
+    open_keys = list(keys)
+    while open_keys:
+        cited = rng.sample(open_keys, min(rng.randint(1, 4), len(open_keys)))
+        paragraph = rng.randrange(len(paragraphs))
+        citation = {
+            "section": f"Section {paragraph % 7}",
+            "pre_context": paragraphs[paragraph - 1],
+            "citation_sentence": f"Prior work \\citep[see][]{{{', '.join(cited)}}} reports <gains> of {paragraph}%.",
+            "post_context": paragraphs[(paragraph + 1) % len(paragraphs)],
+            "source_location": f"sections/s{paragraph % 7}.tex:{paragraph}",
+        }
+        for key in cited:
+            per_key[key].append(citation)
+            if len(per_key[key]) >= citations:
+                open_keys.remove(key)
+    return [{"id": i, "key": key, "inferred_title": f"Title {i}", "inferred_author": f"Author {i}",
+             "content": f"@article{{{key}, title={{Title {i}}}}}", "citations": per_key[key]}
+            for i, key in enumerate(keys, 1)]
+
+
+def legacy_render(all_references_data: list) -> str:
+    """旧版 main.render_html_from_data 的核心路径。"""
+    html_parts = []
+    sorted_data = sorted(all_references_data, key=lambda x: x.get('id', 0))
+    for item in sorted_data:
+        key = item.get("key", "N/A")
+        title = item.get("inferred_title", item.get("title", "N/A"))
+        author = item.get("inferred_author", "作者信息未提取")
+        source = item.get("inferred_source", item.get("content", ""))
+        item_html = f'<div class="reference-item"><h3>参考文献: <code>{key}</code></h3><blockquote><p><strong>作者:</strong> {author}</p><p><strong>标题:</strong> {title}</p><p><strong>来源:</strong> {source}</p></blockquote><h4>引用位置:</h4>'
+        if item.get("analysis_failed"):
+            item_html += '<p><em style="color: red;">此参考文献的上下文分析失败。</em></p>'
+        elif not item.get("citations"):
+            item_html += '<p><em>正文中未找到有效引用。</em></p>'
+        else:
+            item_html += '<ul>'
+            for i, citation in enumerate(item.get("citations", []), 1):
+                section = citation.get("section", "Unknown Section")
+                pre_context = citation.get("pre_context", "")
+                citation_sentence = citation.get("citation_sentence", "")
+                escaped_key = re.escape(key)
+                pattern = r'(\\(?:cite|citep|citet|autocite)\*?\{[^{}]*?' + escaped_key + r'[^}]*?\})'
+                citation_sentence_html = re.sub(pattern, r'<strong>\1</strong>', citation_sentence)
+                post_context = citation.get("post_context", "")
+                item_html += f'<li><strong>位置 {i}:</strong><ul class="citation-context"><li><strong>章节:</strong> {section}</li><li><strong>前文:</strong> {pre_context}</li><li><strong>引文句:</strong> {citation_sentence_html}</li><li><strong>后文:</strong> {post_context}</li></ul></li>'
+            item_html += '</ul>'
+        item_html += '</div>'
+        html_parts.append(item_html)
+    return "".join(html_parts)
+
+
+def _timed(label: str, func, repeat: int, before=None) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<32} {best * 1000:10.1f} ms   ({len(result) / 1024 / 1024:.1f} MiB)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比报告渲染路径的耗时。")
+    parser.add_argument("--references", type=int, default=1000, help="参考文献数")
+    parser.add_argument("--citations", type=int, default=10, help="每篇参考文献的引用数")
+    parser.add_argument("--repeat", type=int, default=5, help="每种路径的重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    data = generate_report_data(args.references, args.citations)
+    print(f"合成报告: {args.references} 条参考文献 × {args.citations} 处引用\n")
+
+    # re 模块自带的编译缓存只有 512 项，旧路径在上千个键时几乎每次都重新编译；这里同样在每轮前清空以反映冷启动
+    legacy = _timed("逐引用编译正则 (旧路径)", lambda: legacy_render(data), args.repeat, before=re.purge)
+    def clear_caches():
+        report_renderer._citation_segments.cache_clear()
+        report_renderer._escape_text.cache_clear()
+
+    cold = _timed("report_renderer (冷缓存)", lambda: render_html_from_data(data), args.repeat, before=clear_caches)
+    print(f"\n加速比: {legacy / cold:.1f}x（新路径同时对全部上下文做了 HTML 转义）")
+
+
+if __name__ == "__main__":
+    main()
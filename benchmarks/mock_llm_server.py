@@ -0,0 +1,370 @@
+# benchmarks/mock_llm_server.py
+"""
+本地的 OpenAI 兼容替身服务器，仅依赖标准库。
+按请求的系统提示词返回预制的 references / analysis_results JSON，可配置延迟、错误率与每分钟请求数限制，
+用于在没有真实 API key 的情况下测量流水线自身的开销以及检验并发与重试逻辑。
+同时模拟服务端的提示词前缀缓存：按固定大小的块对消息序列做累积哈希，
+与之前请求逐字节相同的前导块计为缓存命中，在 usage 中以 DeepSeek 与 OpenAI 两种字段返回。
+支持 stream=True 的 SSE 流式响应；超过 max_tokens（或服务器的 max_output_tokens）的响应按 finish_reason "length" 截断，
+续写请求中列出的已提取引文句不会再次返回；stall_rate 可让流式响应中途停止发送，用于检验空闲超时。
+
+用法:
+    python benchmarks/mock_llm_server.py --port 8765 --latency 0.2 --error-rate 0.05 --rpm 600
+    DEEPSEEK_API_BASE=http://127.0.0.1:8765 DEEPSEEK_API_KEY=mock python main.py
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+_BIBITEM = re.compile(r'\\bibitem(?![A-Za-z])\s*(?:\[[^\]]*\])?\s*\{([^{}]*)\}')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_SOURCE_BLOCK = re.compile(r'--- LaTeX源码开始 ---\n(.*)\n--- LaTeX源码结束 ---', re.DOTALL)
+_BATCH_BLOCK = re.compile(r'--- 参考文献批次开始 ---\n(.*)\n--- 参考文献批次结束 ---', re.DOTALL)
+_SECTION = re.compile(r'\\(?:sub)*section\*?\s*\{([^{}]*)\}')
+_EXTRACTED_BLOCK = re.compile(r'--- 已提取的引用开始 ---\n(.*)\n--- 已提取的引用结束 ---', re.DOTALL)
+# 流式响应中每个数据块携带的字符数（约 4 个 token）
+STREAM_CHUNK_CHARS = 16
+# 前缀缓存的块大小（字符数，约 64 token）；只有完整的块才会被缓存
+PREFIX_CACHE_BLOCK_CHARS = 256
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _prefix_block_hashes(messages: List[Dict[str, Any]]) -> List[str]:
+    """按 PREFIX_CACHE_BLOCK_CHARS 切分序列化后的消息序列，返回每个完整块处的累积前缀哈希。"""
+    text = "".join(f"{m.get('role', '')}\x00{m.get('content', '')}\x00" for m in messages)
+    digest, hashes = hashlib.sha1(), []
+    for start in range(0, len(text) - PREFIX_CACHE_BLOCK_CHARS + 1, PREFIX_CACHE_BLOCK_CHARS):
+        digest.update(text[start:start + PREFIX_CACHE_BLOCK_CHARS].encode('utf-8'))
+        hashes.append(digest.hexdigest())
+    return hashes
+
+
+def canned_references(user_content: str) -> Dict[str, Any]:
+    """按 \\bibitem 切分参考文献文本，返回与 LATEX_REFERENCE_PARSER_PROMPT 约定一致的 JSON。"""
+    matches = list(_BIBITEM.finditer(user_content))
+    references = []
+    for i, match in enumerate(matches, 1):
+        end = matches[i].start() if i < len(matches) else len(user_content)
+        content = user_content[match.end():end].split('--- 参考文献文本结束 ---')[0].strip()
+        parts = [p.strip() for p in content.split(',') if p.strip()]
+        title = parts[1] if len(parts) > 1 else "Title not found"
+        references.append({"id": i, "key": match.group(1).strip(), "content": content, "title": title})
+    return {"references": references}
+
+
+def _sentences_with_key(source: str, key: str) -> List[Tuple[str, str, str, str]]:
+    """返回源码中提到 key 的每个句子：(章节, 前文, 引文句, 后文)。"""
+    found = []
+    key_pattern = re.compile(r'[{,\s]' + re.escape(key) + r'[,}\s]')
+    section, sections = "Unknown Section", [(m.start(), m.group(1)) for m in _SECTION.finditer(source)]
+    for paragraph_start, paragraph in _iter_paragraphs(source):
+        if key not in paragraph:
+            continue
+        for start, title in sections:
+            if start <= paragraph_start:
+                section = title
+        sentences = _SENTENCE_END.split(paragraph.strip())
+        for i, sentence in enumerate(sentences):
+            if key_pattern.search(sentence):
+                found.append((section, sentences[i - 1] if i > 0 else "", sentence,
+                              sentences[i + 1] if i + 1 < len(sentences) else ""))
+    return found
+
+
+def _iter_paragraphs(source: str):
+    pos = 0
+    for block in re.split(r'\n\s*\n', source):
+        start = source.find(block, pos)
+        yield start, block
+        pos = start + len(block)
+
+
+def canned_analysis(user_content: str) -> Dict[str, Any]:
+    """解析用户消息中的源码与参考文献批次，为每篇文献返回在源码中提到它的句子。"""
+    source = (match.group(1) if (match := _SOURCE_BLOCK.search(user_content)) else user_content)
+    try:
+        batch = json.loads(match.group(1)) if (match := _BATCH_BLOCK.search(user_content)) else []
+    except json.JSONDecodeError:
+        batch = []
+    try:
+        extracted = json.loads(match.group(1)) if (match := _EXTRACTED_BLOCK.search(user_content)) else {}
+    except json.JSONDecodeError:
+        extracted = {}
+    results = []
+    for ref in batch:
+        key = ref.get("key", "")
+        skipped = set(extracted.get(key) or [])
+        citations = [{"section": section, "pre_context": pre, "citation_sentence": sentence, "post_context": post}
+                     for section, pre, sentence, post in _sentences_with_key(source, key) if sentence not in skipped]
+        results.append({"key": key, "inferred_author": "Mock Author", "inferred_title": ref.get("title", ""),
+                        "inferred_source": "Mock Venue", "citations": citations})
+    return {"analysis_results": results}
+
+
+class MockLLMServer:
+    """
+    在后台线程中运行的 OpenAI 兼容 /chat/completions 服务。
+
+    Args:
+        latency (float): 每个请求的固定延迟（秒）。
+        jitter (float): 在固定延迟上叠加的 [0, jitter) 均匀随机延迟。
+        token_latency (float): 每个输出 token 额外的生成耗时（秒），用于模拟长响应。
+        error_rate (float): 以该概率返回 500 错误。
+        requests_per_minute (int, optional): 超过该速率的请求返回 429 并附带 Retry-After。
+        max_output_tokens (int, optional): 服务端的输出 token 上限；与请求的 max_tokens 取较小者，超过时截断响应。
+        stall_rate (float): 流式响应以该概率在输出一半后停止发送（连接保持打开，直到服务器停止）。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, jitter: float = 0.0,
+                 token_latency: float = 0.0, error_rate: float = 0.0,
+                 requests_per_minute: Optional[int] = None, seed: int = 0,
+                 max_output_tokens: Optional[int] = None, stall_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.requests_per_minute = requests_per_minute
+        self.max_output_tokens = max_output_tokens
+        self.stall_rate = stall_rate
+        self._stopped = threading.Event()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent: deque = deque()
+        self.counters: Counter = Counter()
+        self._prefix_cache: set = set()
+        self._httpd = ThreadingHTTPServer((host, port), _MockHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """在当前线程中运行，直到被中断。"""
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    def should_stall(self) -> bool:
+        with self._lock:
+            if self.stall_rate and self._random.random() < self.stall_rate:
+                self.counters["stalled"] += 1
+                return True
+        return False
+
+    def admit(self) -> Tuple[Optional[int], float]:
+        """
+        决定一个请求的命运。
+
+        Returns:
+            Tuple[Optional[int], float]: (错误状态码或 None, 429 时建议的 Retry-After 秒数)。
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.counters["requests"] += 1
+            if self.requests_per_minute:
+                while self._recent and now - self._recent[0] >= 60.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.requests_per_minute:
+                    self.counters["rate_limited"] += 1
+                    return 429, 60.0 - (now - self._recent[0])
+                self._recent.append(now)
+            if self._random.random() < self.error_rate:
+                self.counters["server_errors"] += 1
+                return 500, 0.0
+            delay = self.latency + self._random.uniform(0, self.jitter) if self.jitter else self.latency
+        return None, delay
+
+    def respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """根据系统提示词选择预制响应，构造 chat.completion 对象。"""
+        messages = request.get("messages") or []
+        system_prompt = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        user_content = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        if '"analysis_results"' in system_prompt:
+            kind, payload = "extraction", canned_analysis(user_content)
+        elif '"references"' in system_prompt:
+            kind, payload = "reference_parser", canned_references(user_content)
+        else:
+            kind, payload = "other", {}
+        content = json.dumps(payload, ensure_ascii=False)
+        finish_reason = "stop"
+        limits = [limit for limit in (request.get("max_tokens"), self.max_output_tokens) if limit]
+        if limits and _estimate_tokens(content) > min(limits):
+            content, finish_reason = content[:min(limits) * 4], "length"
+        prompt_tokens = sum(_estimate_tokens(m.get("content", "")) for m in messages)
+        completion_tokens = _estimate_tokens(content)
+        block_hashes = _prefix_block_hashes(messages)
+        with self._lock:
+            hit_blocks = 0
+            for digest in block_hashes:
+                if digest not in self._prefix_cache:
+                    break
+                hit_blocks += 1
+            self._prefix_cache.update(block_hashes)
+            cached_tokens = min(prompt_tokens, hit_blocks * PREFIX_CACHE_BLOCK_CHARS // 4)
+            self.counters[kind] += 1
+            self.counters["prompt_tokens"] += prompt_tokens
+            self.counters["prompt_cache_hit_tokens"] += cached_tokens
+            self.counters["completion_tokens"] += completion_tokens
+            if finish_reason == "length":
+                self.counters["truncated"] += 1
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens,
+                      "prompt_cache_hit_tokens": cached_tokens,
+                      "prompt_cache_miss_tokens": prompt_tokens - cached_tokens,
+                      "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+        }
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        mock: MockLLMServer = self.server.mock
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        if not self.path.rstrip('/').endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        status, delay = mock.admit()
+        if status == 429:
+            self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit_error"}},
+                            {"Retry-After": f"{delay:.3f}"})
+            return
+        if status is not None:
+            self._send_json(status, {"error": {"message": "injected server error", "type": "server_error"}})
+            return
+        try:
+            request = json.loads(raw.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            self._send_json(400, {"error": {"message": "invalid JSON body"}})
+            return
+        response = mock.respond(request)
+        if request.get("stream"):
+            try:
+                self._send_stream(mock, request, response, delay)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 客户端因空闲超时等原因提前关闭了连接
+            return
+        time.sleep(delay + mock.token_latency * response["usage"]["completion_tokens"])
+        self._send_json(200, response)
+
+    def _send_stream(self, mock: MockLLMServer, request: Dict[str, Any], response: Dict[str, Any],
+                     delay: float) -> None:
+        """以 SSE（chat.completion.chunk）逐块发送响应；按 stream_options.include_usage 在最后附带用量。"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        base = {"id": response["id"], "object": "chat.completion.chunk", "created": response["created"],
+                "model": response["model"]}
+
+        def send(choices: List[Dict[str, Any]], usage: Optional[Dict[str, Any]] = None) -> None:
+            event = dict(base, choices=choices, **({"usage": usage} if usage else {}))
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        choice = response["choices"][0]
+        content = choice["message"]["content"]
+        pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+        stall_at = len(pieces) // 2 if mock.should_stall() else None
+        time.sleep(delay)
+        send([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for i, piece in enumerate(pieces):
+            if i == stall_at:
+                mock._stopped.wait()
+                return
+            if mock.token_latency:
+                time.sleep(mock.token_latency * _estimate_tokens(piece))
+            send([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        send([{"index": 0, "delta": {}, "finish_reason": choice["finish_reason"]}])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            send([], response["usage"])
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="运行本地的 OpenAI 兼容替身服务器。")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="叠加的随机延迟上限（秒）")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="每个输出 token 的生成耗时（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的概率")
+    parser.add_argument("--rpm", type=int, default=0, help="每分钟请求数上限（0 表示不限）")
+    parser.add_argument("--max-output-tokens", type=int, default=0, help="服务端的输出 token 上限（0 表示只按请求的 max_tokens）")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="流式响应中途停止发送的概率")
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.jitter, args.token_latency,
+                           args.error_rate, args.rpm or None, max_output_tokens=args.max_output_tokens or None,
+                           stall_rate=args.stall_rate)
+    print(f"✅ 替身服务器已启动: {server.url}（按 Ctrl+C 退出）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"统计: {server.stats()}")
+
+
+if __name__ == "__main__":
+    main()
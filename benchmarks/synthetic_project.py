@@ -0,0 +1,134 @@
+# benchmarks/synthetic_project.py
+"""
+合成 LaTeX 项目生成器：N 个章节文件、M 篇参考文献、每篇 K 处引用，打包为 .tar.gz 或 .zip 归档。
+
+一部分参考文献（llm_fraction）被有意设计为本地解析器无法处理、必须交给 LLM：
+正文中通过本地引用索引不认识的 \\citeA 引用（.bib 模式下这些条目只能经由 collect_cited_keys 的通用引用命令识别保留下来），
+在 thebibliography 模式下其 \\bibitem 也写成无法可靠推断标题的纯文本。
+
+用法:
+    python benchmarks/synthetic_project.py out.tar.gz --files 20 --references 300 --citations 5
+"""
+
+import argparse
+import io
+import random
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Dict
+
+_WORDS = ("model", "graph", "attention", "training", "dataset", "method", "baseline", "transformer",
+          "retrieval", "benchmark", "optimization", "representation", "inference", "robustness")
+
+
+def _sentence(rng: random.Random, citation: str = "") -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 20))]
+    words[0] = words[0].capitalize()
+    if citation:
+        words.insert(rng.randint(1, len(words)), citation)
+    return " ".join(words) + "."
+
+
+def generate_project(files: int = 10, references: int = 100, citations: int = 5,
+                     bibliography: str = "bib", llm_fraction: float = 0.0, seed: int = 0) -> Dict[str, str]:
+    """
+    生成一个合成的 LaTeX 项目。
+
+    Args:
+        files (int): 章节文件数（每个文件一个 \\section）。
+        references (int): 参考文献数。
+        citations (int): 每篇参考文献在正文中被引用的次数。
+        bibliography (str): "bib"（.bib 文件）或 "thebibliography"（写在主文件中的 \\bibitem 列表）。
+        llm_fraction (float): 需要交给 LLM 处理的参考文献比例。
+        seed (int): 随机种子，相同参数生成的项目完全相同。
+
+    Returns:
+        Dict[str, str]: 相对路径 -> 文件内容。
+    """
+    rng = random.Random(seed)
+    keys = [f"ref{i:05d}" for i in range(references)]
+    llm_keys = set(rng.sample(keys, int(round(references * llm_fraction))))
+
+    # 每个文件若干段落，每段 4-8 句；引用随机分散到各段落中，偶尔多个键合并为一个 \citep
+    paragraphs = [[[_sentence(rng) for _ in range(rng.randint(4, 8))] for _ in range(rng.randint(3, 8))]
+                  for _ in range(files)]
+    slots = [(f, p) for f in range(files) for p in range(len(paragraphs[f]))]
+    for key in keys:
+        for _ in range(citations):
+            f, p = rng.choice(slots)
+            sentences = paragraphs[f][p]
+            command = "\\citeA" if key in llm_keys else rng.choice(("\\cite", "\\citep", "\\citet"))
+            cited = [key]
+            if key not in llm_keys and rng.random() < 0.2:
+                cited.append(rng.choice(keys))
+                cited = [k for k in dict.fromkeys(cited) if k not in llm_keys]
+            sentences.insert(rng.randint(0, len(sentences)), _sentence(rng, f"{command}{{{','.join(cited)}}}"))
+
+    project: Dict[str, str] = {}
+    for f in range(files):
+        body = "\n\n".join(" ".join(sentences) for sentences in paragraphs[f])
+        project[f"sections/section{f:03d}.tex"] = f"\\section{{Section {f}}}\n\\label{{sec:{f}}}\n\n{body}\n"
+
+    inputs = "\n".join(f"\\input{{sections/section{f:03d}}}" for f in range(files))
+    if bibliography == "bib":
+        back_matter = f"\\bibliographystyle{{plain}}\n\\bibliography{{refs}}\n"
+        project["refs.bib"] = "\n".join(
+            f"@article{{{key},\n  author = {{Author{i}, First and Other{i}, Second}},\n"
+            f"  title = {{{_sentence(rng).rstrip('.')}}},\n  journal = {{Journal of Synthetic Results}},\n"
+            f"  year = {{{2000 + i % 25}}}\n}}\n" for i, key in enumerate(keys))
+    else:
+        items = []
+        for i, key in enumerate(keys):
+            title = _sentence(rng).rstrip('.')
+            if key in llm_keys:
+                items.append(f"\\bibitem{{{key}}} Author{i}, {title}, Synthetic Press, {2000 + i % 25}.")
+            else:
+                items.append(f"\\bibitem{{{key}}} F.~Author{i} and S.~Other{i}.\n\\newblock {title}.\n"
+                             f"\\newblock {{\\em Journal of Synthetic Results}}, {2000 + i % 25}.")
+        back_matter = "\\begin{thebibliography}{99}\n" + "\n\n".join(items) + "\n\\end{thebibliography}\n"
+
+    project["main.tex"] = (
+        "\\documentclass{article}\n\\usepackage{natbib}\n\\title{Synthetic Benchmark Paper}\n"
+        f"\\begin{{document}}\n\\maketitle\n{inputs}\n{back_matter}\\end{{document}}\n"
+    )
+    return project
+
+
+def write_archive(project: Dict[str, str], archive_path: str) -> Path:
+    """将项目写为 .zip 或 .tar.gz 归档（按扩展名判断）。"""
+    path = Path(archive_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".zip":
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, content in project.items():
+                archive.writestr(name, content)
+    else:
+        with tarfile.open(path, "w:gz") as archive:
+            for name, content in project.items():
+                data = content.encode("utf-8")
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成的 LaTeX 项目归档。")
+    parser.add_argument("output", help="输出归档路径（.tar.gz 或 .zip）")
+    parser.add_argument("--files", type=int, default=10, help="章节文件数")
+    parser.add_argument("--references", type=int, default=100, help="参考文献数")
+    parser.add_argument("--citations", type=int, default=5, help="每篇参考文献的引用次数")
+    parser.add_argument("--bibliography", choices=("bib", "thebibliography"), default="bib")
+    parser.add_argument("--llm-fraction", type=float, default=0.0, help="需要 LLM 处理的参考文献比例")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    project = generate_project(args.files, args.references, args.citations, args.bibliography,
+                               args.llm_fraction, args.seed)
+    path = write_archive(project, args.output)
+    print(f"✅ 已生成 {len(project)} 个文件: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# bib_reader.py
+
+import re
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+# 与 bibtexparser 的 common_strings=True 一致的预定义字符串（月份缩写）
+COMMON_STRINGS = {
+    'jan': 'January', 'feb': 'February', 'mar': 'March', 'apr': 'April', 'may': 'May', 'jun': 'June',
+    'jul': 'July', 'aug': 'August', 'sep': 'September', 'oct': 'October', 'nov': 'November', 'dec': 'December',
+}
+# 不产生参考文献条目的特殊块
+_NON_ENTRY_TYPES = {'comment', 'preamble', 'string'}
+
+_ENTRY_HEAD = re.compile(r'@\s*(?P<type>[A-Za-z]+)\s*(?P<open>[{(])')
+_BRACES = re.compile(r'[{}]')
+_FIELD_NAME = re.compile(r'\s*,?\s*(?P<name>[A-Za-z][\w:.+-]*)\s*=\s*')
+_BARE_VALUE = re.compile(r'[^\s,#})]+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class RawBibEntry(NamedTuple):
+    """.bib 文件中的一个块：类型、键（@string 等为空）以及它在文件中的原始文本。"""
+    entry_type: str
+    key: str
+    raw: str
+    body_start: int
+
+
+def _match_brace(text: str, open_pos: int) -> int:
+    """返回与 open_pos 处的 '{' 匹配的 '}' 之后的位置；没有匹配时返回文本末尾。"""
+    depth = 0
+    for match in _BRACES.finditer(text, open_pos):
+        if match.group() == '{':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    return len(text)
+
+
+def iter_raw_entries(text: str) -> Iterator[RawBibEntry]:
+    """
+    流式切分 .bib 文本：只定位每个块的边界与键，不解析字段。
+    对于未被引用的条目，这是唯一需要付出的代价。
+    """
+    pos = 0
+    while (head := _ENTRY_HEAD.search(text, pos)) is not None:
+        entry_type = head.group('type').lower()
+        open_pos = head.end() - 1
+        if head.group('open') == '{':
+            end = _match_brace(text, open_pos)
+        else:
+            end = text.find(')', open_pos)
+            end = len(text) if end < 0 else end + 1
+            # 括号定界的块中可能含有 ')'（如字段值中），退回到下一个 '@' 之前
+            if (next_head := _ENTRY_HEAD.search(text, open_pos + 1)) is not None and next_head.start() < end:
+                end = next_head.start()
+        key = ''
+        body_start = open_pos + 1
+        if entry_type not in _NON_ENTRY_TYPES:
+            comma = text.find(',', body_start, end)
+            key_end = comma if comma >= 0 else end - 1
+            key = text[body_start:key_end].strip()
+            body_start = key_end
+        yield RawBibEntry(entry_type, key, text[head.start():end], body_start - head.start())
+        pos = end
+
+
+def _read_value(text: str, pos: int, strings: Dict[str, str]) -> Tuple[str, int]:
+    """读取一个字段值（支持 {..}、"..."、数字、@string 宏以及 # 拼接），返回 (值, 结束位置)。"""
+    parts = []
+    while True:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos >= len(text):
+            break
+        char = text[pos]
+        if char == '{':
+            end = _match_brace(text, pos)
+            parts.append(text[pos + 1:end - 1])
+            pos = end
+        elif char == '"':
+            depth, i = 0, pos + 1
+            while i < len(text):
+                c = text[i]
+                if c == '\\':
+                    i += 2
+                    continue
+                if c == '{':
+                    depth += 1
+                elif c == '}':
+                    depth -= 1
+                elif c == '"' and depth == 0:
+                    break
+                i += 1
+            parts.append(text[pos + 1:i])
+            pos = i + 1
+        else:
+            match = _BARE_VALUE.match(text, pos)
+            if not match:
+                break
+            token = match.group()
+            parts.append(token if token.isdigit() else strings.get(token.lower(), token))
+            pos = match.end()
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos < len(text) and text[pos] == '#':
+            pos += 1
+            continue
+        break
+    return "".join(parts), pos
+
+
+def parse_fields(raw: str, body_start: int, strings: Dict[str, str]) -> Dict[str, str]:
+    """解析一个条目的字段（字段名统一为小写）。"""
+    fields = {}
+    pos = body_start
+    while (match := _FIELD_NAME.match(raw, pos)) is not None:
+        value, pos = _read_value(raw, match.end(), strings)
+        fields[match.group('name').lower()] = value
+    return fields
+
+
+class BibEntry(NamedTuple):
+    entry_type: str
+    key: str
+    fields: Dict[str, str]
+    raw: str
+
+
+def read_bib_entries(texts: List[str], cited_keys: Optional[Set[str]] = None) -> List[BibEntry]:
+    """
+    从多个 .bib 文本中读取参考文献条目。
+
+    Args:
+        texts (List[str]): 按顺序排列的 .bib 文件内容；重复的键以首次出现的为准。
+        cited_keys (Set[str], optional): 仅解析这些键对应的条目（及其 crossref 的父条目）；None 表示全部解析。
+
+    Returns:
+        List[BibEntry]: 按文件中出现顺序排列的条目，raw 为条目在文件中的原始文本。
+    """
+    strings = dict(COMMON_STRINGS)
+    raw_entries: Dict[str, RawBibEntry] = {}
+    order: List[str] = []
+    for text in texts:
+        for entry in iter_raw_entries(text):
+            if entry.entry_type == 'string':
+                # @string 需要按出现顺序解析，后面的定义可以引用前面的
+                strings.update(parse_fields(entry.raw, entry.body_start, strings))
+            elif entry.key and entry.key not in raw_entries:
+                raw_entries[entry.key] = entry
+                order.append(entry.key)
+
+    wanted = order if cited_keys is None else [key for key in order if key in cited_keys]
+    parsed: Dict[str, Dict[str, str]] = {}
+
+    def fields_of(key: str) -> Dict[str, str]:
+        if key not in parsed:
+            entry = raw_entries[key]
+            parsed[key] = parse_fields(entry.raw, entry.body_start, strings)
+        return parsed[key]
+
+    result = []
+    for key in wanted:
+        fields = dict(fields_of(key))
+        parent_key = fields.get('crossref') or fields.get('xdata')
+        if parent_key and parent_key in raw_entries and parent_key != key:
+            parent_fields = fields_of(parent_key)
+            for name, value in parent_fields.items():
+                fields.setdefault(name, value)
+            # biblatex 的继承规则：父条目的 title 作为子条目的 booktitle
+            if 'title' in parent_fields:
+                fields.setdefault('booktitle', parent_fields['title'])
+        result.append(BibEntry(raw_entries[key].entry_type, key, fields, raw_entries[key].raw))
+    return result
+
+
+def entry_to_reference(entry: BibEntry) -> Dict[str, str]:
+    """将条目转换为分析流程使用的参考文献字典（content 保留条目的原始文本）。"""
+    authors = _WHITESPACE.sub(' ', entry.fields.get('author', '未知作者')).strip()
+    title = _WHITESPACE.sub(' ', entry.fields.get('title', '无标题').replace('{', '').replace('}', '')).strip()
+    return {"key": entry.key, "inferred_title": title, "inferred_author": authors, "content": entry.raw}
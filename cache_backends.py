@@ -0,0 +1,295 @@
+# cache_backends.py
+
+import asyncio
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_NAMESPACE = "default"
+# SQLite 后端访问时间的精度（秒）：距上次记录不足该时长的命中不再更新 accessed_at，命中因而只是一次读取
+ACCESS_TIME_RESOLUTION = 60.0
+# 累积到这么多条访问时间更新后合并为一个事务写入
+ACCESS_TIME_BATCH_SIZE = 256
+
+
+class CacheBackend(abc.ABC):
+    """缓存后端的基类。所有后端都以 (key -> JSON 可序列化数据) 的形式存储，namespace 仅用于统计与淘汰。"""
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0, "writes": 0})
+
+    @abc.abstractmethod
+    def get(self, key: str, namespace: str = DEFAULT_NAMESPACE) -> Optional[Any]:
+        """返回键对应的数据；不存在或读取失败时返回 None。"""
+
+    @abc.abstractmethod
+    def set(self, key: str, data: Any, namespace: str = DEFAULT_NAMESPACE) -> None:
+        """写入键对应的数据（覆盖已有条目）。"""
+
+    def evict(self) -> int:
+        """按后端策略淘汰过期或超额的条目，返回淘汰的条目数。"""
+        return 0
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """返回按 namespace 分组的统计信息。"""
+        return {ns: dict(counters) for ns, counters in self._counters.items()}
+
+    def flush(self) -> None:
+        """写出尚未持久化的簿记信息（如 SQLite 后端累积的访问时间）。"""
+
+    def close(self) -> None:
+        pass
+
+    def _count(self, namespace: str, field: str) -> None:
+        self._counters[namespace][field] += 1
+
+
+class JsonDirCacheBackend(CacheBackend):
+    """旧版后端：每个键一个 JSON 文件。写入通过临时文件 + os.replace 保证原子性。"""
+
+    def __init__(self, cache_dir: Path):
+        super().__init__()
+        self.cache_dir = Path(cache_dir)
+
+    def get(self, key: str, namespace: str = DEFAULT_NAMESPACE) -> Optional[Any]:
+        cache_file = self.cache_dir / f"{key}.json"
+        if not cache_file.exists():
+            self._count(namespace, "misses")
+            return None
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._count(namespace, "hits")
+            return data
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"   └── 缓存读取错误: {e}，将忽略缓存。")
+            self._count(namespace, "misses")
+            return None
+
+    def set(self, key: str, data: Any, namespace: str = DEFAULT_NAMESPACE) -> None:
+        cache_file = self.cache_dir / f"{key}.json"
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_file, cache_file)
+        self._count(namespace, "writes")
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    基于 SQLite (WAL 模式) 的缓存后端。
+    值以紧凑 JSON + zlib 压缩的形式存储；每次写入都是一个事务，因此不会出现写到一半的条目。
+    支持按存活时间与总大小进行 LRU 淘汰。
+    命中时的访问时间更新按 touch_interval 限频，并在内存中累积后批量写入，避免每次命中都变成一个写事务。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY,
+            namespace TEXT NOT NULL,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries (accessed_at);
+        CREATE INDEX IF NOT EXISTS idx_cache_entries_namespace ON cache_entries (namespace);
+    """
+
+    def __init__(self, db_path: Path, max_bytes: Optional[int] = None, max_age_seconds: Optional[float] = None,
+                 evict_every: int = 500, touch_interval: float = ACCESS_TIME_RESOLUTION):
+        super().__init__()
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.evict_every = evict_every
+        self.touch_interval = touch_interval
+        self._writes_since_evict = 0
+        self._pending_touches: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+
+    @staticmethod
+    def _encode(data: Any) -> bytes:
+        return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    @staticmethod
+    def _decode(blob: bytes) -> Any:
+        return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+    def get(self, key: str, namespace: str = DEFAULT_NAMESPACE) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, accessed_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count(namespace, "misses")
+                return None
+            now = time.time()
+            if now - row[1] >= self.touch_interval:
+                self._pending_touches[key] = now
+                if len(self._pending_touches) >= ACCESS_TIME_BATCH_SIZE:
+                    self._flush_touches()
+        try:
+            data = self._decode(row[0])
+        except (zlib.error, json.JSONDecodeError, UnicodeDecodeError) as e:
+            print(f"   └── 缓存读取错误: {e}，将忽略缓存。")
+            self._count(namespace, "misses")
+            return None
+        self._count(namespace, "hits")
+        return data
+
+    def set(self, key: str, data: Any, namespace: str = DEFAULT_NAMESPACE) -> None:
+        blob = self._encode(data)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, namespace, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, namespace, blob, len(blob), now, now))
+            self._pending_touches.pop(key, None)
+            self._flush_touches()
+            self._writes_since_evict += 1
+            should_evict = self._writes_since_evict >= self.evict_every
+        self._count(namespace, "writes")
+        if should_evict:
+            self.evict()
+
+    def _flush_touches(self) -> None:
+        """将累积的访问时间更新合并为一个事务写入（调用方需持有 self._lock）。"""
+        if not self._pending_touches:
+            return
+        touches = [(accessed_at, key) for key, accessed_at in self._pending_touches.items()]
+        self._pending_touches.clear()
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", touches)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_touches()
+
+    def evict(self) -> int:
+        evicted = 0
+        with self._lock:
+            self._writes_since_evict = 0
+            # 淘汰依据 accessed_at，先写入累积的访问时间
+            self._flush_touches()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.max_age_seconds:
+                    cursor = self._conn.execute("DELETE FROM cache_entries WHERE accessed_at < ?",
+                                                (time.time() - self.max_age_seconds,))
+                    evicted += cursor.rowcount
+                if self.max_bytes:
+                    total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+                    if total > self.max_bytes:
+                        # 按最近访问时间从旧到新删除，直到总大小回到上限以内
+                        excess, victims = total - self.max_bytes, []
+                        for key, size in self._conn.execute(
+                                "SELECT key, size FROM cache_entries ORDER BY accessed_at ASC"):
+                            if excess <= 0:
+                                break
+                            victims.append((key,))
+                            excess -= size
+                        self._conn.executemany("DELETE FROM cache_entries WHERE key = ?", victims)
+                        evicted += len(victims)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return evicted
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        result = super().stats()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries GROUP BY namespace").fetchall()
+        for namespace, entries, size in rows:
+            ns_stats = result.setdefault(namespace, {"hits": 0, "misses": 0, "writes": 0})
+            ns_stats["entries"] = entries
+            ns_stats["bytes"] = size
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_touches()
+            self._conn.close()
+
+
+class MemoryCacheTier:
+    """
+    位于磁盘缓存之前的进程内 LRU 缓存层，并提供 single-flight 请求合并：
+    同一个键在计算期间（如正在等待 LLM 响应）的并发请求会等待同一个结果，而不是各自重新计算。
+    条目以紧凑 JSON 保存，每次读取（以及每个等待者）都得到一份独立的副本，与从磁盘读取的结果一致：
+    调用方随后修改结果（如为参考文献编号、写入分析结果）不会影响缓存中的条目或其他调用方。
+    该类只应在事件循环线程中使用。
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, List[asyncio.Future]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return json.loads(self._entries[key])
+        self.misses += 1
+        return None
+
+    def put(self, key: str, data: Any) -> None:
+        self._put_serialized(key, json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+
+    def _put_serialized(self, key: str, serialized: str) -> None:
+        self._entries[key] = serialized
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def begin_flight(self, key: str) -> Optional[asyncio.Future]:
+        """
+        声明即将计算某个键。
+
+        Returns:
+            Optional[asyncio.Future]: 若已有其他任务在计算该键，返回该调用方专属的 Future，调用方应等待它
+            （取消它不影响其他等待者）；否则返回 None，表示调用方负责计算，并且必须在完成后调用 finish_flight。
+        """
+        if (waiters := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            future = asyncio.get_running_loop().create_future()
+            waiters.append(future)
+            return future
+        self._inflight[key] = []
+        return None
+
+    def finish_flight(self, key: str, data: Any) -> None:
+        """结束对某个键的计算，以结果的独立副本唤醒所有等待者。data 为 None 表示计算失败。"""
+        serialized = None
+        if data is not None:
+            serialized = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+            self._put_serialized(key, serialized)
+        for future in self._inflight.pop(key, []):
+            if not future.done():
+                future.set_result(None if serialized is None else json.loads(serialized))
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                "entries": len(self._entries), "in_flight": len(self._inflight)}
@@ -1,9 +1,75 @@
-import json
+import os
+import argparse
+import atexit
 import hashlib
+import functools
 from pathlib import Path
 from typing import Optional, Any
 
+import executors
+import tracing
+from cache_backends import CacheBackend, JsonDirCacheBackend, SQLiteCacheBackend, MemoryCacheTier, DEFAULT_NAMESPACE
+
 CACHE_DIR = Path(".cache")
+# 缓存后端: "sqlite"（默认）或 "json"（每键一个文件）
+# 缓存键已改为由 make_cache_key 按 namespace 与各部分摘要生成，旧版 .cache/*.json 中的条目不会再被命中，可直接删除
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")
+SQLITE_CACHE_FILE = CACHE_DIR / "cache.sqlite3"
+# LRU 淘汰上限：总大小（字节）与最长未访问时间（天）；设为 0 表示不限制
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+CACHE_MAX_AGE_DAYS = float(os.getenv("CACHE_MAX_AGE_DAYS", "90"))
+# 进程内 LRU 缓存层最多保留的条目数
+MEMORY_CACHE_MAX_ENTRIES = int(os.getenv("MEMORY_CACHE_MAX_ENTRIES", "4096"))
+
+_backend: Optional[CacheBackend] = None
+_memory_tier = MemoryCacheTier(MEMORY_CACHE_MAX_ENTRIES)
+
+
+def _create_backend() -> CacheBackend:
+    if CACHE_BACKEND == "json":
+        return JsonDirCacheBackend(CACHE_DIR)
+    return SQLiteCacheBackend(SQLITE_CACHE_FILE,
+                              max_bytes=CACHE_MAX_BYTES or None,
+                              max_age_seconds=CACHE_MAX_AGE_DAYS * 86400 or None)
+
+
+def get_backend() -> CacheBackend:
+    """返回当前进程使用的缓存后端，首次调用时按配置创建。"""
+    global _backend
+    if _backend is None:
+        ensure_cache_dir_exists()
+        _backend = _create_backend()
+    return _backend
+
+
+def set_backend(backend: CacheBackend):
+    """替换当前进程使用的缓存后端（例如在测试或批处理中指定独立的数据库）。"""
+    global _backend
+    _backend = backend
+
+
+@atexit.register
+def _flush_backend():
+    # 命中时的访问时间在后端中批量累积，进程退出前写出尚未持久化的部分
+    if _backend is not None:
+        _backend.flush()
+
+
+def reopen_after_fork():
+    """
+    在 fork 出的子进程中调用：重新打开从父进程继承的 SQLite 连接（连接与锁不能跨进程共用），并丢弃内存缓存层。
+    """
+    global _backend
+    if isinstance(_backend, SQLiteCacheBackend):
+        _backend = SQLiteCacheBackend(_backend.db_path, max_bytes=_backend.max_bytes,
+                                      max_age_seconds=_backend.max_age_seconds)
+    reset_memory_tier()
+
+
+def reset_memory_tier(max_entries: int = MEMORY_CACHE_MAX_ENTRIES):
+    """丢弃进程内缓存层并新建一个空的（例如在基准测试的各轮之间隔离缓存）。"""
+    global _memory_tier
+    _memory_tier = MemoryCacheTier(max_entries)
 
 def ensure_cache_dir_exists():
     """确保缓存目录存在。"""
@@ -13,25 +79,116 @@ def get_cache_key(data: str) -> str:
     """根据输入数据的UTF-8编码计算SHA256哈希值作为缓存键。"""
     return hashlib.sha256(data.encode('utf-8')).hexdigest()
 
-def get_from_cache(key: str) -> Optional[Any]:
-    """根据键从缓存中获取数据。如果缓存不存在或读取失败，则返回None。"""
-    cache_file = CACHE_DIR / f"{key}.json"
-    if cache_file.exists():
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                print(f"   └── 命中缓存: {key[:10]}...")
-                return json.load(f)
-        except (IOError, json.JSONDecodeError) as e:
-            print(f"   └── 缓存读取错误: {e}，将忽略缓存。")
-            return None
-    return None
-
-def set_to_cache(key: str, data: Any):
-    """将数据存入缓存。"""
-    cache_file = CACHE_DIR / f"{key}.json"
+@functools.lru_cache(maxsize=8)
+def content_digest(text: str) -> str:
+    """
+    计算文本内容的 SHA256 摘要。
+    结果按字符串的值缓存：内容相同的字符串再次调用时只做一次字典查找（同一字符串对象的哈希值由解释器缓存，
+    内容相同的另一个对象仍需重新计算 Python 哈希并逐字节比较），不再计算 SHA256。
+    缓存会持有被哈希的字符串，因此只保留最近的少数几份，避免多份大文本常驻内存。
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def make_cache_key(namespace: str, *digests: str) -> str:
+    """
+    由命名空间（包含提示词与模型版本）和若干内容摘要组合出缓存键。
+    各部分都是定长摘要，因此组合键的计算成本与原始内容大小无关。
+    """
+    return hashlib.sha256("\0".join((namespace,) + digests).encode('utf-8')).hexdigest()
+
+def get_from_cache(key: str, namespace: str = DEFAULT_NAMESPACE) -> Optional[Any]:
+    """根据键从缓存中获取数据（先查进程内缓存，再查磁盘）。如果缓存不存在或读取失败，则返回None。"""
+    if (data := _memory_tier.get(key)) is not None:
+        tracing.count("cache_hits")
+        return data
     try:
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-            print(f"   └── 已写入缓存: {key[:10]}...")
-    except IOError as e:
-        print(f"   └── 缓存写入错误: {e}")
\ No newline at end of file
+        data = get_backend().get(key, namespace)
+    except Exception as e:
+        print(f"   └── 缓存读取错误: {e}，将忽略缓存。")
+        return None
+    if data is not None:
+        _memory_tier.put(key, data)
+        tracing.count("cache_hits")
+        tracing.detail(f"   └── 命中缓存: {key[:10]}...")
+    else:
+        tracing.count("cache_misses")
+    return data
+
+def set_to_cache(key: str, data: Any, namespace: str = DEFAULT_NAMESPACE):
+    """将数据存入缓存（同时写入进程内缓存与磁盘）。"""
+    _memory_tier.put(key, data)
+    try:
+        get_backend().set(key, data, namespace)
+        tracing.detail(f"   └── 已写入缓存: {key[:10]}...")
+    except Exception as e:
+        print(f"   └── 缓存写入错误: {e}")
+
+def get_from_memory(key: str) -> Optional[Any]:
+    """只查询进程内缓存层，不做磁盘 I/O，可以直接在事件循环中调用。"""
+    if (data := _memory_tier.get(key)) is not None:
+        tracing.count("cache_hits")
+    return data
+
+async def aget_from_backend(key: str, namespace: str = DEFAULT_NAMESPACE) -> Optional[Any]:
+    """在 I/O 线程池中查询磁盘缓存（不阻塞事件循环）；命中时同时填充进程内缓存层。"""
+    try:
+        data = await executors.run_in_thread(get_backend().get, key, namespace)
+    except Exception as e:
+        print(f"   └── 缓存读取错误: {e}，将忽略缓存。")
+        return None
+    if data is not None:
+        _memory_tier.put(key, data)
+        tracing.count("cache_hits")
+        tracing.detail(f"   └── 命中缓存: {key[:10]}...")
+    else:
+        tracing.count("cache_misses")
+    return data
+
+async def aget_from_cache(key: str, namespace: str = DEFAULT_NAMESPACE) -> Optional[Any]:
+    """get_from_cache 的异步版本：先查进程内缓存，再在 I/O 线程池中查询磁盘。"""
+    if (data := get_from_memory(key)) is not None:
+        return data
+    return await aget_from_backend(key, namespace)
+
+async def aset_to_cache(key: str, data: Any, namespace: str = DEFAULT_NAMESPACE):
+    """set_to_cache 的异步版本：进程内缓存立即更新，磁盘写入在 I/O 线程池中执行。"""
+    _memory_tier.put(key, data)
+    try:
+        await executors.run_in_thread(get_backend().set, key, data, namespace)
+        tracing.detail(f"   └── 已写入缓存: {key[:10]}...")
+    except Exception as e:
+        print(f"   └── 缓存写入错误: {e}")
+
+def begin_flight(key: str):
+    """声明即将计算某个缓存键，详见 MemoryCacheTier.begin_flight。"""
+    return _memory_tier.begin_flight(key)
+
+def finish_flight(key: str, data: Any):
+    """结束对某个缓存键的计算并唤醒等待者；data 为 None 表示计算失败（不会写入缓存）。"""
+    _memory_tier.finish_flight(key, data)
+
+def cache_stats() -> dict:
+    """返回按 namespace 分组的缓存统计（命中、未命中、写入、条目数与占用字节）。"""
+    return get_backend().stats()
+
+def memory_stats() -> dict:
+    """返回进程内缓存层的统计（命中、未命中、合并的并发请求数）。"""
+    return _memory_tier.stats()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="管理 LLM 响应缓存。")
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="显示按 namespace 分组的缓存统计。")
+    subparsers.add_parser("evict", help="立即执行一次按大小/时间的 LRU 淘汰。")
+    args = arg_parser.parse_args()
+
+    if args.command == "stats":
+        for namespace, ns_stats in sorted(cache_stats().items()):
+            print(f"{namespace}: {ns_stats}")
+    elif args.command == "evict":
+        print(f"✅ 已淘汰 {get_backend().evict()} 条缓存。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+# citation_locator.py
+
+import bisect
+import re
+from typing import List, Dict, Any, Optional, Iterable, Set
+
+# --- 配置 ---
+# 所有被视为"正文引用"的命令名（不含反斜杠）。首字母大写的变体（如 \Citet）会自动加入。
+CITATION_COMMANDS = (
+    'cite', 'citep', 'citet', 'citealp', 'citealt', 'citeauthor', 'citeyear', 'citeyearpar',
+    'autocite', 'parencite', 'textcite', 'footcite', 'smartcite', 'supercite',
+)
+SECTION_COMMANDS = ('chapter', 'section', 'subsection', 'subsubsection')
+UNKNOWN_SECTION = "Unknown Section"
+
+# 句末缩写：这些词后面的句点不视为句子结束。
+_ABBREVIATIONS = {
+    'al', 'e.g', 'i.e', 'etc', 'vs', 'cf', 'fig', 'figs', 'eq', 'eqs', 'sec', 'secs',
+    'tab', 'ref', 'refs', 'resp', 'approx', 'no', 'vol', 'pp', 'ch', 'dr', 'mr', 'ms', 'prof',
+}
+
+
+def build_citation_pattern(commands: Iterable[str] = CITATION_COMMANDS) -> str:
+    """
+    构建匹配引用命令的正则表达式片段。
+    支持星号变体、最多两个可选参数以及一个包含多个键的必选参数，
+    例如 \\citep*[see][p.~3]{a, b}。
+    """
+    names = set()
+    for name in commands:
+        names.add(name)
+        names.add(name[0].upper() + name[1:])
+    alternation = "|".join(sorted((re.escape(n) for n in names), key=len, reverse=True))
+    return (r'\\(?P<cite_cmd>' + alternation + r')(?![a-zA-Z])\*?'
+            r'(?:\s*\[[^\]]*\]){0,2}\s*\{(?P<cite_keys>[^{}]*)\}')
+
+
+def _build_token_regex(commands: Iterable[str]) -> re.Pattern:
+    """将章节标题、段落分隔与引用命令合并为一个正则，以便单次扫描全文。"""
+    section_names = "|".join(SECTION_COMMANDS)
+    return re.compile(
+        r'(?P<section>\\(?P<section_cmd>' + section_names + r')\*?\s*(?:\[[^\]]*\])?\s*'
+        r'\{(?P<section_title>(?:[^{}]|\{[^{}]*\})*)\})'
+        r'|(?P<abstract>\\begin\{abstract\})'
+        r'|(?P<par_break>\n[ \t]*\n\s*)'
+        r'|(?P<cite>' + build_citation_pattern(commands) + r')'
+    )
+
+
+_TOKEN_REGEX = _build_token_regex(CITATION_COMMANDS)
+
+# 句子边界: 句末标点之后跟空白，且下一个非空白字符是大写字母、反斜杠命令或数学环境。
+_SENTENCE_BOUNDARY = re.compile(r'[.!?](?:["\')\]]|\'\')*\s+(?=[A-Z\\$`(\[])')
+_FORMATTING_MACROS = re.compile(r'\\(?:textit|textbf|emph|texttt|textsc|textrm|textsf|underline|mbox)\{([^{}]*)\}')
+_LABEL_MACROS = re.compile(r'\\label\{[^{}]*\}')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _clean_inline_latex(text: str) -> str:
+    """移除常见的格式化命令（保留其内容）与 \\label，并折叠空白；引用命令与数学公式保持原样。"""
+    previous = None
+    while previous != text:
+        previous = text
+        text = _FORMATTING_MACROS.sub(r'\1', text)
+    text = _LABEL_MACROS.sub('', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def _clean_section_title(raw_title: str) -> str:
+    """将章节标题中的 LaTeX 命令清理为纯文本。"""
+    title = _clean_inline_latex(raw_title)
+    title = re.sub(r'\\[a-zA-Z]+\*?', '', title)
+    title = title.replace('{', '').replace('}', '').replace('~', ' ')
+    return _WHITESPACE.sub(' ', title).strip() or UNKNOWN_SECTION
+
+
+def _split_sentences(paragraph: str, offset: int) -> List[tuple]:
+    """
+    将段落拆分为句子。
+
+    Returns:
+        List[tuple]: (起始位置, 结束位置) 列表，位置均为全文中的绝对偏移。
+    """
+    spans = []
+    start = 0
+    for match in _SENTENCE_BOUNDARY.finditer(paragraph):
+        # 检查句点前的单词是否为缩写，如 "et al." 或 "Fig."
+        if paragraph[match.start()] == '.':
+            word_match = re.search(r'([A-Za-z.]+)$', paragraph[start:match.start()])
+            if word_match and word_match.group(1).lower() in _ABBREVIATIONS:
+                continue
+        end = match.start() + 1
+        spans.append((offset + start, offset + end))
+        start = match.end()
+    if paragraph[start:].strip():
+        spans.append((offset + start, offset + len(paragraph.rstrip())))
+    return spans
+
+
+class CitationIndex:
+    """
+    一个基于单次扫描构建的本地引用索引。
+    将每个引用键映射到它在正文中的所有出现位置，以及对应的章节、前文、引文句和后文。
+    """
+
+    def __init__(self, latex_content: str, commands: Iterable[str] = CITATION_COMMANDS):
+        self.source = latex_content
+        self.occurrences: Dict[str, List[Dict[str, Any]]] = {}
+        token_regex = _TOKEN_REGEX if tuple(commands) == CITATION_COMMANDS else _build_token_regex(commands)
+        self._build(token_regex)
+
+    def _build(self, token_regex: re.Pattern) -> None:
+        current_section = UNKNOWN_SECTION
+        paragraph_start = 0
+        pending: List[Dict[str, Any]] = []  # 当前段落中尚未生成上下文的引用
+
+        for match in token_regex.finditer(self.source):
+            if match.group('section') is not None:
+                self._resolve_paragraph(pending, paragraph_start, match.start())
+                current_section = _clean_section_title(match.group('section_title'))
+                paragraph_start = match.end()
+            elif match.group('abstract') is not None:
+                self._resolve_paragraph(pending, paragraph_start, match.start())
+                current_section = "Abstract"
+                paragraph_start = match.end()
+            elif match.group('par_break') is not None:
+                self._resolve_paragraph(pending, paragraph_start, match.start())
+                paragraph_start = match.end()
+            elif match.group('cite') is not None:
+                keys = []
+                for raw_key in match.group('cite_keys').split(','):
+                    key = raw_key.strip()
+                    if key and key not in keys:
+                        keys.append(key)
+                for key in keys:
+                    pending.append({
+                        "key": key,
+                        "command": match.group('cite_cmd'),
+                        "start": match.start(),
+                        "end": match.end(),
+                        "section": current_section,
+                    })
+        self._resolve_paragraph(pending, paragraph_start, len(self.source))
+
+    def _resolve_paragraph(self, pending: List[Dict[str, Any]], start: int, end: int) -> None:
+        """为一个段落中收集到的全部引用计算句子级上下文，并写入索引。"""
+        if not pending:
+            return
+        sentences = _split_sentences(self.source[start:end], start)
+        for occurrence in pending:
+            position = occurrence["start"]
+            sentence_idx = next((i for i, (s, e) in enumerate(sentences) if s <= position < e), None)
+            if sentence_idx is None:
+                sentence_idx = max((i for i, (s, _) in enumerate(sentences) if s <= position), default=0)
+            occurrence["citation_sentence"] = self._sentence_text(sentences, sentence_idx)
+            occurrence["pre_context"] = self._sentence_text(sentences, sentence_idx - 1)
+            occurrence["post_context"] = self._sentence_text(sentences, sentence_idx + 1)
+            self.occurrences.setdefault(occurrence["key"], []).append(occurrence)
+        pending.clear()
+
+    def _sentence_text(self, sentences: List[tuple], idx: int) -> str:
+        if idx < 0 or idx >= len(sentences):
+            return ""
+        s, e = sentences[idx]
+        return _clean_inline_latex(self.source[s:e])
+
+    @property
+    def keys(self) -> List[str]:
+        return list(self.occurrences.keys())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.occurrences
+
+    def citations_for(self, key: str) -> List[Dict[str, str]]:
+        """
+        返回与 LLM 抽取结果相同结构的 citations 列表，可直接用于 render_html_from_data。
+        """
+        return [
+            {
+                "section": occ["section"],
+                "pre_context": occ["pre_context"],
+                "citation_sentence": occ["citation_sentence"],
+                "post_context": occ["post_context"],
+            }
+            for occ in self.occurrences.get(key, [])
+        ]
+
+    def positions_for(self, key: str) -> List[tuple]:
+        """返回某个键所有引用命令在源码中的 (起始, 结束) 偏移。"""
+        return [(occ["start"], occ["end"]) for occ in self.occurrences.get(key, [])]
+
+
+def build_citation_index(latex_content: str, commands: Optional[Iterable[str]] = None) -> CitationIndex:
+    """
+    对合并后的 LaTeX 源码进行一次扫描，构建引用索引。
+
+    Args:
+        latex_content (str): 已去除注释的合并源码。
+        commands (Iterable[str], optional): 额外的引用命令集合，默认使用 CITATION_COMMANDS。
+
+    Returns:
+        CitationIndex: 引用索引对象。
+    """
+    index = CitationIndex(latex_content, commands or CITATION_COMMANDS)
+    total = sum(len(v) for v in index.occurrences.values())
+    print(f"   └── 本地引用定位完成: 共 {len(index.occurrences)} 个引用键，{total} 处引用。")
+    return index
+
+
+# 任何名称中含有 cite（或 Cite）的命令（\cite、\citeA、\shortcite、\citenum、\fullcite、\nocite、\parencites 等）
+# 都视为引用：用于决定解析哪些 .bib 条目时宁可多收，也不能漏掉 CITATION_COMMANDS 之外的引用命令
+_CITE_LIKE_REGEX = re.compile(r'\\(?P<cmd>[A-Za-z]*[Cc]ite[A-Za-z]*)(?![A-Za-z])\*?')
+_CITE_ARGUMENT_REGEX = re.compile(r'(?:\s*\[[^\]]*\]){0,2}\s*\{(?P<keys>[^{}]*)\}')
+
+
+def collect_cited_keys(latex_content: str) -> Optional[Set[str]]:
+    """
+    收集正文中引用的所有键（包括 \\nocite），用于只解析真正被引用的参考文献条目。
+    识别名称中含有 cite 的全部命令及其可选参数；biblatex 的多重引用命令（如 \\cites{a}[p.~3]{b}）会读取全部键参数。
+
+    Returns:
+        Optional[Set[str]]: 被引用的键集合；使用了 \\nocite{*}（收录全部条目），
+        或某个引用命令的参数无法识别（如键参数中含有花括号）时返回 None，调用方应解析全部条目。
+    """
+    keys = set()
+    for match in _CITE_LIKE_REGEX.finditer(latex_content):
+        argument = _CITE_ARGUMENT_REGEX.match(latex_content, match.end())
+        if argument is None:
+            following = latex_content[match.end():match.end() + 1]
+            if following in ('{', '['):
+                return None
+            # 命令名本身被引用（如 \\newcommand{\\mycite} 或 \\let），而不是一次引用
+            continue
+        while argument is not None:
+            cited = {k.strip() for k in argument.group('keys').split(',') if k.strip()}
+            if match.group('cmd').lower() == 'nocite' and '*' in cited:
+                return None
+            keys.update(cited)
+            # 多重引用命令（名称以 cites 结尾）后面可以跟任意多组 [前注][后注]{键}
+            if not match.group('cmd').lower().endswith('cites'):
+                break
+            argument = _CITE_ARGUMENT_REGEX.match(latex_content, argument.end())
+    return keys
+
+
+class ContextSlicer:
+    """
+    为 LLM 提示词裁剪源码：只保留引用键所在段落及其前后若干段落，并附带所属章节标题。
+    段落与章节位置在构造时一次性计算，之后每个键的裁剪只需二分查找。
+    """
+
+    _SECTION_REGEX = re.compile(
+        r'\\(?:' + "|".join(SECTION_COMMANDS) + r')\*?\s*(?:\[[^\]]*\])?\s*\{((?:[^{}]|\{[^{}]*\})*)\}')
+    _PAR_BREAK_REGEX = re.compile(r'\n[ \t]*\n\s*')
+
+    def __init__(self, latex_content: str):
+        self.source = latex_content
+        self._paragraphs: List[tuple] = []
+        start = 0
+        for match in self._PAR_BREAK_REGEX.finditer(latex_content):
+            if match.start() > start:
+                self._paragraphs.append((start, match.start()))
+            start = match.end()
+        if start < len(latex_content):
+            self._paragraphs.append((start, len(latex_content)))
+        self._paragraph_starts = [s for s, _ in self._paragraphs]
+        self._sections = [(m.start(), _clean_section_title(m.group(1)))
+                          for m in self._SECTION_REGEX.finditer(latex_content)]
+        self._section_starts = [pos for pos, _ in self._sections]
+
+    def find_key_positions(self, key: str) -> List[int]:
+        """
+        查找键在任意花括号参数列表中的出现位置，可覆盖自定义引用宏等非标准写法。
+        等价于正则 (?<=[{,\\s])key(?=\\s*[,}])，但用 str.find 扫描：每篇参考文献都要调用一次，
+        逐键编译并执行带后顾断言的正则在数百篇文献时会占用数秒的事件循环时间。
+        """
+        if not key:
+            return []
+        source, positions, length = self.source, [], len(key)
+        pos = source.find(key)
+        while pos != -1:
+            end = pos + length
+            if pos > 0 and (source[pos - 1] in '{,' or source[pos - 1].isspace()):
+                while end < len(source) and source[end].isspace():
+                    end += 1
+                if end < len(source) and source[end] in ',}':
+                    positions.append(pos)
+                    pos = source.find(key, pos + length)
+                    continue
+            pos = source.find(key, pos + 1)
+        return positions
+
+    def _paragraph_at(self, position: int) -> int:
+        return max(bisect.bisect_right(self._paragraph_starts, position) - 1, 0)
+
+    def _section_at(self, position: int) -> str:
+        idx = bisect.bisect_right(self._section_starts, position) - 1
+        return self._sections[idx][1] if idx >= 0 else UNKNOWN_SECTION
+
+    def slice_for_keys(self, keys: Iterable[str], radius: int = 1) -> str:
+        """
+        生成包含给定键全部出现位置的源码摘录。
+
+        Args:
+            keys (Iterable[str]): 需要定位的引用键。
+            radius (int): 在命中段落前后额外保留的段落数。
+
+        Returns:
+            str: 按原文顺序拼接的摘录；若没有任何命中则返回空字符串。
+        """
+        if not self._paragraphs:
+            return ""
+        selected = set()
+        for key in keys:
+            for position in self.find_key_positions(key):
+                idx = self._paragraph_at(position)
+                lo, hi = max(idx - radius, 0), min(idx + radius, len(self._paragraphs) - 1)
+                selected.update(range(lo, hi + 1))
+        if not selected:
+            return ""
+
+        # 将相邻段落合并为连续的块，每块前注明其所属章节
+        blocks, run = [], []
+        for idx in sorted(selected):
+            if run and idx != run[-1] + 1:
+                blocks.append(run)
+                run = []
+            run.append(idx)
+        blocks.append(run)
+
+        excerpt_parts = []
+        for block in blocks:
+            start = self._paragraphs[block[0]][0]
+            end = self._paragraphs[block[-1]][1]
+            excerpt_parts.append(f"% [章节: {self._section_at(start)}]\n{self.source[start:end]}")
+        return "\n\n% [...]\n\n".join(excerpt_parts)
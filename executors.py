@@ -0,0 +1,157 @@
+# executors.py
+
+import asyncio
+import functools
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 阻塞 I/O（缓存读写、报告与导出文件、.bib 读取）使用的线程数
+IO_EXECUTOR_WORKERS = int(os.getenv("IO_EXECUTOR_WORKERS", "8"))
+# 可独立序列化的 CPU 密集任务（解压与 pylatexenc 解析、参考文献块解析）使用的进程数；None 表示使用 CPU 核数
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", "0")) or None
+# 事件循环延迟监视器的采样间隔与告警阈值（秒）
+LOOP_LAG_INTERVAL = 0.05
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.1"))
+
+_io_executor: Optional[ThreadPoolExecutor] = None
+_compute_executor: Optional[ThreadPoolExecutor] = None
+_cpu_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _init_cpu_worker() -> None:
+    # fork 出的子进程继承了父进程的 SQLite 连接与锁，它们不能跨进程共用
+    import cache_handler
+    cache_handler.reopen_after_fork()
+
+
+def io_executor() -> ThreadPoolExecutor:
+    """返回进程内共享的 I/O 线程池，首次调用时创建。"""
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=IO_EXECUTOR_WORKERS, thread_name_prefix="io")
+    return _io_executor
+
+
+def compute_executor() -> ThreadPoolExecutor:
+    """
+    返回处理本进程内大对象的计算线程（只有一个）。
+    这类计算受 GIL 限制，多个线程并不会更快，反而会让事件循环线程每次重新获取 GIL 时排在更多线程之后。
+    """
+    global _compute_executor
+    if _compute_executor is None:
+        _compute_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compute")
+    return _compute_executor
+
+
+def cpu_executor() -> ProcessPoolExecutor:
+    """返回进程内共享的 CPU 进程池，首次调用时创建；多篇论文并发时共用同一组进程。"""
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ProcessPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, initializer=_init_cpu_worker)
+    return _cpu_executor
+
+
+async def run_in_thread(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在 I/O 线程池中执行阻塞调用，不占用事件循环。"""
+    return await asyncio.get_running_loop().run_in_executor(io_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def run_compute(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在计算线程中执行针对本进程内大对象的纯计算（规范化、引用索引、批次规划等）。"""
+    return await asyncio.get_running_loop().run_in_executor(compute_executor(),
+                                                            functools.partial(func, *args, **kwargs))
+
+
+async def run_in_process(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在 CPU 进程池中执行调用；参数与返回值需要可 pickle。"""
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    """关闭共享的线程池、计算线程与进程池（下次使用时会重新创建）。"""
+    global _io_executor, _compute_executor, _cpu_executor
+    if _io_executor is not None:
+        _io_executor.shutdown(wait=True)
+        _io_executor = None
+    if _compute_executor is not None:
+        _compute_executor.shutdown(wait=True)
+        _compute_executor = None
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=True)
+        _cpu_executor = None
+
+
+class LoopLagMonitor:
+    """
+    事件循环延迟监视器：后台任务每隔 interval 秒休眠一次，记录实际唤醒时间比预期晚了多少。
+    延迟即这段时间内事件循环被同步代码占用、无法处理其他 LLM 响应与工具调用的时长。
+
+    用法:
+        async with LoopLagMonitor() as monitor:
+            ...
+        print(monitor.describe())
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: Optional[float] = None):
+        self.interval = interval
+        self.threshold = LOOP_LAG_THRESHOLD if threshold is None else threshold
+        self.samples: List[float] = []
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - expected, 0.0)
+            self.samples.append(lag)
+            if lag > self.threshold:
+                self.stalls += 1
+                print(f"⚠️ 事件循环被阻塞约 {lag * 1000:.0f}ms（阈值 {self.threshold * 1000:.0f}ms）。")
+
+    def start(self) -> "LoopLagMonitor":
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self) -> "LoopLagMonitor":
+        return self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    @property
+    def max_lag(self) -> float:
+        return max(self.samples, default=0.0)
+
+    @property
+    def within_threshold(self) -> bool:
+        return self.max_lag <= self.threshold
+
+    def stats(self) -> Dict[str, Any]:
+        """返回采样数、最大/中位/p99 延迟（秒）与超过阈值的次数。"""
+        ordered = sorted(self.samples)
+        p99 = ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)] if ordered else 0.0
+        return {"samples": len(ordered), "max_lag": round(self.max_lag, 4),
+                "median_lag": round(statistics.median(ordered), 4) if ordered else 0.0,
+                "p99_lag": round(p99, 4), "stalls": self.stalls, "threshold": self.threshold}
+
+    def describe(self) -> str:
+        s = self.stats()
+        status = "✅" if self.within_threshold else "⚠️"
+        return (f"{status} 事件循环延迟: 最大 {s['max_lag'] * 1000:.1f}ms，p99 {s['p99_lag'] * 1000:.1f}ms，"
+                f"中位 {s['median_lag'] * 1000:.1f}ms（{s['samples']} 次采样，超过 {self.threshold * 1000:.0f}ms 阈值 "
+                f"{s['stalls']} 次）")
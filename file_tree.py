@@ -0,0 +1,135 @@
+# file_tree.py
+
+import os
+from pathlib import Path
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Union
+
+
+def normalize_path(path: Path) -> Path:
+    """在不访问文件系统的前提下规范化路径（折叠 '.' 与 '..'），对真实目录与虚拟文件树都适用。"""
+    return Path(os.path.normpath(path))
+
+
+class DiskFileTree:
+    """以磁盘目录为根的文件树。"""
+
+    def __init__(self, base_dir: Path):
+        self.base_dir = normalize_path(Path(base_dir))
+
+    def iter_files(self) -> Iterator[Path]:
+        """遍历树中的所有文件（一次 os.walk，不对每个条目单独 stat）。"""
+        for dirpath, _, filenames in os.walk(self.base_dir):
+            for filename in filenames:
+                yield Path(dirpath) / filename
+
+    def is_file(self, path: Path) -> bool:
+        return Path(path).is_file()
+
+    def size(self, path: Path) -> int:
+        return Path(path).stat().st_size
+
+    def read_text(self, path: Path) -> str:
+        return Path(path).read_text(encoding='utf-8', errors='ignore')
+
+    def read_head(self, path: Path, max_chars: int) -> str:
+        """只读取文件开头的 max_chars 个字符。"""
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read(max_chars)
+
+
+class VirtualFileTree:
+    """
+    保存在内存中的文件树，由归档中的文本成员构成，不在磁盘上写入任何文件。
+    路径以 base_dir 为名义上的根目录，接口与 DiskFileTree 保持一致。
+    """
+
+    def __init__(self, base_dir: Path, files: Optional[Dict[str, str]] = None):
+        self.base_dir = normalize_path(Path(base_dir))
+        self._files: Dict[Path, str] = {}
+        for relative_path, content in (files or {}).items():
+            self.add(relative_path, content)
+
+    def add(self, relative_path: str, content: str) -> None:
+        self._files[normalize_path(self.base_dir / relative_path)] = content
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def iter_files(self) -> Iterator[Path]:
+        return iter(sorted(self._files))
+
+    def is_file(self, path: Path) -> bool:
+        return normalize_path(Path(path)) in self._files
+
+    def size(self, path: Path) -> int:
+        return len(self._files[normalize_path(Path(path))].encode('utf-8'))
+
+    def read_text(self, path: Path) -> str:
+        try:
+            return self._files[normalize_path(Path(path))]
+        except KeyError:
+            raise FileNotFoundError(f"虚拟文件树中不存在该文件: {path}") from None
+
+    def read_head(self, path: Path, max_chars: int) -> str:
+        return self.read_text(path)[:max_chars]
+
+
+class ProjectFileIndex:
+    """
+    对文件树做一次遍历后建立的文件索引，按文件名与后缀查找路径。
+    主文件探测、.bib/.bbl 定位与 \\input 解析共用同一个索引，而不是各自重新遍历目录。
+    接口与文件树一致，可以直接代替文件树传给解析函数。
+    """
+
+    def __init__(self, file_tree: Union[DiskFileTree, VirtualFileTree]):
+        self.file_tree = file_tree
+        self.base_dir = file_tree.base_dir
+        self._files: List[Path] = []
+        self._paths = set()
+        self._by_name: Dict[str, List[Path]] = defaultdict(list)
+        self._by_suffix: Dict[str, List[Path]] = defaultdict(list)
+        for path in file_tree.iter_files():
+            path = normalize_path(path)
+            self._files.append(path)
+            self._paths.add(path)
+            self._by_name[path.name].append(path)
+            self._by_suffix[path.suffix.lower()].append(path)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def iter_files(self) -> Iterator[Path]:
+        return iter(self._files)
+
+    def files_with_suffix(self, suffix: str) -> List[Path]:
+        return list(self._by_suffix.get(suffix.lower(), []))
+
+    def find_by_relative_name(self, relative_name: str) -> List[Path]:
+        """查找路径以 relative_name 结尾的文件（如 'refs.bib' 或 'bib/refs.bib'）。"""
+        relative = Path(relative_name)
+        suffix = '/' + relative.as_posix()
+        return [p for p in self._by_name.get(relative.name, []) if ('/' + p.as_posix()).endswith(suffix)]
+
+    def resolve(self, candidates: List[Path]) -> Optional[Path]:
+        """返回候选路径中第一个存在于索引中的路径。"""
+        for candidate in candidates:
+            if (candidate := normalize_path(candidate)) in self._paths:
+                return candidate
+        return None
+
+    def is_file(self, path: Path) -> bool:
+        return normalize_path(Path(path)) in self._paths
+
+    def size(self, path: Path) -> int:
+        return self.file_tree.size(path)
+
+    def read_text(self, path: Path) -> str:
+        return self.file_tree.read_text(path)
+
+    def read_head(self, path: Path, max_chars: int) -> str:
+        return self.file_tree.read_head(path, max_chars)
+
+
+# 解析器接受的文件树类型
+FileTree = Union[DiskFileTree, VirtualFileTree, ProjectFileIndex]
@@ -1,28 +1,125 @@
 # file_writer.py
 
+import json
+import os
+import threading
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
 
 
-def save_html_report(content: str, file_path: str):
+class _AppendableDocument:
     """
-    将字符串内容保存到指定的HTML文件中。
-    如果目录不存在，会自动创建。
+    由固定的头部、可追加的正文和固定的尾部组成的文件。
+    每次追加都会覆盖旧尾部并重新写入尾部，因此每次刷新后文件都是一个完整、有效的文档。
+    """
+
+    def __init__(self, path: Path, head: str, tail: str):
+        self.path = path
+        self._file = open(path, 'wb+')
+        self._tail = tail.encode('utf-8')
+        self._file.write(head.encode('utf-8'))
+        self._body_end = self._file.tell()
+        self._file.write(self._tail)
+        self._file.flush()
+
+    def append(self, chunk: str) -> None:
+        data = chunk.encode('utf-8')
+        self._file.seek(self._body_end)
+        self._file.write(data + self._tail)
+        self._body_end += len(data)
+        self._file.truncate()
+        self._file.flush()
 
-    Args:
-        content (str): 要保存的HTML字符串内容。
-        file_path (str): 目标HTML文件的完整路径。
+    def close(self, tail: Optional[str] = None) -> None:
+        """关闭文件；提供 tail 时先将尾部替换为它。重复调用无效。"""
+        if self._file.closed:
+            return
+        if tail is not None:
+            self._tail = tail.encode('utf-8')
+            self.append('')
+        self._file.close()
 
-    Raises:
-        Exception: 如果在写入文件时发生错误。
+
+class StreamingReportWriter:
+    """
+    流式报告写入器：每篇参考文献分析完成后立即把其 HTML 块追加到报告中，并同步写入紧凑的 JSON 旁路文件。
+    追加顺序即完成顺序，页面通过 CSS flex 的 order 属性按 id 显示；close() 时再按 id 重写一次最终文件。
+    任意刷新点上的 HTML 与 JSON 都是有效文档，运行期间即可查看部分报告。
+    分析中途失败时应调用 abort()，否则文件句柄不会关闭，HTML 也会一直停留在运行期间的尾部。
     """
-    try:
-        path = Path(file_path)
-        # 使用 path.parent 确保父目录存在，如果不存在则创建
-        path.parent.mkdir(parents=True, exist_ok=True)
-
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print(f"✅ 报告已成功保存到: {file_path}")
-    except Exception as e:
-        print(f"❌ 保存文件到 '{file_path}' 时出错: {e}")
-        raise  # 将异常向上抛出
\ No newline at end of file
+
+    def __init__(self, html_path: str, header: str, footer: str, render_block: Callable[[dict], str],
+                 json_path: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            html_path (str): HTML 报告路径。
+            header (str): HTML 头部（需以参考文献容器的开始标签结尾）。
+            footer (str): 运行期间使用的 HTML 尾部（需以参考文献容器的结束标签开头）。
+            render_block (Callable[[dict], str]): 将一篇参考文献渲染为 HTML 块的函数。
+            json_path (str, optional): JSON 旁路文件路径；默认与 HTML 同名、扩展名为 .json。
+            metadata (Dict[str, Any], optional): 写入 JSON 顶层的附加信息（如论文标题）。
+        """
+        self.html_path = Path(html_path)
+        self.json_path = Path(json_path) if json_path else self.html_path.with_suffix('.json')
+        self.header = header
+        self.render_block = render_block
+        self.metadata = metadata or {}
+        self._blocks: Dict[Any, Tuple[dict, str]] = {}
+        self._closed = False
+        # add() 在 I/O 线程池中执行：被取消的追加可能仍在进行，abort() 需要等它写完再改写尾部
+        self._lock = threading.Lock()
+        self.html_path.parent.mkdir(parents=True, exist_ok=True)
+        self.json_path.parent.mkdir(parents=True, exist_ok=True)
+        self._html = _AppendableDocument(self.html_path, header, footer)
+        json_head = json.dumps(self.metadata, ensure_ascii=False, separators=(',', ':'))[:-1]
+        json_head += (',' if self.metadata else '') + '"references":['
+        self._json = _AppendableDocument(self.json_path, json_head, ']}')
+
+    def add(self, item: dict) -> None:
+        """追加一篇已完成分析的参考文献；同一 key 只会写入一次。"""
+        key = item.get("key")
+        with self._lock:
+            if key in self._blocks or self._closed:
+                return
+            block = self.render_block(item)
+            self._blocks[key] = (item, block)
+            self._html.append(block)
+            separator = ',' if len(self._blocks) > 1 else ''
+            self._json.append(separator + json.dumps(item, ensure_ascii=False, separators=(',', ':')))
+
+    def close(self, all_items: Iterable[dict], footer: str) -> None:
+        """
+        写入尚未追加的参考文献，并以原子方式将 HTML 与 JSON 按 id 排序重写为最终版本。
+
+        Args:
+            all_items (Iterable[dict]): 全部参考文献。
+            footer (str): 最终的 HTML 尾部（如包含生成时间）。
+        """
+        with self._lock:
+            for item in all_items:
+                if item.get("key") not in self._blocks:
+                    self._blocks[item.get("key")] = (item, self.render_block(item))
+            self._closed = True
+            self._html.close()
+            self._json.close()
+        ordered = sorted(self._blocks.values(), key=lambda entry: entry[0].get('id', 0))
+        html_content = self.header + "".join(block for _, block in ordered) + footer
+        payload = dict(self.metadata, references=[item for item, _ in ordered])
+        for path, content in ((self.html_path, html_content),
+                              (self.json_path, json.dumps(payload, ensure_ascii=False, separators=(',', ':')))):
+            tmp_path = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+            tmp_path.write_text(content, encoding='utf-8')
+            os.replace(tmp_path, path)
+        print(f"✅ 报告已成功保存到: {self.html_path}（JSON: {self.json_path}）")
+
+    def abort(self, footer: str) -> None:
+        """
+        分析失败时关闭报告：保留已追加的参考文献，并将 HTML 尾部替换为 footer（如失败说明）。
+        close() 之后调用无效，不会覆盖已写出的最终报告。
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._html.close(footer)
+            self._json.close()
@@ -0,0 +1,146 @@
+# incremental.py
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import cache_handler
+from file_tree import FileTree
+
+MANIFEST_DIR = cache_handler.CACHE_DIR / "manifests"
+# 参与差异比较的文件类型：只有这些文件会影响解析与分析结果
+TRACKED_SUFFIXES = ('.tex', '.bib', '.bbl', '.cls', '.sty')
+MANIFEST_VERSION = 1
+
+
+def default_project_id(archive_path: str) -> str:
+    """
+    由归档文件名推断项目 ID：去掉扩展名与 arXiv 风格的版本后缀，
+    使同一论文的不同修订版（如 2505.00024v1 与 2505.00024v2）共用一个清单。
+    """
+    name = Path(archive_path).name
+    for suffix in ('.tar.gz', '.tar.bz2', '.tgz', '.tbz2', '.tar', '.zip', '.gz'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return re.sub(r'v\d+$', '', name) or name
+
+
+def digest_project_files(file_tree: FileTree) -> Dict[str, str]:
+    """计算项目文件树（磁盘目录或内存中的虚拟文件树）中所有相关文本文件的内容摘要。"""
+    digests = {}
+    for path in file_tree.iter_files():
+        if path.suffix.lower() in TRACKED_SUFFIXES:
+            digests[path.relative_to(file_tree.base_dir).as_posix()] = cache_handler.content_digest(
+                file_tree.read_text(path))
+    return digests
+
+
+class ProjectManifest:
+    """
+    增量分析清单：记录某个项目上一次分析时的文件摘要、解析出的参考文献以及每篇参考文献的分析结果。
+    每条结果都附带一个指纹（参考文献条目 + 引用它的段落 + 分析配置），指纹不变的结果可直接复用。
+    """
+
+    def __init__(self, project_id: str, manifest_dir: Path = MANIFEST_DIR):
+        self.project_id = project_id
+        self.path = Path(manifest_dir) / f"{re.sub(r'[^A-Za-z0-9._-]', '_', project_id)}.json"
+        self.file_digests: Dict[str, str] = {}
+        self.references_source_digest: Optional[str] = None
+        self.references: List[Dict[str, Any]] = []
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.reused_count = 0
+
+    @classmethod
+    def load(cls, project_id: str, manifest_dir: Path = MANIFEST_DIR) -> "ProjectManifest":
+        """加载已有清单；不存在或版本不兼容时返回一个空清单。"""
+        manifest = cls(project_id, manifest_dir)
+        if manifest.path.exists():
+            try:
+                data = json.loads(manifest.path.read_text(encoding='utf-8'))
+                if data.get("version") == MANIFEST_VERSION:
+                    manifest.file_digests = data.get("file_digests", {})
+                    manifest.references_source_digest = data.get("references_source_digest")
+                    manifest.references = data.get("references", [])
+                    manifest.results = data.get("results", {})
+            except (IOError, json.JSONDecodeError) as e:
+                print(f"   └── 增量清单读取失败: {e}，将执行完整分析。")
+        return manifest
+
+    def diff_files(self, new_digests: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        与上一次的文件摘要比较，并记录新的摘要。
+
+        Returns:
+            Tuple[List[str], List[str], List[str]]: (新增文件, 修改文件, 删除文件)。
+        """
+        added = sorted(set(new_digests) - set(self.file_digests))
+        removed = sorted(set(self.file_digests) - set(new_digests))
+        changed = sorted(p for p in set(new_digests) & set(self.file_digests)
+                         if new_digests[p] != self.file_digests[p])
+        self.file_digests = new_digests
+        return added, changed, removed
+
+    def cached_references(self, references_text: str) -> Optional[List[Dict[str, Any]]]:
+        """如果参考文献原文与上次相同，返回上次解析出的参考文献列表（避免重复调用 LLM 解析）。"""
+        if self.references and self.references_source_digest == cache_handler.content_digest(references_text):
+            return [dict(ref) for ref in self.references]
+        return None
+
+    def record_references(self, references_text: str, references: List[Dict[str, Any]]) -> None:
+        self.references_source_digest = cache_handler.content_digest(references_text)
+        self.references = [dict(ref) for ref in references]
+
+    @staticmethod
+    def reference_fingerprint(reference: Dict[str, Any], citing_source: str, config: str) -> str:
+        """由参考文献条目（不含 id 与分析结果）、引用它的源码片段和分析配置计算指纹。"""
+        entry = {k: v for k, v in reference.items() if k in ("key", "content", "title", "inferred_title",
+                                                              "inferred_author", "inferred_source")}
+        return cache_handler.make_cache_key(
+            config,
+            cache_handler.content_digest(json.dumps(entry, sort_keys=True, ensure_ascii=False)),
+            cache_handler.content_digest(citing_source))
+
+    def reuse_results(self, references: List[Dict[str, Any]],
+                      fingerprints: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        将指纹未变化的上次结果合并回参考文献中。参考文献可以分组多次传入，reused_count 累计全部复用的条数。
+
+        Returns:
+            List[Dict[str, Any]]: 需要重新分析的参考文献。
+        """
+        to_analyze = []
+        for ref in references:
+            stored = self.results.get(ref['key'])
+            if stored and stored.get("fingerprint") == fingerprints.get(ref['key']):
+                ref.update(stored["data"])
+                self.reused_count += 1
+            else:
+                to_analyze.append(ref)
+        return to_analyze
+
+    def record_results(self, references: List[Dict[str, Any]], fingerprints: Dict[str, str]) -> None:
+        """记录本次的分析结果；分析失败的条目不会被记录，下次会重新分析。"""
+        self.results = {}
+        for ref in references:
+            if ref.get("analysis_failed") or ref['key'] not in fingerprints:
+                continue
+            data = {k: v for k, v in ref.items() if k != "id"}
+            self.results[ref['key']] = {"fingerprint": fingerprints[ref['key']], "data": data}
+
+    def save(self) -> None:
+        """以原子方式写入清单文件。"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": MANIFEST_VERSION,
+            "project_id": self.project_id,
+            "file_digests": self.file_digests,
+            "references_source_digest": self.references_source_digest,
+            "references": self.references,
+            "results": self.results,
+        }
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False, separators=(',', ':')), encoding='utf-8')
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,104 @@
+# json_stream.py
+
+import json
+import re
+from typing import Any, List, Optional
+
+# 字符串外需要关注的结构字符，以及字符串内的引号与转义符
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class JSONArrayStream:
+    """
+    增量解析 JSON 响应中某个键下的数组：随 LLM 的流式输出逐段 feed，每个数组元素一旦完整即被解析出来。
+
+    响应被截断（max_tokens）或中途卡住时，items 中是全部已完整输出的元素，pending_text 是被截断元素的原文，
+    调用方据此只为剩余部分续写，而不必依赖 json_repair 猜测被截断处的内容。
+    只处理对象元素；在找到 "<key>": [ 之前的任何文本（如 Markdown 代码块标记）都会被跳过。
+
+    用法:
+        stream = JSONArrayStream("analysis_results")
+        for delta in deltas:
+            for item in stream.feed(delta):
+                ...
+    """
+
+    def __init__(self, key: Optional[str]):
+        self.key = key
+        self.items: List[Any] = []
+        self.finished = False
+        # 只保留尚未处理完的文本（找到数组之前的全部文本，或当前元素开头之后的文本），已解析的元素原文随即丢弃
+        self._text = ""
+        self._opening = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[') if key else None
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._item_start: Optional[int] = None
+
+    @property
+    def pending_text(self) -> str:
+        """尚未完整的数组元素的原文（没有时为空字符串）。"""
+        return self._text[self._item_start:] if self._item_start is not None and not self.finished else ""
+
+    def feed(self, chunk: str) -> List[Any]:
+        """追加一段文本，返回其中新完成的数组元素。"""
+        self._text += chunk
+        if self._opening is None or self.finished:
+            return []
+        if not self._started:
+            # 键可能被拆分在两个数据块之间，因此总是在完整文本上重新查找（找到之前文本通常很短）
+            match = self._opening.search(self._text)
+            if not match:
+                return []
+            self._started, self._pos = True, match.end()
+        return self._scan()
+
+    def _scan(self) -> List[Any]:
+        completed = []
+        text = self._text
+        while not self.finished:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(text, self._pos)
+                if not match:
+                    self._pos = len(text)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(text):
+                        # 转义符位于当前文本末尾：等待下一个数据块中被转义的字符
+                        self._pos = match.start()
+                        break
+                    self._pos = match.end() + 1
+                    continue
+                self._in_string = False
+                self._pos = match.end()
+                continue
+            match = _STRUCTURAL.search(text, self._pos)
+            if not match:
+                self._pos = len(text)
+                break
+            char, self._pos = match.group(), match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0 and char == '{':
+                    self._item_start = match.start()
+                self._depth += 1
+            elif self._depth == 0:
+                # 数组本身的结束括号
+                self.finished = True
+            else:
+                self._depth -= 1
+                if self._depth == 0 and self._item_start is not None:
+                    try:
+                        completed.append(json.loads(text[self._item_start:self._pos]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._item_start = None
+        keep = self._item_start if self._item_start is not None else self._pos
+        self._text, self._pos = text[keep:], self._pos - keep
+        if self._item_start is not None:
+            self._item_start = 0
+        self.items.extend(completed)
+        return completed
@@ -1,13 +1,39 @@
 # --- START OF FILE latex_parser.py (MODIFIED) ---
 
 import logging
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any, Set, Optional, Tuple
 
-import bibtexparser
-from pylatexenc.latexwalker import LatexWalker, LatexMacroNode, LatexEnvironmentNode
+from pylatexenc.latexwalker import (LatexWalker, LatexMacroNode, LatexEnvironmentNode, LatexGroupNode,
+                                    get_default_latex_context_db)
 from pylatexenc.latex2text import LatexNodes2Text
+from pylatexenc.macrospec import MacroSpec
+
+import cache_handler
+from bib_reader import entry_to_reference, read_bib_entries
+from file_tree import DiskFileTree, FileTree, ProjectFileIndex, normalize_path
+from merged_document import MergedDocument
+
+# 主文件探测时只读取每个 .tex 文件开头的字符数
+MAIN_FILE_HEAD_CHARS = 16384
+# 结构化解析结果的缓存命名空间（按文件内容摘要索引）；修改 _walk_latex_source 时需要提升版本号
+LATEX_WALK_CACHE_NAMESPACE = "latex-walk:v3"
+# 需要解析的文件数达到该值时才启用进程池，避免为小项目付出进程启动开销
+PARALLEL_PARSE_MIN_FILES = 8
+# 解析进程数上限；None 表示使用 CPU 核数
+LATEX_PARSE_WORKERS = int(os.getenv("LATEX_PARSE_WORKERS", "0")) or None
+
+# 引入其他源文件的命令；\import/\subimport 的两个参数分别是目录与文件名
+INCLUDE_MACROS = ('input', 'include', 'subfile')
+IMPORT_MACROS = ('import', 'subimport', 'inputfrom', 'subinputfrom', 'includefrom', 'subincludefrom')
+
+# 用于在引入图发现阶段廉价地扫描引入的文件
+_INCLUDE_PATTERN = re.compile(
+    r'\\(?:' + '|'.join(INCLUDE_MACROS) + r')\s*\{(?P<file>[^}]+)\}'
+    r'|\\(?:' + '|'.join(IMPORT_MACROS) + r')\*?\s*\{(?P<import_dir>[^}]*)\}\s*\{(?P<import_file>[^}]+)\}')
 
 # --- MODIFIED: 设置pylatexenc的日志级别，以减少控制台噪音 ---
 logging.getLogger('pylatexenc').setLevel(logging.WARNING)
@@ -15,6 +41,18 @@ logging.getLogger('pylatexenc').setLevel(logging.WARNING)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# LatexNodes2Text 无状态，全模块共用一个实例
+_LATEX_TO_TEXT = LatexNodes2Text()
+
+# 在 pylatexenc 默认宏库的基础上声明 subfiles/import/\includeonly 的参数，使其参数被解析为宏参数
+_LATEX_CONTEXT = get_default_latex_context_db()
+_LATEX_CONTEXT.add_context_category('project-includes', prepend=True, macros=[
+    MacroSpec('subfile', '{'),
+    MacroSpec('includeonly', '{'),
+    MacroSpec('addbibresource', '[{'),
+    *(MacroSpec(name, '*{{') for name in IMPORT_MACROS),
+])
+
 
 # --- NEW: Helper function to pre-clean LaTeX content for parsing ---
 def _clean_latex_for_pylatexenc(latex_content: str) -> str:
@@ -32,17 +70,35 @@ class LatexProjectParser:
     一个使用 `pylatexenc` 并增加了正则回退机制的高级 LaTeX 项目解析器。
     """
 
-    def __init__(self, base_dir_str: str):
-        self.base_dir = Path(base_dir_str)
-        if not self.base_dir.is_dir():
-            raise NotADirectoryError(f"提供的路径不是一个有效的目录: {self.base_dir}")
+    def __init__(self, base_dir_str: str, file_tree: Optional[FileTree] = None,
+                 max_workers: Optional[int] = LATEX_PARSE_WORKERS):
+        """
+        Args:
+            base_dir_str (str): 项目根目录。
+            file_tree (FileTree, optional): 文件树（如内存中的 VirtualFileTree）；提供时从中读取文件，而不直接访问该目录。
+            max_workers (int, optional): 解析子文件时使用的进程数；为 1 时始终串行解析。
+        """
+        if file_tree is not None:
+            self.file_tree = file_tree
+        else:
+            if not Path(base_dir_str).is_dir():
+                raise NotADirectoryError(f"提供的路径不是一个有效的目录: {base_dir_str}")
+            self.file_tree = DiskFileTree(Path(base_dir_str))
+        self.base_dir = self.file_tree.base_dir
+        self.max_workers = max_workers
+        # 只遍历一次文件树；主文件探测、\input 解析以及之后的 .bib/.bbl 定位都使用这个索引
+        self.file_index = ProjectFileIndex(self.file_tree)
 
         self.main_file: Optional[Path] = None
         self.processed_files: Set[Path] = set()
         self.paper_title: str = "未找到标题"
         self.bib_file_names: List[str] = []
+        # \includeonly 列出的文件（不含扩展名）；None 表示未使用 \includeonly
+        self.include_only: Optional[Set[str]] = None
         self.the_bibliography_content: str = ""
-        self._verbatim_parts: List[str] = []
+        self._verbatim_parts: List[Tuple[Path, str]] = []
+        # 解析完成后构建一次的合并文档；解析前为空文档
+        self.document = MergedDocument([])
 
     def parse(self) -> None:
         """
@@ -56,6 +112,8 @@ class LatexProjectParser:
         self.main_file = main_tex_file
         logger.info(f"找到主文件: {main_tex_file.relative_to(self.base_dir)}")
         self._parse_file_and_extract_metadata(main_tex_file)
+        self.document = MergedDocument(self._verbatim_parts, self.base_dir)
+        self._verbatim_parts = []
 
         # --- MODIFIED: 统一在此处应用所有正则表达式回退逻辑 ---
 
@@ -64,7 +122,7 @@ class LatexProjectParser:
         # 回退逻辑 1: 解析 \bibliography
         if not self.bib_file_names:
             logger.warning("pylatexenc未能提取到 .bib 文件名，尝试使用正则表达式进行回退扫描...")
-            matches = re.findall(r'\\bibliography\{([^}]+)\}', full_content)
+            matches = re.findall(r'\\(?:bibliography|addbibresource)\s*(?:\[[^\]]*\])?\{([^}]+)\}', full_content)
             if matches:
                 bib_names = []
                 for match in matches:
@@ -72,7 +130,7 @@ class LatexProjectParser:
                 self.bib_file_names = list(set(bib_names))
                 logger.info(f"✅ 正则表达式成功提取到 .bib 文件名: {self.bib_file_names}")
             else:
-                logger.warning("正则表达式也未能找到 \\bibliography 命令。")
+                logger.warning("正则表达式也未能找到 \\bibliography 或 \\addbibresource 命令。")
 
         # 回退逻辑 2: 解析 \title (作为双重保险)
         if self.paper_title == "未找到标题":
@@ -86,7 +144,7 @@ class LatexProjectParser:
                 try:
                     lw_cleaner = LatexWalker(raw_title)
                     nodelist, _, _ = lw_cleaner.get_latex_nodes()
-                    cleaned_title = LatexNodes2Text().nodelist_to_text(nodelist).strip()
+                    cleaned_title = _LATEX_TO_TEXT.nodelist_to_text(nodelist).strip()
                 except Exception:
                     # 如果清理失败，使用简单的正则清理作为备用
                     cleaned_title = re.sub(r'\\[a-zA-Z]+\*?\{?([^}]+?)\}?', r'\1', raw_title)
@@ -101,18 +159,19 @@ class LatexProjectParser:
 
     @property
     def latex_verbatim_content(self) -> str:
-        return "\n".join(self._verbatim_parts)
+        return self.document.text
 
     def _find_main_tex_file(self) -> Optional[Path]:
-        all_tex_files = list(self.base_dir.rglob('*.tex'))
+        all_tex_files = self.file_index.files_with_suffix('.tex')
         if not all_tex_files: return None
         main_files_candidates = []
         for p in all_tex_files:
             try:
-                if p.stat().st_size > 5_000_000: continue
-                content = p.read_text(encoding='utf-8', errors='ignore')
-                if r'\documentclass' in content:
-                    main_files_candidates.append((p, r'\begin{document}' in content))
+                if self.file_index.size(p) > 5_000_000: continue
+                # \documentclass 总在文件开头附近，只读取文件头即可排除绝大多数非主文件
+                if r'\documentclass' not in self.file_index.read_head(p, MAIN_FILE_HEAD_CHARS): continue
+                content = self.file_index.read_text(p)
+                main_files_candidates.append((p, r'\begin{document}' in content))
             except Exception:
                 continue
         if not main_files_candidates:
@@ -126,51 +185,189 @@ class LatexProjectParser:
         return best_candidates[0]
 
     def _parse_file_and_extract_metadata(self, tex_file_path: Path):
-        if tex_file_path in self.processed_files or not tex_file_path.exists():
-            return
-        self.processed_files.add(tex_file_path)
-        file_dir = tex_file_path.parent
-        logger.info(f"正在处理文件: {tex_file_path.relative_to(self.base_dir)}")
-        try:
-            content = tex_file_path.read_text(encoding='utf-8', errors='ignore')
-
-            # --- MODIFICATION: Pre-clean the content for the parser ---
-            # 清理内容以进行结构化解析，这能解决参数内部注释的问题
-            content_for_parsing = _clean_latex_for_pylatexenc(content)
-
-            # 仍然将 *原始* 内容添加到 verbatim_parts，以保留完整的上下文给 LLM
-            self._verbatim_parts.append(content)
-
-            # 使用清理过的内容进行解析
-            lw = LatexWalker(content_for_parsing)
-
-            nodelist, _, _ = lw.get_latex_nodes(stop_on_error=False)
-            for node in nodelist:
-                if node.isNodeType(LatexMacroNode):
-                    macro_name = node.macroname.rstrip('*')
-                    if macro_name == 'title' and node.nodeargs:
-                        self.paper_title = LatexNodes2Text().nodelist_to_text(node.nodeargs[0].nodelist).strip()
-                    elif macro_name == 'bibliography' and node.nodeargs:
-                        bib_files_str = LatexNodes2Text().nodelist_to_text(node.nodeargs[0].nodelist)
-                        self.bib_file_names.extend([b.strip() for b in bib_files_str.split(',')])
-                    elif macro_name in ('input', 'include') and node.nodeargs:
-                        include_arg = LatexNodes2Text().nodelist_to_text(node.nodeargs[0].nodelist).strip()
-                        if not include_arg.endswith('.tex'): include_arg += '.tex'
-                        next_file_path = (file_dir / include_arg).resolve()
-                        self._parse_file_and_extract_metadata(next_file_path)
-                elif node.isNodeType(LatexEnvironmentNode):
-                    if node.environmentname.rstrip('*') == 'thebibliography':
-                        self.the_bibliography_content = node.latex_verbatim()
-        except Exception as e:
-            logger.error(f"无法读取或解析文件 {tex_file_path}: {e}", exc_info=False)
+        """
+        解析 tex_file_path 及其引入的所有文件。
+        先用正则廉价地发现 \\input/\\include/\\subfile/\\import 图，再按内容摘要并行（或从缓存）执行各文件的结构化解析，
+        最后按文档顺序回放各文件的解析事件，结果与逐个文件深度优先解析完全一致。
+        \\includeonly 生效时，未列出的 \\include 文件会被跳过（与 LaTeX 的行为一致）。
+        """
+        contents = self._discover_include_graph(tex_file_path)
+        walks = _walk_files(contents, self.max_workers)
+
+        def visit(path: Path) -> None:
+            if path in self.processed_files or not self.file_index.is_file(path):
+                return
+            self.processed_files.add(path)
+            file_dir = path.parent
+            logger.info(f"正在处理文件: {path.relative_to(self.base_dir)}")
+            try:
+                if path not in contents:
+                    # 正则未能发现的引入（例如参数中含有宏），在此按需读取并解析
+                    contents[path] = self.file_index.read_text(path)
+                    walks.update(_walk_files({path: contents[path]}, max_workers=1))
+                # 仍然将 *原始* 内容添加到 verbatim_parts，以保留完整的上下文给 LLM
+                self._verbatim_parts.append((path, contents[path]))
+                walk = walks[path]
+                for kind, value in walk["events"]:
+                    if kind == 'title':
+                        self.paper_title = value
+                    elif kind == 'bibliography':
+                        self.bib_file_names.extend([b.strip() for b in value.split(',')])
+                    elif kind == 'includeonly':
+                        self.include_only = {normalize_path(Path(name.strip())).with_suffix('').as_posix()
+                                             for name in value.split(',') if name.strip()}
+                    elif kind == 'include':
+                        macro_name, include_arg = value
+                        if (macro_name == 'include' and self.include_only is not None and
+                                normalize_path(Path(include_arg)).with_suffix('').as_posix() not in self.include_only):
+                            logger.info(f"\\includeonly 未包含 {include_arg}，已跳过。")
+                            continue
+                        next_file_path = self._resolve_include(file_dir, include_arg)
+                        if next_file_path is not None:
+                            visit(next_file_path)
+                        else:
+                            logger.warning(f"找不到被引入的文件: {include_arg}")
+                    elif kind == 'thebibliography':
+                        self.the_bibliography_content = value
+                if walk["error"]:
+                    raise RuntimeError(walk["error"])
+            except Exception as e:
+                logger.error(f"无法读取或解析文件 {path}: {e}", exc_info=False)
+
+        visit(tex_file_path)
+
+    def _resolve_include(self, file_dir: Path, include_arg: str) -> Optional[Path]:
+        # 先相对当前文件解析，再按 LaTeX 的实际行为相对主文件目录解析；
+        # 与 TeX 一致，优先尝试补全 .tex 扩展名，再尝试原样的文件名（支持没有扩展名的文件）
+        names = [include_arg] if include_arg.endswith('.tex') else [include_arg + '.tex', include_arg]
+        return self.file_index.resolve([directory / name for directory in (file_dir, self.main_file.parent)
+                                        for name in names])
+
+    def _discover_include_graph(self, root: Path) -> Dict[Path, str]:
+        """用正则扫描去除注释后的源码，找出从 root 可达的所有 .tex 文件并读取其内容。"""
+        contents: Dict[Path, str] = {}
+        pending = [root]
+        while pending:
+            path = pending.pop()
+            if path in contents or not self.file_index.is_file(path):
+                continue
+            try:
+                contents[path] = self.file_index.read_text(path)
+            except Exception as e:
+                logger.error(f"无法读取文件 {path}: {e}", exc_info=False)
+                continue
+            for match in _INCLUDE_PATTERN.finditer(_clean_latex_for_pylatexenc(contents[path])):
+                if match.group('file') is not None:
+                    include_arg = match.group('file').strip()
+                else:
+                    include_arg = _join_import_path(match.group('import_dir'), match.group('import_file'))
+                if (next_file_path := self._resolve_include(path.parent, include_arg)) is not None:
+                    pending.append(next_file_path)
+        return contents
 
 
-def find_bib_file_paths(bib_file_names: List[str], base_dir: Path) -> List[Path]:
-    # ... (此函数保持不变) ...
+def _walk_latex_source(content: str) -> Dict[str, Any]:
+    """
+    对单个文件执行 pylatexenc 结构化解析，按出现顺序返回与元数据相关的事件。
+    该函数是纯函数，可以在子进程中运行，其结果可按文件内容摘要缓存。
+
+    Returns:
+        Dict[str, Any]: {"events": [[类型, 值], ...], "error": 解析中途出错时的错误信息或 None}。
+    """
+    events = []
+
+    def arg_text(arg) -> str:
+        return _LATEX_TO_TEXT.nodelist_to_text(arg.nodelist if arg.isNodeType(LatexGroupNode) else [arg])
+
+    def visit(nodelist) -> None:
+        # 按文档顺序遍历，包括 document 等环境与分组内部；宏参数内部不再展开
+        for node in nodelist:
+            if node is None:
+                continue
+            if node.isNodeType(LatexMacroNode):
+                macro_name = node.macroname.rstrip('*')
+                args = [arg for arg in (node.nodeargs or []) if arg is not None]
+                if not args:
+                    continue
+                if macro_name == 'title':
+                    events.append(['title', arg_text(args[-1]).strip()])
+                elif macro_name in ('bibliography', 'addbibresource'):
+                    events.append(['bibliography', arg_text(args[-1])])
+                elif macro_name == 'includeonly':
+                    events.append(['includeonly', arg_text(args[-1])])
+                elif macro_name in INCLUDE_MACROS:
+                    events.append(['include', [macro_name, arg_text(args[-1]).strip()]])
+                elif macro_name in IMPORT_MACROS and len(args) >= 2:
+                    directory, file_name = (arg_text(arg) for arg in args[-2:])
+                    events.append(['include', [macro_name, _join_import_path(directory, file_name)]])
+            elif node.isNodeType(LatexEnvironmentNode):
+                if node.environmentname.rstrip('*') == 'thebibliography':
+                    events.append(['thebibliography', node.latex_verbatim()])
+                elif node.environmentname != 'comment':
+                    visit(node.nodelist)
+            elif node.isNodeType(LatexGroupNode):
+                visit(node.nodelist)
+
+    try:
+        # 清理内容以进行结构化解析，这能解决参数内部注释的问题；
+        # tolerant_parsing 使解析器在遇到不完整的结构时继续，而不是中断整个文件
+        lw = LatexWalker(_clean_latex_for_pylatexenc(content), latex_context=_LATEX_CONTEXT, tolerant_parsing=True)
+        nodelist, _, _ = lw.get_latex_nodes()
+        visit(nodelist)
+    except Exception as e:
+        return {"events": events, "error": str(e)}
+    return {"events": events, "error": None}
+
+
+def _join_import_path(directory: str, file_name: str) -> str:
+    """拼接 \\import{目录}{文件} 的两个参数。"""
+    directory = directory.strip()
+    return f"{directory.rstrip('/')}/{file_name.strip()}" if directory else file_name.strip()
+
+
+def _walk_files(contents: Dict[Path, str], max_workers: Optional[int]) -> Dict[Path, Dict[str, Any]]:
+    """
+    解析多个文件，结果按内容摘要缓存：内容未变化的文件不会被重新解析。
+    未命中缓存的文件数量达到 PARALLEL_PARSE_MIN_FILES 时，在进程池中并行解析。
+    """
+    results: Dict[Path, Dict[str, Any]] = {}
+    misses: Dict[str, List[Path]] = {}
+    keys: Dict[str, str] = {}
+    for path, content in contents.items():
+        digest = cache_handler.content_digest(content)
+        keys[digest] = cache_handler.make_cache_key(LATEX_WALK_CACHE_NAMESPACE, digest)
+        if (cached := cache_handler.get_from_cache(keys[digest], LATEX_WALK_CACHE_NAMESPACE)) is not None:
+            results[path] = cached
+        else:
+            misses.setdefault(digest, []).append(path)
+
+    if misses:
+        sources = [contents[paths[0]] for paths in misses.values()]
+        workers = min(max_workers or os.cpu_count() or 1, len(sources))
+        if workers > 1 and len(sources) >= PARALLEL_PARSE_MIN_FILES:
+            logger.info(f"在 {workers} 个进程中并行解析 {len(sources)} 个文件...")
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                walked = list(pool.map(_walk_latex_source, sources))
+        else:
+            walked = [_walk_latex_source(source) for source in sources]
+        for (digest, paths), walk in zip(misses.items(), walked):
+            if walk["error"] is None:
+                cache_handler.set_to_cache(keys[digest], walk, LATEX_WALK_CACHE_NAMESPACE)
+            for path in paths:
+                results[path] = walk
+    return results
+
+
+def find_bib_file_paths(bib_file_names: List[str], base_dir: Path,
+                        file_tree: Optional[FileTree] = None) -> List[Path]:
+    if file_tree is None:
+        file_tree = DiskFileTree(base_dir)
+    file_index = file_tree if isinstance(file_tree, ProjectFileIndex) else ProjectFileIndex(file_tree)
+    base_dir = file_index.base_dir
     found_paths = []
     for name in bib_file_names:
         bib_file_name = f"{name}.bib" if not name.endswith('.bib') else name
-        possible_paths = list(base_dir.rglob(f"**/{bib_file_name}"))
+        possible_paths = file_index.find_by_relative_name(bib_file_name)
         if possible_paths:
             found_paths.append(possible_paths[0])
             logger.info(f"成功定位到 .bib 文件: {possible_paths[0].relative_to(base_dir)}")
@@ -179,49 +376,52 @@ def find_bib_file_paths(bib_file_names: List[str], base_dir: Path) -> List[Path]
     return found_paths
 
 
-def parse_bib_files(bib_paths: List[Path]) -> Tuple[List[Dict[str, Any]], str]:
-    # ... (此函数保持不变) ...
-    bib_database, full_bib_content, processed_keys = None, "", set()
-    parser = bibtexparser.bparser.BibTexParser(common_strings=True)
+def parse_bib_files(bib_paths: List[Path], file_tree: Optional[FileTree] = None,
+                    cited_keys: Optional[Set[str]] = None) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    读取 .bib 文件并返回结构化参考文献。条目的 content 为其在文件中的原始文本，不再重新序列化。
+
+    Args:
+        bib_paths (List[Path]): .bib 文件路径（重复的键以先出现的文件为准）。
+        file_tree (FileTree, optional): 从中读取文件的文件树；为 None 时直接读取磁盘。
+        cited_keys (Set[str], optional): 只解析被引用的键；为 None 时解析全部条目。
+
+    Returns:
+        Tuple[List[Dict[str, Any]], str]: (参考文献列表, 所有 .bib 文件拼接后的内容)。
+    """
+    contents = []
     for bib_path in bib_paths:
         try:
-            with open(bib_path, 'r', encoding='utf-8') as bibfile:
-                content = bibfile.read()
-                db = bibtexparser.loads(content, parser=parser)
-                full_bib_content += content + "\n"
-                unique_entries = []
-                for entry in db.entries:
-                    if (key := entry.get('ID')) and key not in processed_keys:
-                        unique_entries.append(entry)
-                        processed_keys.add(key)
-                db.entries = unique_entries
-                if bib_database is None:
-                    bib_database = db
-                else:
-                    bib_database.entries.extend(db.entries)
+            if file_tree is not None:
+                contents.append(file_tree.read_text(bib_path))
+            else:
+                with open(bib_path, 'r', encoding='utf-8') as bibfile:
+                    contents.append(bibfile.read())
         except Exception as e:
-            logger.error(f"解析 .bib 文件 '{bib_path}' 时出错: {e}")
-    if not bib_database or not bib_database.entries: return [], full_bib_content
-    structured_references = []
-    for entry in bib_database.entries:
-        authors = re.sub(r'[\s\n]+', ' ', entry.get('author', '未知作者')).strip()
-        title = re.sub(r'[\s\n]+', ' ', entry.get('title', '无标题').replace('{', '').replace('}', '')).strip()
-        temp_db = bibtexparser.bibdatabase.BibDatabase();
-        temp_db.entries = [entry]
-        structured_references.append(
-            {"key": entry.get('ID', 'N/A'), "inferred_title": title, "inferred_author": authors,
-             "content": bibtexparser.dumps(temp_db)})
-    logger.info(f"从 .bib 文件中成功解析并去重了 {len(structured_references)} 条参考文献。")
+            logger.error(f"读取 .bib 文件 '{bib_path}' 时出错: {e}")
+    full_bib_content = "".join(content + "\n" for content in contents)
+    try:
+        entries = read_bib_entries(contents, cited_keys)
+    except Exception as e:
+        logger.error(f"解析 .bib 文件时出错: {e}")
+        return [], full_bib_content
+    structured_references = [entry_to_reference(entry) for entry in entries]
+    if cited_keys is not None:
+        logger.info(f"从 .bib 文件中解析了 {len(structured_references)} 条被引用的参考文献"
+                    f"（正文共引用 {len(cited_keys)} 个键）。")
+    else:
+        logger.info(f"从 .bib 文件中成功解析并去重了 {len(structured_references)} 条参考文献。")
     return structured_references, full_bib_content
 
 
-def extract_references_from_bbl(main_file_path: Path) -> Optional[str]:
-    # ... (此函数保持不变) ...
+def extract_references_from_bbl(main_file_path: Path, file_tree: Optional[FileTree] = None) -> Optional[str]:
+    if file_tree is None:
+        file_tree = DiskFileTree(main_file_path.parent)
     bbl_file_path = main_file_path.with_suffix('.bbl')
-    if bbl_file_path.is_file():
+    if file_tree.is_file(bbl_file_path):
         logger.info(f"找到了 BibTeX 生成的 .bbl 文件: {bbl_file_path.name}")
         try:
-            return bbl_file_path.read_text(encoding='utf-8', errors='ignore')
+            return file_tree.read_text(bbl_file_path)
         except Exception as e:
             logger.error(f"读取 .bbl 文件 '{bbl_file_path}' 时出错: {e}")
     return None
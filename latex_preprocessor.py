@@ -0,0 +1,184 @@
+# latex_preprocessor.py
+
+import bisect
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from citation_locator import CITATION_COMMANDS
+
+# \newcommand 系列的定义头：名称可写为 {\name} 或 \name，之后是可选的参数个数与第一个参数的默认值
+_NEWCOMMAND_HEAD = re.compile(
+    r'\\(?P<kind>newcommand|renewcommand|providecommand|DeclareRobustCommand)\*?\s*'
+    r'(?:\{\s*\\(?P<braced>[A-Za-z@]+)\s*\}|\\(?P<bare>[A-Za-z@]+))\s*'
+    r'(?:\[\s*(?P<nargs>\d)\s*\])?\s*(?:\[(?P<default>[^\]]*)\])?\s*(?=\{)'
+)
+# \def\name#1#2{...}：仅支持非定界参数
+_DEF_HEAD = re.compile(r'\\def\s*\\(?P<name>[A-Za-z@]+)(?P<params>(?:#\d)*)\s*(?=\{)')
+_PARAMETER = re.compile(r'#(\d)')
+_OPTIONAL_ARG = re.compile(r'\s*\[([^\]]*)\]')
+
+
+class MacroDefinition(NamedTuple):
+    """用户宏定义。default 不为 None 时，第一个参数是可选参数。"""
+    name: str
+    num_args: int
+    default: Optional[str]
+    body: str
+    start: int
+    end: int
+
+
+def read_group(text: str, pos: int) -> Optional[Tuple[str, int]]:
+    """
+    从 pos 开始（允许前导空白）读取一个花括号分组，正确处理嵌套与转义的花括号。
+
+    Returns:
+        Optional[Tuple[str, int]]: (分组内容, 分组结束后的位置)；pos 处不是分组时返回 None。
+    """
+    while pos < len(text) and text[pos] in ' \t\n':
+        pos += 1
+    if pos >= len(text) or text[pos] != '{':
+        return None
+    depth, i = 0, pos
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[pos + 1:i], i + 1
+        i += 1
+    return None
+
+
+def _read_optional(text: str, pos: int) -> Optional[Tuple[str, int]]:
+    """读取一个方括号可选参数（不支持嵌套的方括号）。"""
+    match = _OPTIONAL_ARG.match(text, pos)
+    return (match.group(1), match.end()) if match else None
+
+
+def collect_macro_definitions(source: str) -> Dict[str, MacroDefinition]:
+    """单次扫描源码，收集 \\newcommand/\\renewcommand/\\providecommand/\\DeclareRobustCommand/\\def 定义的宏。"""
+    definitions: Dict[str, MacroDefinition] = {}
+    heads = sorted(list(_NEWCOMMAND_HEAD.finditer(source)) + list(_DEF_HEAD.finditer(source)),
+                   key=lambda m: m.start())
+    for head in heads:
+        if (group := read_group(source, head.end())) is None:
+            continue
+        body, end = group
+        if head.re is _NEWCOMMAND_HEAD:
+            name = head.group('braced') or head.group('bare')
+            if head.group('kind') == 'providecommand' and name in definitions:
+                continue
+            definition = MacroDefinition(name, int(head.group('nargs') or 0), head.group('default'), body,
+                                         head.start(), end)
+        else:
+            name = head.group('name')
+            definition = MacroDefinition(name, len(head.group('params')) // 2, None, body, head.start(), end)
+        definitions[name] = definition
+    return definitions
+
+
+def citation_macros(definitions: Dict[str, MacroDefinition],
+                    commands: Iterable[str] = CITATION_COMMANDS) -> Dict[str, MacroDefinition]:
+    """返回（直接或间接）展开为引用命令的用户宏。"""
+    known = {name for cmd in commands for name in (cmd, cmd[0].upper() + cmd[1:])}
+    found: Dict[str, MacroDefinition] = {}
+    changed = True
+    while changed:
+        changed = False
+        for name, definition in definitions.items():
+            if name in found or name in known:
+                continue
+            used = set(re.findall(r'\\([A-Za-z@]+)', definition.body))
+            if used & (known | set(found)):
+                found[name] = definition
+                changed = True
+    return found
+
+
+class CitationMacroExpander:
+    """
+    展开源码中的引用宏（如 \\newcommand{\\citeref}[1]{\\citep{#1}}），使本地引用索引无需认识这些宏。
+    引用宏自身的定义在规范化后的源码中被移除，避免其中的 \\citep{#1} 被当作一次引用。
+    """
+
+    def __init__(self, macros: Dict[str, MacroDefinition], max_depth: int = 8):
+        self.macros = macros
+        self.max_depth = max_depth
+        self._pattern = None
+        if macros:
+            alternation = "|".join(sorted((re.escape(n) for n in macros), key=len, reverse=True))
+            self._pattern = re.compile(r'\\(' + alternation + r')(?![A-Za-z@])')
+
+    @classmethod
+    def from_source(cls, source: str) -> "CitationMacroExpander":
+        return cls(citation_macros(collect_macro_definitions(source)))
+
+    def _expand_call(self, text: str, match: re.Match, depth: int) -> Optional[Tuple[int, str]]:
+        """展开一次宏调用，返回 (调用结束位置, 展开后的文本)；参数不完整时返回 None。"""
+        definition = self.macros[match.group(1)]
+        pos, args = match.end(), []
+        if definition.default is not None:
+            optional = _read_optional(text, pos)
+            if optional is not None:
+                args.append(optional[0])
+                pos = optional[1]
+            else:
+                args.append(definition.default)
+        while len(args) < definition.num_args:
+            if (group := read_group(text, pos)) is None:
+                return None
+            args.append(group[0])
+            pos = group[1]
+        body = _PARAMETER.sub(lambda m: args[int(m.group(1)) - 1] if 0 < int(m.group(1)) <= len(args) else m.group(0),
+                              definition.body)
+        if depth < self.max_depth:
+            body = self.expand(body, depth + 1)
+        return pos, body
+
+    def find_expansions(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        计算规范化 text 所需的替换。
+
+        Returns:
+            List[Tuple[int, int, str]]: 按位置排列且互不重叠的 (起点, 终点, 替换文本)。
+        """
+        if self._pattern is None:
+            return []
+        definitions = sorted((d.start, d.end, '') for d in collect_macro_definitions(text).values()
+                             if d.name in self.macros)
+        definition_starts = [start for start, _, _ in definitions]
+        spans = list(definitions)
+        for match in self._pattern.finditer(text):
+            i = bisect.bisect_right(definition_starts, match.start()) - 1
+            if i >= 0 and definitions[i][1] > match.start():
+                continue  # 位于宏定义内部
+            if (expansion := self._expand_call(text, match, 0)) is not None:
+                spans.append((match.start(), expansion[0], expansion[1]))
+        spans.sort()
+        result, last = [], 0
+        for span in spans:
+            if span[0] >= last:
+                result.append(span)
+                last = span[1]
+        return result
+
+    def expand(self, text: str, depth: int = 0) -> str:
+        """展开 text 中的所有引用宏调用（不移除宏定义）。"""
+        if self._pattern is None:
+            return text
+        pieces, last = [], 0
+        for match in self._pattern.finditer(text):
+            if match.start() < last:
+                continue
+            if (expansion := self._expand_call(text, match, depth)) is not None:
+                pieces.append(text[last:match.start()])
+                pieces.append(expansion[1])
+                last = expansion[0]
+        pieces.append(text[last:])
+        return "".join(pieces)
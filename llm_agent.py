@@ -2,120 +2,513 @@
 # --- START OF FILE llm_agent.py ---
 
 import os
+import re
 import json
+import asyncio
+import logging
 from dotenv import load_dotenv
 from openai import AsyncOpenAI
 # MODIFIED: 移除了对 JSON_VALIDATOR_PROMPT 的导入
 from prompts import LATEX_REFERENCE_PARSER_PROMPT, get_latex_extraction_prompt, HTML_CORRECTOR_PROMPT
 from json_repair import repair_json
 import cache_handler
+import tracing
+from batch_planner import merge_analysis_results
+from bbl_parser import bibitem_key
+from json_stream import JSONArrayStream
+from llm_scheduler import LLMScheduler
 
 load_dotenv()
 
+MODEL_NAME = "deepseek-chat"
+# 每次请求允许的最大输出 token 数
+MAX_OUTPUT_TOKENS = 8192
+# 为 True 时以流式方式接收响应：按数据块之间的空闲时间（而非整个请求的墙钟时间）判断请求是否卡住，
+# 并随 token 到达增量解析结果数组；服务端不支持流式输出时可设为 "0"，退回到带墙钟超时的非流式请求
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+# 流式响应的超时（秒）：等待首个数据块（含服务端排队与处理提示词的时间），以及相邻两个数据块之间的最长间隔
+STREAM_FIRST_CHUNK_TIMEOUT = float(os.getenv("LLM_STREAM_FIRST_CHUNK_TIMEOUT", "60"))
+STREAM_IDLE_TIMEOUT = float(os.getenv("LLM_STREAM_IDLE_TIMEOUT", "20"))
+# 流式响应在收到部分内容后超过空闲超时时使用的 finish_reason，调用方按截断处理
+STREAM_STALLED = "stalled"
+# 抽取响应被截断（max_tokens 或中途卡住）后会为尚未输出的参考文献与引用续写；
+# 续写只要还有参考文献完成就继续，连续这么多次没有任何参考文献完成时放弃
+MAX_CONTINUATIONS = 3
+# 提示词版本：修改 prompts.py 中的提示词后应递增，使旧的缓存条目自然失效
+REFERENCE_PARSER_PROMPT_VERSION = "v1"
+EXTRACTION_PROMPT_VERSION = "v6"
+# 缓存命名空间，用于按用途统计与淘汰缓存条目；命名空间同时参与缓存键的计算
+REFERENCE_PARSER_CACHE_NAMESPACE = f"reference-parser:{MODEL_NAME}:{REFERENCE_PARSER_PROMPT_VERSION}"
+EXTRACTION_CACHE_NAMESPACE = f"generate:{MODEL_NAME}:{EXTRACTION_PROMPT_VERSION}"
+# 每百万 token 的价格（美元，默认按 deepseek-chat 标准时段计价），用于在运行追踪中估算每篇论文的费用
+PRICE_PER_MILLION_INPUT_TOKENS = float(os.getenv("LLM_PRICE_INPUT", "0.27"))
+PRICE_PER_MILLION_CACHED_INPUT_TOKENS = float(os.getenv("LLM_PRICE_CACHED_INPUT", "0.07"))
+PRICE_PER_MILLION_OUTPUT_TOKENS = float(os.getenv("LLM_PRICE_OUTPUT", "1.10"))
+# 前缀缓存布局使用的、与批次无关的系统提示词（模块加载时生成一次，保证各请求字节完全相同）
+EXTRACTION_SHARED_SYSTEM_PROMPT = get_latex_extraction_prompt()
+
+
+def prompt_cache_hit_tokens(usage) -> int:
+    """
+    读取服务端提示词前缀缓存命中的输入 token 数：
+    DeepSeek 返回 usage.prompt_cache_hit_tokens，OpenAI 返回 usage.prompt_tokens_details.cached_tokens。
+    """
+    hit_tokens = getattr(usage, "prompt_cache_hit_tokens", None)
+    if hit_tokens is None and (details := getattr(usage, "prompt_tokens_details", None)) is not None:
+        hit_tokens = getattr(details, "cached_tokens", None)
+    return int(hit_tokens or 0)
+
+
+def estimate_cost(prompt_tokens: int, prompt_cache_hit_tokens: int, completion_tokens: int) -> float:
+    """按 PRICE_PER_MILLION_* 估算一次请求的费用（美元），前缀缓存命中的输入 token 按缓存价计费。"""
+    return (PRICE_PER_MILLION_CACHED_INPUT_TOKENS * prompt_cache_hit_tokens
+            + PRICE_PER_MILLION_INPUT_TOKENS * (prompt_tokens - prompt_cache_hit_tokens)
+            + PRICE_PER_MILLION_OUTPUT_TOKENS * completion_tokens) / 1_000_000
+
+
+_PARTIAL_RESULT_KEY = re.compile(r'"key"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def partial_analysis_result(pending_text: str) -> dict | None:
+    """
+    从被截断的 analysis_results 元素原文中取出其 key 与已完整输出的引用；没有任何完整引用时返回 None。
+    被截断的那条引用本身会被丢弃，而不是交给 json_repair 补全成一条不完整的记录。
+    """
+    if not (match := _PARTIAL_RESULT_KEY.search(pending_text)):
+        return None
+    citations = JSONArrayStream("citations")
+    citations.feed(pending_text)
+    if not citations.items:
+        return None
+    return {"key": json.loads(f'"{match.group(1)}"'), "citations": citations.items}
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数：ASCII 字符约 4 个一个 token，非 ASCII 字符（如中文）约 1 个一个 token。"""
+    # 非 ASCII 字符数通过 C 层的 encode 得到，避免逐字符的 Python 循环（每篇参考文献的批次规划都要调用）
+    non_ascii = 0 if text.isascii() else len(text) - len(text.encode('ascii', 'ignore'))
+    return (len(text) - non_ascii) // 4 + non_ascii
+
 
 class LLMAgent:
     """封装了与大语言模型 (LLM) 交互的所有逻辑。"""
 
-    def __init__(self, api_key: str):
-        """初始化异步LLM客户端。"""
+    def __init__(self, api_key: str, scheduler: LLMScheduler | None = None):
+        """
+        初始化异步LLM客户端。
+
+        所有请求都经过 LLMScheduler 调度（并发、RPM/TPM 限流与重试），其参数可通过环境变量
+        LLM_MAX_CONCURRENCY、LLM_REQUESTS_PER_MINUTE、LLM_TOKENS_PER_MINUTE、LLM_MAX_RETRIES 配置；
+        也可以传入一个共享的调度器，让多个智能体共用同一个限流队列。
+        """
         base_url = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com")
         if not api_key:
             self.client = None
             print("⚠️ 警告: 未提供 API_KEY。LLM 智能体将无法工作。\n")
         else:
-            self.client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+            # 重试由调度器统一负责，因此关闭 SDK 自带的重试
+            self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        if tracing.QUIET_MODE:
+            # HTTP 客户端每个请求一行的 INFO 日志同样属于热路径输出
+            logging.getLogger("httpx").setLevel(logging.WARNING)
+        self.scheduler = scheduler or LLMScheduler(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")) or None,
+            tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "0")) or None,
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+        )
+        # 每个成功请求的 token 用量（含服务端前缀缓存命中数），按完成顺序记录
+        self.usage_records: list[dict] = []
 
-    async def run_reference_parser(self, references_text: str) -> list[dict]:
-        if not self.client: return []
-        cache_key = cache_handler.get_cache_key(references_text)
-        cached_data = cache_handler.get_from_cache(cache_key)
-        if cached_data:
-            return cached_data
+    async def aclose(self) -> None:
+        """关闭底层的 HTTP 客户端；应在事件循环结束前调用，避免连接在循环关闭后才被回收。"""
+        if self.client is not None:
+            await self.client.close()
+
+    async def _create_json_completion(self, system_prompt: str, user_content: str, timeout: float,
+                                      label: str = "", array_key: str | None = None) -> tuple[str, bool, JSONArrayStream]:
+        """
+        发起一次 JSON 模式的对话补全请求。
+        LLM_STREAMING 为 True 时以流式方式接收（见 _stream_completion），timeout 只用于非流式请求的墙钟超时。
+
+        Returns:
+            tuple[str, bool, JSONArrayStream]: (响应内容, 是否被截断（达到 max_tokens 或流式响应中途卡住）,
+            响应中 array_key 下已完整输出的数组元素)。
+        """
+        estimated_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_content)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
+        ]
+        with tracing.span("llm.call", label=label, model=MODEL_NAME, estimated_tokens=estimated_tokens,
+                          streaming=LLM_STREAMING) as span:
+            if LLM_STREAMING:
+                content, finish_reason, usage, stream = await self.scheduler.submit(
+                    lambda: self._stream_completion(messages, array_key),
+                    estimated_tokens=estimated_tokens,
+                    label=label,
+                )
+            else:
+                response = await self.scheduler.submit(
+                    lambda: self.client.chat.completions.create(
+                        model=MODEL_NAME,
+                        messages=messages,
+                        temperature=0.0,  # 使用0.0以获得最确定性的结果
+                        max_tokens=MAX_OUTPUT_TOKENS,
+                        timeout=timeout,
+                        response_format={"type": "json_object"}
+                    ),
+                    estimated_tokens=estimated_tokens,
+                    label=label,
+                )
+                choice = response.choices[0]
+                content, finish_reason, usage = choice.message.content or "", choice.finish_reason, response.usage
+                stream = JSONArrayStream(array_key)
+                stream.feed(content)
+            if usage:
+                cached_tokens = prompt_cache_hit_tokens(usage)
+                self.scheduler.record_usage(estimated_tokens, usage.prompt_tokens, usage.completion_tokens, cached_tokens)
+                self.usage_records.append({"label": label, "prompt_tokens": usage.prompt_tokens,
+                                           "prompt_cache_hit_tokens": cached_tokens,
+                                           "completion_tokens": usage.completion_tokens})
+                if span is not None:
+                    span.set(prompt_tokens=usage.prompt_tokens, prompt_cache_hit_tokens=cached_tokens,
+                             completion_tokens=usage.completion_tokens,
+                             cost=estimate_cost(usage.prompt_tokens, cached_tokens, usage.completion_tokens))
+                tracing.detail(f"   └── Token 用量: 输入 {usage.prompt_tokens}（缓存命中 {cached_tokens}）, "
+                               f"输出 {usage.completion_tokens}")
+            if span is not None:
+                span.set(finish_reason=finish_reason or "")
+        return content, finish_reason in ("length", STREAM_STALLED), stream
+
+    async def _stream_completion(self, messages: list[dict], array_key: str | None) -> tuple[str, str, object, JSONArrayStream]:
+        """
+        以流式方式执行一次补全请求，随数据块到达增量解析 array_key 下的数组。
+
+        等待首个数据块超过 STREAM_FIRST_CHUNK_TIMEOUT、或相邻数据块的间隔超过 STREAM_IDLE_TIMEOUT 时放弃该流：
+        尚未收到任何内容时抛出 TimeoutError，由调度器按可重试错误处理；已收到部分内容时以 STREAM_STALLED 返回，
+        调用方像处理 max_tokens 截断一样只为剩余部分续写，而不是丢弃已生成的内容。
 
-        print("--- (异步) 正在调用 LLM 精确解析参考文献列表... --- ")
-        user_content = f"请根据你的指令，精确解析以下 LaTeX 文本中的所有参考文献：\n--- 参考文献文本开始 ---\n{references_text}\n--- 参考文献文本结束 ---"
+        Returns:
+            tuple[str, str, object, JSONArrayStream]: (响应内容, finish_reason, usage（服务端未返回时为 None）, 增量解析器)。
+        """
+        response = await self.client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=messages,
+            temperature=0.0,
+            max_tokens=MAX_OUTPUT_TOKENS,
+            timeout=STREAM_FIRST_CHUNK_TIMEOUT,
+            response_format={"type": "json_object"},
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        stream = JSONArrayStream(array_key)
+        parts, finish_reason, usage = [], None, None
+        chunks = response.__aiter__()
+        timeout = STREAM_FIRST_CHUNK_TIMEOUT
         try:
-            response = await self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": LATEX_REFERENCE_PARSER_PROMPT},
-                    {"role": "user", "content": user_content}
-                ],
-                temperature=0.0,
-                max_tokens=8192,
-                timeout=180.0,
-                response_format={"type": "json_object"}
-            )
-            response_content = response.choices[0].message.content
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    if not parts:
+                        raise
+                    tracing.detail(f"   └── ⚠️ 流式响应超过 {timeout:.0f}s 没有新数据，保留已收到的 {len(parts)} 个数据块。")
+                    finish_reason = STREAM_STALLED
+                    break
+                timeout = STREAM_IDLE_TIMEOUT
+                if chunk.usage:
+                    usage = chunk.usage
+                for choice in chunk.choices:
+                    if choice.delta is not None and choice.delta.content:
+                        parts.append(choice.delta.content)
+                        stream.feed(choice.delta.content)
+                    if choice.finish_reason:
+                        finish_reason = choice.finish_reason
+        finally:
+            await response.close()
+        if finish_reason is None:
+            if not parts:
+                raise ConnectionError("流式响应在输出任何内容之前结束。")
+            # 连接在没有 finish_reason 的情况下结束：与卡住的流一样按截断处理
+            finish_reason = STREAM_STALLED
+        return "".join(parts), finish_reason, usage, stream
+
+    async def _parse_references_text(self, references_text: str) -> tuple[list[dict] | None, bool]:
+        """
+        解析一段参考文献文本。返回 (结果列表或 None, 响应是否被截断)。
+        同一段文本的并发请求（如重复的 bibitem）只会触发一次 LLM 调用。
+        正在进行的那次请求失败或响应被截断（结果不可缓存）时，等待者会自行重新发起请求，而不是拿到空结果。
+        """
+        cache_key = cache_handler.make_cache_key(REFERENCE_PARSER_CACHE_NAMESPACE,
+                                                 cache_handler.content_digest(references_text))
+        while True:
+            cached_data = cache_handler.get_from_memory(cache_key)
+            if cached_data is not None:
+                return cached_data, False
+            if (inflight := cache_handler.begin_flight(cache_key)) is None:
+                break
+            if (shared := await inflight) is not None:
+                return shared, False
+
+        result, truncated = None, False
+        try:
+            # 先声明计算再查询磁盘缓存：等待磁盘读取期间到达的同一请求会合并到本次计算上
+            cached_data = await cache_handler.aget_from_backend(cache_key, namespace=REFERENCE_PARSER_CACHE_NAMESPACE)
+            if cached_data is not None:
+                result = cached_data
+                return cached_data, False
+            print("--- (异步) 正在调用 LLM 精确解析参考文献列表... --- ")
+            user_content = f"请根据你的指令，精确解析以下 LaTeX 文本中的所有参考文献：\n--- 参考文献文本开始 ---\n{references_text}\n--- 参考文献文本结束 ---"
+            response_content, truncated, stream = await self._create_json_completion(
+                LATEX_REFERENCE_PARSER_PROMPT, user_content, timeout=180.0, label="reference-parser",
+                array_key="references")
+            if truncated and stream.items:
+                # 被截断的响应只保留已完整输出的条目，其余条目由 run_reference_parser_batch 续写
+                return stream.items, True
             repaired_json_string = repair_json(response_content)
             parsed_json = json.loads(repaired_json_string)
 
             if isinstance(parsed_json, dict) and "references" in parsed_json and isinstance(parsed_json["references"], list):
                 result = parsed_json["references"]
-                cache_handler.set_to_cache(cache_key, result)
-                return result
+                if not truncated:
+                    await cache_handler.aset_to_cache(cache_key, result, namespace=REFERENCE_PARSER_CACHE_NAMESPACE)
+                return result, truncated
             else:
                 raise ValueError("返回的JSON格式不符合预期。")
         except Exception as e:
             print(f"❌ 错误: 解析或修复 LLM 参考文献响应失败: {e}")
-            return []
+            return None, False
+        finally:
+            cache_handler.finish_flight(cache_key, result if not truncated else None)
+
+    async def run_reference_parser(self, references_text: str) -> list[dict]:
+        if not self.client: return []
+        result, _ = await self._parse_references_text(references_text)
+        return result or []
+
+    async def run_reference_parser_batch(self, bib_items: list[str]) -> list[dict]:
+        """
+        将多个 \\bibitem 条目合并为一次请求解析。
+        如果响应被截断（max_tokens 或流式响应中途卡住），保留已完整解析的条目，只为其余条目续写；
+        截断前没有任何条目完整输出时，将批次对半拆分后分别重试。
+        """
+        if not self.client or not bib_items: return []
+        result, truncated = await self._parse_references_text("".join(bib_items))
+        if truncated and result:
+            parsed_keys = {ref.get('key') for ref in result if isinstance(ref, dict)}
+            remaining = [item for item in bib_items if bibitem_key(item) not in parsed_keys]
+            if 0 < len(remaining) < len(bib_items):
+                print(f"⚠️ 参考文献解析响应被截断，已完整解析 {len(bib_items) - len(remaining)} 个条目，"
+                      f"为其余 {len(remaining)} 个条目续写。")
+                return result + await self.run_reference_parser_batch(remaining)
+            if not remaining:
+                return result
+        if truncated and len(bib_items) > 1:
+            mid = len(bib_items) // 2
+            print(f"⚠️ 参考文献解析响应被截断，将 {len(bib_items)} 个条目拆分为两个批次重试。")
+            first, second = await asyncio.gather(self.run_reference_parser_batch(bib_items[:mid]),
+                                                 self.run_reference_parser_batch(bib_items[mid:]))
+            return first + second
+        return result or []
 
     # _run_json_validation_checker 函数已彻底移除
 
-    async def run_extraction_batch(self, full_latex_source: str, references_batch: list[dict]) -> dict | None:
+    @staticmethod
+    def _reference_cache_key(reference: dict, source_fingerprint: str, source_is_excerpt: bool,
+                             shared_prefix: bool = False) -> str:
+        """
+        计算单篇参考文献抽取结果的缓存键。
+        只依赖于参考文献本身的条目内容（不含随排序变化的 id）与引用它的源码片段的摘要，
+        因此修改论文中与该文献无关的部分不会使其缓存失效。
+        """
+        stable_fields = {k: v for k, v in reference.items() if k not in ("id", "citations", "analysis_failed")}
+        reference_digest = cache_handler.content_digest(json.dumps(stable_fields, sort_keys=True, ensure_ascii=False))
+        mode = "excerpt" if source_is_excerpt else ("prefix" if shared_prefix else "full")
+        return cache_handler.make_cache_key(EXTRACTION_CACHE_NAMESPACE, mode, source_fingerprint, reference_digest)
+
+    async def run_extraction_batch(self, full_latex_source: str, references_batch: list[dict],
+                                   source_is_excerpt: bool = False,
+                                   source_fingerprints: dict[str, str] | None = None,
+                                   shared_prefix: bool = False) -> dict | None:
         """
         运行核心的上下文抽取智能体。
         此版本已简化，移除了第二阶段验证。
+
+        缓存按参考文献逐条存取：source_fingerprints 将 key 映射到引用该文献的源码片段的摘要；
+        未提供时退回到整份源码的摘要（每个批次只计算一次）。批次中已命中缓存的文献不会再发给 LLM，
+        正由其他任务计算中的文献则等待那次计算的结果（single-flight）。
+        当 source_is_excerpt 为 True 时，full_latex_source 仅包含与该批次相关的段落摘录。
+        当 shared_prefix 为 True 时，使用前缀缓存友好的提示词布局（见 _build_extraction_messages）。
         """
         if not self.client: return None
 
-        references_batch_str = json.dumps(references_batch, sort_keys=True)
-        # 使用 v5 最终版缓存键
-        cache_key_data_generate = f"generate_v5_{full_latex_source}{references_batch_str}"
-        cache_key_generate = cache_handler.get_cache_key(cache_key_data_generate)
+        cached_results, pending_references, pending_cache_keys, inflight, owned = [], [], {}, [], []
+        full_source_digest = None
+        for ref in references_batch:
+            if not (fingerprint := (source_fingerprints or {}).get(ref['key'])):
+                full_source_digest = full_source_digest or cache_handler.content_digest(full_latex_source)
+                fingerprint = full_source_digest
+            cache_key = self._reference_cache_key(ref, fingerprint, source_is_excerpt, shared_prefix)
+            cached_result = cache_handler.get_from_memory(cache_key)
+            if cached_result:
+                cached_results.append(cached_result)
+            elif (future := cache_handler.begin_flight(cache_key)) is not None:
+                inflight.append(future)
+            else:
+                owned.append((ref, cache_key))
 
-        start_key = references_batch[0]['key']
-        end_key = references_batch[-1]['key']
+        # 由本批次负责计算的键先在 I/O 线程池中并发查询磁盘缓存，仍未命中的才交给 LLM
+        try:
+            disk_results = await asyncio.gather(*(
+                cache_handler.aget_from_backend(cache_key, namespace=EXTRACTION_CACHE_NAMESPACE)
+                for _, cache_key in owned))
+        except BaseException:
+            for _, cache_key in owned:
+                cache_handler.finish_flight(cache_key, None)
+            raise
+        for (ref, cache_key), cached_result in zip(owned, disk_results):
+            if cached_result:
+                cache_handler.finish_flight(cache_key, cached_result)
+                cached_results.append(cached_result)
+            else:
+                pending_references.append(ref)
+                pending_cache_keys[ref['key']] = cache_key
 
-        # 尝试从缓存中获取生成结果
-        response_content = cache_handler.get_from_cache(cache_key_generate)
+        new_results = []
+        if pending_references:
+            results_by_key = {}
+            try:
+                extracted = await self._extract_uncached(full_latex_source, pending_references, source_is_excerpt,
+                                                         shared_prefix)
+                results_by_key = {key: result for key, (result, complete) in extracted.items()}
+                await asyncio.gather(*(
+                    cache_handler.aset_to_cache(cache_key, result, namespace=EXTRACTION_CACHE_NAMESPACE)
+                    for key, (result, complete) in extracted.items()
+                    if complete and (cache_key := pending_cache_keys.get(key))))
+                new_results = [result for key, result in results_by_key.items() if key in pending_cache_keys]
+            finally:
+                for key, cache_key in pending_cache_keys.items():
+                    cache_handler.finish_flight(cache_key, results_by_key.get(key))
+        elif not inflight:
+            tracing.detail(f"--- 命中生成缓存: {references_batch[0]['key']} 到 {references_batch[-1]['key']} ---")
 
-        if not response_content:
-            print(f"--- (异步) 调用 LLM 分析参考文献 {start_key} 到 {end_key}... ---")
-            system_prompt = get_latex_extraction_prompt(start_key, end_key)
+        coalesced_results = [result for result in await asyncio.gather(*inflight) if result]
+        all_results = cached_results + coalesced_results + new_results
+        return {"analysis_results": all_results} if all_results else None
+
+    @staticmethod
+    def _build_extraction_messages(full_latex_source: str, references_batch: list[dict], source_is_excerpt: bool,
+                                   shared_prefix: bool,
+                                   extracted_citations: dict[str, list[str]] | None = None) -> tuple[str, str]:
+        """
+        组装抽取请求的 (系统提示词, 用户消息)。
+
+        默认布局的系统提示词包含批次的起止键。shared_prefix 布局下，系统提示词与完整源码构成一个
+        在所有批次间字节完全相同的前缀，批次相关的内容（起止键与参考文献 JSON）全部放在用户消息末尾，
+        使服务端的提示词前缀缓存可以在批次之间复用源码部分。
+        续写请求通过 extracted_citations（key -> 已提取的引文句）告知模型哪些引用无需再次输出，附加在用户消息末尾。
+        """
+        start_key = references_batch[0]['key']
+        end_key = references_batch[-1]['key']
+        batch_json = json.dumps(references_batch, indent=2, ensure_ascii=False)
+        if shared_prefix and not source_is_excerpt:
+            system_prompt = EXTRACTION_SHARED_SYSTEM_PROMPT
             user_content = (
                 f"这是你需要分析的完整LaTeX源码:\n--- LaTeX源码开始 ---\n{full_latex_source}\n--- LaTeX源码结束 ---\n\n"
-                f"这是当前批次需要你处理的参考文献列表 (JSON格式):\n--- 参考文献批次开始 ---\n{json.dumps(references_batch, indent=2, ensure_ascii=False)}\n--- 参考文献批次结束 ---"
+                f"这是当前批次（从 {start_key} 到 {end_key}）需要你处理的参考文献列表 (JSON格式):\n"
+                f"--- 参考文献批次开始 ---\n{batch_json}\n--- 参考文献批次结束 ---"
+            )
+        else:
+            source_intro = ("这是LaTeX源码中与当前批次参考文献相关的段落摘录（按原文顺序排列，"
+                            "`% [章节: ...]` 注释标明了摘录所属章节）"
+                            if source_is_excerpt else "这是你需要分析的完整LaTeX源码")
+            system_prompt = get_latex_extraction_prompt(start_key, end_key)
+            user_content = (
+                f"{source_intro}:\n--- LaTeX源码开始 ---\n{full_latex_source}\n--- LaTeX源码结束 ---\n\n"
+                f"这是当前批次需要你处理的参考文献列表 (JSON格式):\n--- 参考文献批次开始 ---\n{batch_json}\n--- 参考文献批次结束 ---"
             )
+        if extracted_citations:
+            user_content += (
+                "\n\n以下参考文献的部分引用已在之前的响应中提取（按 key 列出已提取的引文句）。"
+                "请照常输出这些参考文献的对象，但 citations 中只包含尚未提取的其余引用，不要重复下列句子:\n"
+                f"--- 已提取的引用开始 ---\n{json.dumps(extracted_citations, ensure_ascii=False, indent=2)}\n"
+                f"--- 已提取的引用结束 ---"
+            )
+        return system_prompt, user_content
+
+    async def _extract_uncached(self, full_latex_source: str, references_batch: list[dict],
+                                source_is_excerpt: bool, shared_prefix: bool = False) -> dict[str, tuple[dict, bool]]:
+        """
+        调用 LLM 抽取一批参考文献的引用上下文（不经过缓存）。
+        如果响应被截断（max_tokens 或流式响应中途卡住），已完整输出的参考文献直接保留，被截断的那篇保留其已完整输出的引用；
+        随后只为尚未完成的参考文献发起续写请求并告知已提取的引文句，按 key 合并各次响应的结果。
+        续写在连续 MAX_CONTINUATIONS 次没有完成任何参考文献时放弃。
+
+        Returns:
+            dict[str, tuple[dict, bool]]: key -> (抽取结果, 结果是否完整可缓存)。
+        """
+        start_key = references_batch[0]['key']
+        end_key = references_batch[-1]['key']
+        tracing.detail(f"--- (异步) 调用 LLM 分析参考文献 {start_key} 到 {end_key}（共 {len(references_batch)} 篇）... ---")
+        chunks, complete_keys = [], set()
+        remaining, extracted_citations = references_batch, None
+        attempt = stalled_attempts = 0
+        while True:
+            system_prompt, user_content = self._build_extraction_messages(full_latex_source, remaining, source_is_excerpt,
+                                                                          shared_prefix, extracted_citations)
+            label = f"{start_key}-{end_key}" + (f"#{attempt}" if attempt else "")
             try:
-                response = await self.client.chat.completions.create(
-                    model="deepseek-chat",
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_content}
-                    ],
-                    temperature=0.0, # 使用0.0以获得最确定性的结果
-                    max_tokens=8192,
-                    timeout=300.0,
-                    response_format={"type": "json_object"}
-                )
-                response_content = response.choices[0].message.content
-                cache_handler.set_to_cache(cache_key_generate, response_content)
+                response_content, truncated, stream = await self._create_json_completion(
+                    system_prompt, user_content, timeout=300.0, label=label, array_key="analysis_results")
             except Exception as e:
                 print(f"\n❌ 错误: 调用LLM分析批次 {start_key} - {end_key} 时发生错误: {e}")
-                return None
-        else:
-            print(f"--- 命中生成缓存: {start_key} 到 {end_key} ---")
+                break
 
-        # 直接处理并返回结果
-        try:
-            repaired_json_string = repair_json(response_content)
-            final_result = json.loads(repaired_json_string)
-            print(f"--- ✅ LLM 成功为参考文献 {start_key} - {end_key} 生成了JSON数据。 ---")
-            return final_result
-        except Exception as e:
-            print(f"\n❌ 错误: 修复批次 {start_key} - {end_key} 的JSON时发生严重错误: {e}")
-            return None
+            if not truncated:
+                try:
+                    repaired_json_string = repair_json(response_content)
+                    final_result = json.loads(repaired_json_string)
+                except Exception as e:
+                    print(f"\n❌ 错误: 修复批次 {start_key} - {end_key} 的JSON时发生严重错误: {e}")
+                    break
+                chunks.append(final_result if isinstance(final_result, dict) else None)
+                complete_keys.update(ref['key'] for ref in remaining)
+                break
+
+            # 截断：只保留已完整输出的参考文献，以及被截断的那篇中已完整输出的引用
+            finished_keys = {item.get('key') for item in stream.items if isinstance(item, dict)}
+            complete_keys.update(finished_keys & {ref['key'] for ref in remaining})
+            chunks.append({"analysis_results": stream.items})
+            if partial := partial_analysis_result(stream.pending_text):
+                chunks.append({"analysis_results": [partial]})
+            remaining = [ref for ref in remaining if ref['key'] not in finished_keys]
+            if not remaining:
+                break
+            merged = merge_analysis_results(chunks)
+            previous = extracted_citations or {}
+            extracted_citations = {
+                ref['key']: [c.get("citation_sentence", "") for c in merged[ref['key']]["citations"]]
+                for ref in remaining if merged.get(ref['key'], {}).get("citations")}
+            if not finished_keys and extracted_citations == previous:
+                print(f"⚠️ 批次 {start_key} - {end_key} 的响应被截断且没有新的完整结果，停止续写。")
+                break
+            stalled_attempts = 0 if finished_keys else stalled_attempts + 1
+            if stalled_attempts >= MAX_CONTINUATIONS:
+                print(f"⚠️ 批次 {start_key} - {end_key} 连续 {MAX_CONTINUATIONS} 次续写没有完成任何参考文献，"
+                      f"{len(remaining)} 篇参考文献的结果可能不完整。")
+                break
+            attempt += 1
+            print(f"⚠️ 批次 {start_key} - {end_key} 的响应被截断，已完成 {len(references_batch) - len(remaining)} 篇，"
+                  f"为其余 {len(remaining)} 篇续写（第 {attempt} 次）。")
+
+        if not chunks:
+            return {}
+        merged = merge_analysis_results(chunks)
+        tracing.detail(f"--- ✅ LLM 成功为参考文献 {start_key} - {end_key} 生成了JSON数据。 ---")
+        return {key: (result, key in complete_keys) for key, result in merged.items()}
 
     async def run_html_correction_batch(self, html_chunk_to_correct: str) -> str:
         # ... (此函数保持不变)
@@ -0,0 +1,201 @@
+# llm_scheduler.py
+
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import tracing
+
+T = TypeVar("T")
+
+# 被视为可重试的 HTTP 状态码
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+# 无法从状态码判断时，按异常类名识别的可重试错误（openai SDK 的超时/连接错误）
+RETRYABLE_EXCEPTION_NAMES = {"APITimeoutError", "APIConnectionError", "TimeoutError", "ConnectionError"}
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """判断一个异常是否应当重试：429、5xx、超时与连接错误。"""
+    status_code = getattr(exc, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in RETRYABLE_EXCEPTION_NAMES for cls in type(exc).__mro__)
+
+
+def _retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """读取响应头中的 Retry-After（如果服务端提供了的话）。"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    每分钟配额的令牌桶。容量为每分钟限额，按秒匀速补充。
+    limit_per_minute 为 0 或 None 时不做任何限制。
+    """
+
+    def __init__(self, limit_per_minute: Optional[int]):
+        self.capacity = float(limit_per_minute or 0)
+        self._tokens = self.capacity
+        self._refill_rate = self.capacity / 60.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._refill_rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """等待直到桶中有足够的令牌。超过容量的请求按容量计，避免永远等待。"""
+        if not self.enabled:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self._refill_rate)
+
+    def adjust(self, delta: float) -> None:
+        """根据实际用量修正预扣的令牌（delta 为正表示多用了，允许暂时为负）。"""
+        if self.enabled:
+            self._refill()
+            self._tokens -= delta
+
+
+class LLMScheduler:
+    """
+    LLM 请求调度器：限制并发数、每分钟请求数 (RPM) 与每分钟 token 数 (TPM)，
+    并对 429/5xx/超时错误进行带抖动的指数退避重试。
+    """
+
+    def __init__(self,
+                 max_concurrency: int = 8,
+                 requests_per_minute: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None,
+                 max_retries: int = 5,
+                 base_delay: float = 1.0,
+                 max_delay: float = 60.0,
+                 is_retryable: Callable[[BaseException], bool] = is_retryable_error):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_retryable = is_retryable
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._request_bucket = TokenBucket(requests_per_minute)
+        self._token_bucket = TokenBucket(tokens_per_minute)
+
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.prompt_cache_hit_tokens = 0
+        self.completion_tokens = 0
+
+    def _backoff_delay(self, attempt: int, exc: BaseException) -> float:
+        """计算第 attempt 次重试前的等待时间：full jitter 指数退避，且不短于 Retry-After。"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = _retry_after_seconds(exc)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    async def submit(self, request_factory: Callable[[], Awaitable[T]], estimated_tokens: int = 0,
+                     label: str = "") -> T:
+        """
+        在调度器的限制下执行一个 LLM 请求，必要时重试。
+
+        Args:
+            request_factory (Callable[[], Awaitable[T]]): 每次调用都返回一个新的请求协程。
+            estimated_tokens (int): 请求预计消耗的 token 数，用于 TPM 限流。
+            label (str): 日志中显示的请求标识。
+
+        Returns:
+            T: 请求的返回值。
+
+        Raises:
+            Exception: 不可重试的错误，或重试次数耗尽后的最后一个错误。
+        """
+        self.queued += 1
+        dequeued = False
+        enqueued_at = time.perf_counter()
+        try:
+            async with self._semaphore:
+                self.queued -= 1
+                dequeued = True
+                tracing.count("queue_seconds", time.perf_counter() - enqueued_at)
+                attempt = 0
+                while True:
+                    await self._request_bucket.acquire(1)
+                    await self._token_bucket.acquire(estimated_tokens)
+                    self.in_flight += 1
+                    try:
+                        result = await request_factory()
+                        self.completed += 1
+                        return result
+                    except Exception as e:
+                        if attempt >= self.max_retries or not self.is_retryable(e):
+                            self.failed += 1
+                            raise
+                        delay = self._backoff_delay(attempt, e)
+                        attempt += 1
+                        self.retries += 1
+                        tracing.count("retries")
+                        tracing.detail(f"   └── ⏳ 请求 {label} 失败 ({type(e).__name__})，{delay:.1f}s 后进行第 {attempt} 次重试"
+                                       f"（排队 {self.queued}，进行中 {self.in_flight - 1}）。")
+                    finally:
+                        self.in_flight -= 1
+                    await asyncio.sleep(delay)
+        finally:
+            if not dequeued:
+                self.queued -= 1
+
+    def record_usage(self, estimated_tokens: int, prompt_tokens: int, completion_tokens: int,
+                     prompt_cache_hit_tokens: int = 0) -> None:
+        """累计实际 token 用量（含服务端前缀缓存命中的输入 token 数），并用它修正 TPM 限流器。"""
+        self.prompt_tokens += prompt_tokens
+        self.prompt_cache_hit_tokens += prompt_cache_hit_tokens
+        self.completion_tokens += completion_tokens
+        self._token_bucket.adjust(prompt_tokens + completion_tokens - estimated_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "prompt_cache_hit_tokens": self.prompt_cache_hit_tokens,
+            "completion_tokens": self.completion_tokens,
+            "max_concurrency": self.max_concurrency,
+        }
+
+    def describe(self) -> str:
+        s = self.stats()
+        description = (f"LLM 调度器: 完成 {s['completed']}，失败 {s['failed']}，重试 {s['retries']}，"
+                       f"排队 {s['queued']}，进行中 {s['in_flight']}（并发上限 {s['max_concurrency']}）")
+        if s['prompt_tokens']:
+            description += (f"；输入 token 前缀缓存命中 {s['prompt_cache_hit_tokens']}/{s['prompt_tokens']}"
+                            f"（{s['prompt_cache_hit_tokens'] / s['prompt_tokens']:.0%}）")
+        return description
@@ -2,10 +2,11 @@
 
 import os
 import asyncio
-import re
+import json
+import time
 from datetime import datetime
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
 # NEW: 从 langchain_analysis_tool.py 移动过来的导入
@@ -13,153 +14,298 @@ from langchain_core.tools import tool
 from langchain_core.pydantic_v1 import BaseModel, Field
 
 import llm_agent
-from latex_parser import LatexProjectParser, find_bib_file_paths, parse_bib_files, extract_references_from_bbl
+from latex_parser import LatexProjectParser, LATEX_PARSE_WORKERS, find_bib_file_paths, parse_bib_files, extract_references_from_bbl
 import file_writer
 import archive_handler
 import cache_handler
+import executors
+import pipeline
+import result_export
+import tracing
+from bbl_parser import parse_references_block
+from batch_planner import plan_token_batches, estimate_extraction_output_tokens, merge_analysis_results
+from citation_locator import build_citation_index, collect_cited_keys, CitationIndex, ContextSlicer
+from merged_document import MergedDocument
+from report_renderer import render_footer, render_header, render_reference_html
+from incremental import ProjectManifest, default_project_id, digest_project_files
 
 # --- 配置 ---
 EXTRACT_DIR = './data'
+# 归档载入方式: "memory" 只把 .tex/.bib/.bbl 成员流式读入内存；"extract" 为旧行为，完整解压到 EXTRACT_DIR
+INGESTION_MODE = os.getenv("INGESTION_MODE", "memory")
 OUTPUT_HTML_FILE = 'references_analysis_report.html'
-BATCH_SIZE = 1
-REFERENCE_PARSING_BATCH_SIZE = 1
-
-# --- HTML 模板 (保持不变) ---
-HTML_HEADER = """
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>参考文献分析报告 - {title}</title>
-    <style>
-        body {{ font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif; line-height: 1.6; color: #333; background-color: #f8f9fa; margin: 0; padding: 20px; }}
-        .container {{ max-width: 900px; margin: 0 auto; background-color: #fff; padding: 2rem; border-radius: 8px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1); }}
-        h1, h2, h3 {{ color: #0056b3; }}
-        h1 {{ border-bottom: 2px solid #dee2e6; padding-bottom: 0.5rem; margin-bottom: 1rem; text-align: center; }}
-        h2 em {{ font-weight: normal; color: #555; font-size: 0.8em; }}
-        .reference-item {{ margin-bottom: 2rem; padding: 1.5rem; border: 1px solid #e9ecef; border-radius: 6px; background-color: #ffffff; transition: box-shadow 0.3s ease; }}
-        .reference-item:hover {{ box-shadow: 0 8px 16px rgba(0,0,0,0.1); }}
-        blockquote {{ margin: 0; padding: 1rem; background-color: #f8f9fa; border-left: 5px solid #007bff; }}
-        ul {{ padding-left: 20px; }}
-        li {{ margin-bottom: 0.5rem; }}
-        code {{ background-color: #e9ecef; color: #d63384; padding: 2px 4px; border-radius: 3px; }}
-        .citation-context li strong:first-child {{ color: #28a745; }}
-        .citation-context strong {{ color: #d9534f; }}
-        .footer {{ text-align: center; margin-top: 2rem; font-size: 0.9em; color: #6c757d; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>参考文献上下文分析报告</h1>
-        <h2>论文: <em>{title}</em></h2>
-"""
-HTML_FOOTER = """
-    </div>
-    <div class="footer">
-        <p>报告生成于: {timestamp}</p>
-    </div>
-</body>
-</html>
-"""
+# 批处理预算：按估算 token 数将多篇参考文献合并为一次请求
+EXTRACTION_PROMPT_TOKEN_BUDGET = 32000
+# 输出预算需小于 llm_agent.MAX_OUTPUT_TOKENS，为估算误差留出余量；被截断的批次会为未完成的参考文献自动续写
+EXTRACTION_OUTPUT_TOKEN_BUDGET = 6000
+MAX_REFERENCES_PER_BATCH = 25
+REFERENCE_PARSING_OUTPUT_TOKEN_BUDGET = 6000
+MAX_BIBITEMS_PER_BATCH = 40
+# 为 True 时先用本地引用索引定位引用，仅对本地未能定位的参考文献调用 LLM
+USE_LOCAL_CITATION_LOCATOR = True
+# 为 True 时只解析 .bib 中被正文引用（含 \nocite）的条目
+PARSE_ONLY_CITED_BIB_ENTRIES = True
+# 发送给 LLM 的上下文窗口半径（命中段落前后各保留的段落数）；设为 None 则发送完整源码
+PROMPT_CONTEXT_RADIUS: Optional[int] = 1
+# 抽取请求的提示词布局: "split" 为默认布局（按 PROMPT_CONTEXT_RADIUS 发送摘录或完整源码）；
+# "prefix" 为前缀缓存友好布局：各批次共享完全相同的系统提示词与完整源码前缀，批次相关内容放在末尾，
+# 适用于支持提示词前缀缓存的服务端（如 DeepSeek 的上下文硬盘缓存），此时忽略 PROMPT_CONTEXT_RADIUS
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "split")
+# 步骤 3 至 5 流水线的队列容量：参考文献队列按组（一次解析产出的一组参考文献）计，报告写入队列按篇计。
+# 下游跟不上时上游在 put 处等待（背压），内存占用不随论文规模增长
+PIPELINE_QUEUE_SIZE = 8
+PIPELINE_RENDER_QUEUE_SIZE = 256
+# 同时处于引用上下文分析中的参考文献组数上限
+PIPELINE_MAX_INFLIGHT_CHUNKS = 4
+# 运行追踪（各阶段与每次 LLM 请求的 span）的输出路径，默认写入缓存目录；设为空字符串则不写文件。格式见 tracing.TRACE_FORMAT
+TRACE_OUTPUT_FILE = os.getenv("TRACE_OUTPUT_FILE", str(cache_handler.CACHE_DIR / "run_trace.json"))
 
 
 # NEW: 从 langchain_analysis_tool.py 移动过来的 Pydantic 模型
 class LatexAnalysisInput(BaseModel):
     """用於 LaTeX 分析工具的輸入模型。"""
     archive_path: str = Field(description="必須是指向 LaTeX 項目歸檔文件（如 .zip, .tar.gz）的有效路徑。")
+    incremental: bool = Field(default=False, description="是否啟用增量模式：僅重新分析相對上一修訂版有變化的參考文獻。")
+    project_id: Optional[str] = Field(default=None, description="增量模式使用的項目 ID；默認由歸檔文件名推斷。")
 
 
-def _clean_latex_for_llm(latex_content: str) -> str:
-    # ... (此函数保持不变) ...
-    print("   └── 正在对LaTeX源码进行预清理以优化分析...")
-    cleaned_content = re.sub(r'(?<!\\)%.*\n', '\n', latex_content)
-    cleaned_content = re.sub(r'\\begin{comment}(.*?)\\end{comment}', '', cleaned_content, flags=re.DOTALL)
-    return cleaned_content
-
-
-def render_html_from_data(all_references_data: list[dict]) -> str:
-    # ... (此函数保持不变) ...
-    html_parts = []
-    sorted_data = sorted(all_references_data, key=lambda x: x.get('id', 0))
-    for item in sorted_data:
-        key = item.get("key", "N/A")
-        title = item.get("inferred_title", item.get("title", "N/A"))
-        author = item.get("inferred_author", "作者信息未提取")
-        source = item.get("inferred_source", item.get("content", ""))
+async def iter_references_from_text_block(agent: llm_agent.LLMAgent, text_block: str) -> AsyncIterator[List[Dict]]:
+    """
+    解析 thebibliography 环境或 .bbl 文件中的参考文献，按可用的先后分组产出。
+    先用本地解析器处理并立即产出可靠解析的条目，其余条目按 token 预算分批交给 LLM，每个批次完成后立即产出，
+    下游的引用分析无需等待全部批次。
+    每篇参考文献的 id 为其在原文中的位置（从 1 开始），LLM 额外返回的条目排在最后；LLM 未返回的条目被丢弃，id 可能不连续。
+    """
+    parsed_items = await executors.run_in_process(parse_references_block, text_block)
+    if not parsed_items:
+        return
+    fallback_items = [item for item in parsed_items if not item["confident"]]
+    print(f"   └── 本地解析 {len(parsed_items) - len(fallback_items)}/{len(parsed_items)} 条参考文献，"
+          f"{len(fallback_items)} 条回退到 LLM（回退率 {len(fallback_items) / len(parsed_items):.1%}）。")
+    confident = [dict({k: v for k, v in item.items() if k != "confident"}, id=i)
+                 for i, item in enumerate(parsed_items, 1) if item["confident"]]
+    if confident:
+        yield confident
+    if not fallback_items:
+        return
 
-        item_html = f'<div class="reference-item"><h3>参考文献: <code>{key}</code></h3><blockquote><p><strong>作者:</strong> {author}</p><p><strong>标题:</strong> {title}</p><p><strong>来源:</strong> {source}</p></blockquote><h4>引用位置:</h4>'
+    bib_items = [item["content"] for item in fallback_items]
+    # 每个条目的输出约等于其原文（content 需逐字返回）加上少量字段开销
+    batches = plan_token_batches(
+        bib_items,
+        prompt_cost=llm_agent.estimate_tokens,
+        output_cost=lambda item: llm_agent.estimate_tokens(item) + 60,
+        prompt_budget=EXTRACTION_PROMPT_TOKEN_BUDGET,
+        output_budget=REFERENCE_PARSING_OUTPUT_TOKEN_BUDGET,
+        max_items=MAX_BIBITEMS_PER_BATCH,
+    )
+    print(f"   └── {len(bib_items)} 个条目分 {len(batches)} 个批次交由LLM处理。")
+    # LLM 的结果按键放回原文中的位置；同一键只保留最先返回的一条
+    positions = {item["key"]: i for i, item in enumerate(parsed_items, 1) if not item["confident"] and item["key"]}
+    seen_keys = set()
+    next_id = len(parsed_items)
+    tasks = [asyncio.ensure_future(agent.run_reference_parser_batch(batch)) for batch in batches]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            chunk = []
+            for ref in await finished:
+                key = ref.get('key')
+                if key and key in seen_keys:
+                    continue
+                if key:
+                    seen_keys.add(key)
+                if key in positions:
+                    ref['id'] = positions[key]
+                else:
+                    next_id += 1
+                    ref['id'] = next_id
+                chunk.append(ref)
+            if chunk:
+                yield chunk
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _locate_citations_locally(references: List[Dict], citation_index: CitationIndex,
+                              document: Optional[MergedDocument]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    用本地引用索引定位引用，结果写回参考文献字典。
 
-        if item.get("analysis_failed"):
-            item_html += '<p><em style="color: red;">此参考文献的上下文分析失败。</em></p>'
-        elif not item.get("citations"):
-            item_html += '<p><em>正文中未找到有效引用。</em></p>'
+    Returns:
+        Tuple[List[Dict], List[Dict]]: (已在本地定位的参考文献, 需要交由 LLM 的参考文献)。
+    """
+    located, remaining = [], []
+    for ref in references:
+        if ref['key'] in citation_index:
+            ref['citations'] = citation_index.citations_for(ref['key'])
+            if document is not None:
+                for citation, (start, _) in zip(ref['citations'], citation_index.positions_for(ref['key'])):
+                    if (location := document.locate_normalized(start)) is not None:
+                        citation['source_location'] = str(location)
+            located.append(ref)
         else:
-            item_html += '<ul>'
-            for i, citation in enumerate(item.get("citations", []), 1):
-                section = citation.get("section", "Unknown Section")
-                pre_context = citation.get("pre_context", "")
-                citation_sentence = citation.get("citation_sentence", "")
+            remaining.append(ref)
+    return located, remaining
 
-                escaped_key = re.escape(key)
-                pattern = r'(\\(?:cite|citep|citet|autocite)\*?\{[^{}]*?' + escaped_key + r'[^}]*?\})'
-                citation_sentence_html = re.sub(pattern, r'<strong>\1</strong>', citation_sentence)
 
-                post_context = citation.get("post_context", "")
-                item_html += f'<li><strong>位置 {i}:</strong><ul class="citation-context"><li><strong>章节:</strong> {section}</li><li><strong>前文:</strong> {pre_context}</li><li><strong>引文句:</strong> {citation_sentence_html}</li><li><strong>后文:</strong> {post_context}</li></ul></li>'
-            item_html += '</ul>'
+def _plan_extraction_batches(llm_references: List[Dict], cleaned_latex_content: str, slicer: ContextSlicer,
+                             use_excerpts: bool, shared_prefix: bool):
+    """
+    为需要 LLM 的参考文献规划请求批次（纯计算，不修改参考文献字典）。
 
-        item_html += '</div>'
-        html_parts.append(item_html)
+    Returns:
+        tuple: (源码中未出现的参考文献, 批次列表, 各批次的源码, key -> 缓存指纹, 完整源码的估算 token 数)。
+    """
+    full_source_tokens = llm_agent.estimate_tokens(cleaned_latex_content)
+    uncited, pending_references, citation_counts = [], [], {}
+    for ref in llm_references:
+        positions = slicer.find_key_positions(ref['key'])
+        if use_excerpts and not positions:
+            uncited.append(ref)
+            continue
+        citation_counts[ref['key']] = len(positions)
+        pending_references.append(ref)
+    if not pending_references:
+        return uncited, [], [], {}, full_source_tokens
+
+    # 每篇参考文献各自的源码摘录只计算一次：既用于估算批次大小，也用于计算其缓存键
+    reference_excerpts = {}
+    if use_excerpts:
+        reference_excerpts = {ref['key']: slicer.slice_for_keys([ref['key']], radius=PROMPT_CONTEXT_RADIUS)
+                              for ref in pending_references}
+    source_fingerprints = {key: cache_handler.content_digest(excerpt)
+                           for key, excerpt in reference_excerpts.items()}
+
+    def reference_prompt_cost(ref: Dict) -> int:
+        cost = llm_agent.estimate_tokens(json.dumps(ref, ensure_ascii=False))
+        if use_excerpts:
+            cost += llm_agent.estimate_tokens(reference_excerpts[ref['key']])
+        return cost
+
+    batches = plan_token_batches(
+        pending_references,
+        prompt_cost=reference_prompt_cost,
+        output_cost=lambda ref: estimate_extraction_output_tokens(citation_counts[ref['key']]),
+        # 前缀布局下重复的源码前缀由服务端缓存承担，预算只约束各批次独有的末尾部分
+        prompt_budget=EXTRACTION_PROMPT_TOKEN_BUDGET - (0 if use_excerpts or shared_prefix else full_source_tokens),
+        output_budget=EXTRACTION_OUTPUT_TOKEN_BUDGET,
+        max_items=MAX_REFERENCES_PER_BATCH,
+    )
+    if use_excerpts:
+        sources = [slicer.slice_for_keys([ref['key'] for ref in batch], radius=PROMPT_CONTEXT_RADIUS)
+                   for batch in batches]
+    else:
+        sources = [cleaned_latex_content] * len(batches)
+    return uncited, batches, sources, source_fingerprints, full_source_tokens
+
+
+async def analyze_reference_contexts(agent: llm_agent.LLMAgent, references: List[Dict], cleaned_latex_content: str,
+                                     slicer: Optional[ContextSlicer] = None,
+                                     document: Optional[MergedDocument] = None,
+                                     on_complete: Optional[Callable[[Dict], Awaitable[None]]] = None,
+                                     citation_index: Optional[CitationIndex] = None) -> None:
+    """
+    为给定的参考文献定位引用上下文，结果直接写回各参考文献字典（citations 或 analysis_failed）。
+    先使用本地引用索引，仅对本地无法定位的参考文献按 token 预算分批调用 LLM。
+    若提供了 document（cleaned_latex_content 为其规范化视图），本地定位的引用会附带源文件位置。
+    若提供了 on_complete（协程函数，如有界队列的 put），每篇参考文献的结果一经确定即以该参考文献字典调用一次
+    （LLM 批次按完成顺序）。分组多次调用时可传入预先构建的 slicer 与 citation_index，避免重复构建。
+    """
+    async def complete(ref: Dict) -> None:
+        if on_complete is not None:
+            await on_complete(ref)
 
-    return "".join(html_parts)
+    if not references:
+        return
+    llm_references = references
+    if USE_LOCAL_CITATION_LOCATOR:
+        if citation_index is None:
+            citation_index = await executors.run_compute(build_citation_index, cleaned_latex_content)
+        located, llm_references = await executors.run_compute(_locate_citations_locally, references,
+                                                                citation_index, document)
+        for ref in located:
+            await complete(ref)
+        print(f"   └── {len(references) - len(llm_references)} 条参考文献已在本地定位，"
+              f"{len(llm_references)} 条需要交由 LLM 进行语义分析。")
+
+    slicer = slicer or await executors.run_compute(ContextSlicer, cleaned_latex_content)
+    shared_prefix = PROMPT_LAYOUT == "prefix"
+    use_excerpts = PROMPT_CONTEXT_RADIUS is not None and not shared_prefix
+    uncited, batches, sources, source_fingerprints, full_source_tokens = await executors.run_compute(
+        _plan_extraction_batches, llm_references, cleaned_latex_content, slicer, use_excerpts, shared_prefix)
+    for ref in uncited:
+        # 源码中根本没有出现该键，无需调用 LLM
+        ref['citations'] = []
+        await complete(ref)
+    if not batches:
+        return
 
+    async def run_batch(batch: List[Dict], source: str) -> None:
+        chunk = await agent.run_extraction_batch(source, batch, source_is_excerpt=use_excerpts,
+                                                 source_fingerprints=source_fingerprints, shared_prefix=shared_prefix)
+        batch_results = merge_analysis_results([chunk])
+        for ref in batch:
+            if (result_data := batch_results.get(ref['key'])) is not None:
+                ref.update(result_data)
+            else:
+                ref['analysis_failed'] = True
+            await complete(ref)
 
-async def get_references_from_llm(agent: llm_agent.LLMAgent, text_block: str) -> List[Dict]:
-    # ... (此函数保持不变) ...
-    bib_items_raw = re.split(r'\\bibitem', text_block)[1:]
-    bib_items = ["\bibitem" + item for item in bib_items_raw if item.strip()]
-    if not bib_items:
-        return []
+    tasks = [run_batch(batch, source) for batch, source in zip(batches, sources)]
+    tokens_after = sum(llm_agent.estimate_tokens(source) for source in sources)
+    llm_count = sum(len(batch) for batch in batches)
+    print(f"   └── 批处理: {llm_count} 条参考文献合并为 {len(batches)} 个请求；"
+          f"预计源码输入 token 由 {full_source_tokens * llm_count} 降至 {tokens_after}。")
+    if shared_prefix and len(batches) > 1:
+        print(f"   └── 前缀缓存布局: 各请求共享约 {full_source_tokens} token 的源码前缀，"
+              f"其中约 {full_source_tokens * (len(batches) - 1)} token 可由服务端前缀缓存命中。")
+    await asyncio.gather(*tasks)
 
-    print(f"   └── 已将内容拆分为 {len(bib_items)} 个独立的参考文献条目，交由LLM处理。")
-    tasks = [agent.run_reference_parser("".join(bib_items[i:i + REFERENCE_PARSING_BATCH_SIZE])) for i in
-             range(0, len(bib_items), REFERENCE_PARSING_BATCH_SIZE)]
-    parsed_batches = await asyncio.gather(*tasks)
 
-    return [ref for batch in parsed_batches for ref in batch]
+class StageTimer:
+    """
+    按阶段累计耗时（秒）：start(name) 会结束上一个阶段并开始新的阶段。
+    处于运行追踪中时，每个阶段同时记录为一个 "stage.<name>" span，阶段内的 LLM 请求挂在其下。
+    应以 with 语句使用：离开作用域时结束当前阶段，因异常离开时对应的 span 会被标记为 error。
+    """
 
+    def __init__(self, timings: Optional[Dict[str, float]] = None):
+        self.timings = timings if timings is not None else {}
+        self._current: Optional[str] = None
+        self._started = 0.0
+        self._span: Optional[tracing.Span] = None
 
-# MODIFIED: 将原来的 main 函数重构为 LangChain Tool
-@tool(args_schema=LatexAnalysisInput)
-async def analyze_latex_references(archive_path: str) -> str:
-    """
-    分析指定的 LaTeX 項目歸檔文件，以提取所有參考文獻並找出它們在正文中的引用上下文。
+    def start(self, name: str) -> None:
+        self.stop()
+        self._current, self._started = name, time.perf_counter()
+        self._span = tracing.start_span(f"stage.{name}")
 
-    此工具會執行以下操作：
-    1. 解壓歸檔文件。
-    2. 智能合併所有 .tex 源文件。
-    3. 解析參考文獻列表（來自 .bib 或 .bbl 文件）。
-    4. 使用 LLM 遍歷源代碼，為每篇參考文獻定位所有引用點及其上下文。
-    5. 生成一份詳細的 HTML 報告。
+    def __enter__(self) -> "StageTimer":
+        return self
 
-    成功時返回報告路徑和摘要；失敗時返回錯誤信息。
-    """
-    print(f"--- 🚀 LangChain Tool: 'analyze_latex_references' 已啟動 ---")
-    print(f"--- 🎯 輸入文件: {archive_path} ---")
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # 阶段中途抛出异常（含取消）时，以该异常结束当前阶段的 span
+        self.stop(exc)
 
-    load_dotenv(".env")
-    api_key = os.getenv("DEEPSEEK_API_KEY")
-    if not api_key:
-        error_msg = "错误：请在.env文件中设置DEEPSEEK_API_KEY。"
-        print(f"--- ❌ 工具执行失败 ---")
-        print(error_msg)
-        return error_msg
+    def stop(self, error: Optional[BaseException] = None) -> None:
+        if self._current is not None:
+            elapsed = time.perf_counter() - self._started
+            self.timings[self._current] = self.timings.get(self._current, 0.0) + elapsed
+            self._current = None
+            tracing.end_span(self._span, error)
+            self._span = None
 
-    cache_handler.ensure_cache_dir_exists()
-    agent = llm_agent.LLMAgent(api_key=api_key)
 
-    try:
+def prepare_project(archive_path: str, extract_dir: str,
+                    parse_workers: Optional[int] = LATEX_PARSE_WORKERS,
+                    stage_timings: Optional[Dict[str, float]] = None) -> LatexProjectParser:
+    """
+    执行分析流程中同步、CPU 密集的部分（解压与项目结构解析），返回解析完成的 LatexProjectParser。
+    该函数不依赖事件循环，可以在进程池中运行；此时应将 parse_workers 设为 1，避免嵌套进程池。
+    若提供了 stage_timings，"extract" 与 "parse" 两个阶段的耗时会累加到其中。
+    """
+    with StageTimer(stage_timings) as timer:
         # MODIFIED: 直接使用传入的 archive_path，移除了自动查找文件的逻辑
         source_archive_path = Path(archive_path)
         if not source_archive_path.exists():
@@ -169,88 +315,359 @@ async def analyze_latex_references(archive_path: str) -> str:
 
         # Step 1: 解压
         print(f"\n步骤 1: 正在解压...", flush=True)
-        archive_handler.extract_archive(str(source_archive_path), EXTRACT_DIR)
+        timer.start("extract")
+        file_tree = None
+        if INGESTION_MODE == "extract":
+            archive_handler.extract_archive(str(source_archive_path), extract_dir, clean=True)
+        else:
+            file_tree = archive_handler.load_archive_tree(str(source_archive_path), extract_dir)
 
         # Step 2: 解析项目结构
         print(f"\n步骤 2: 正在解析项目结构...", flush=True)
-        parser = LatexProjectParser(EXTRACT_DIR)
+        timer.start("parse")
+        parser = LatexProjectParser(extract_dir, file_tree=file_tree, max_workers=parse_workers)
         parser.parse()
+        timer.stop()
 
-        full_latex_content = parser.latex_verbatim_content
-        if not full_latex_content or not parser.main_file:
+        if not parser.latex_verbatim_content or not parser.main_file:
             raise RuntimeError("解析项目失败，无法获取完整内容或主文件。")
+        return parser
+
 
-        cleaned_latex_content = _clean_latex_for_llm(full_latex_content)
+def _prepare_project_timed(archive_path: str, extract_dir: str,
+                           parse_workers: Optional[int]) -> Tuple[LatexProjectParser, Dict[str, float]]:
+    timings: Dict[str, float] = {}
+    parser = prepare_project(archive_path, extract_dir, parse_workers, stage_timings=timings)
+    return parser, timings
+
+
+async def prepare_project_async(archive_path: str, extract_dir: str, parse_workers: Optional[int] = 1,
+                                stage_timings: Optional[Dict[str, float]] = None) -> LatexProjectParser:
+    """
+    在共享的 CPU 进程池中执行 prepare_project，解压与 pylatexenc 解析期间事件循环可以继续处理其他请求。
+    prepare_project 已经运行在进程池的工作进程中，因此 parse_workers 默认为 1，避免在其中再开一个进程池。
+    子进程中的阶段耗时会合并到 stage_timings 中，并记录为一个 "stage.prepare" span。
+    """
+    with tracing.span("stage.prepare", archive=archive_path) as span:
+        parser, timings = await executors.run_in_process(_prepare_project_timed, archive_path, extract_dir,
+                                                         parse_workers)
+        if span is not None:
+            span.set(**{f"{name}_seconds": round(value, 6) for name, value in timings.items()})
+    if stage_timings is not None:
+        for name, value in timings.items():
+            stage_timings[name] = stage_timings.get(name, 0.0) + value
+    return parser
+
+
+async def _produce_references(agent: llm_agent.LLMAgent, parser: LatexProjectParser, cleaned_latex_content: str,
+                              manifest: Optional[ProjectManifest], output: asyncio.Queue,
+                              stage_timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """
+    流水线的第一阶段（步骤 3）：解析参考文献，每得到一组（已分配 id）即放入 output 队列。
 
-        # Step 3: 解析参考文献
+    Returns:
+        List[Dict]: 全部参考文献，按 id 排序。
+    """
+    with StageTimer(stage_timings) as timer:
         print("\n步骤 3: 正在解析参考文献...", flush=True)
-        all_references = []
+        timer.start("bib")
+        all_references: List[Dict] = []
+
+        async def emit(chunk: List[Dict]) -> None:
+            all_references.extend(chunk)
+            await output.put(chunk)
+
         if parser.bib_file_names:
-            print("   └── 策略: 找到 .bib 文件引用，使用 bibtexparser 精准解析。")
-            bib_paths = find_bib_file_paths(parser.bib_file_names, Path(EXTRACT_DIR))
+            print("   └── 策略: 找到 .bib 文件引用，使用本地 BibTeX 读取器精准解析。")
+            bib_paths = find_bib_file_paths(parser.bib_file_names, parser.base_dir, parser.file_index)
             if bib_paths:
-                all_references, _ = parse_bib_files(bib_paths)
+                cited_keys = None
+                if PARSE_ONLY_CITED_BIB_ENTRIES:
+                    cited_keys = await executors.run_compute(collect_cited_keys, cleaned_latex_content)
+                bib_references, _ = await executors.run_compute(parse_bib_files, bib_paths, parser.file_index,
+                                                                cited_keys)
+                for i, ref in enumerate(bib_references, 1):
+                    ref['id'] = i
+                if bib_references:
+                    await emit(bib_references)
 
         if not all_references:
-            print("   └── 策略: 回退到LLM解析 .bbl 或 .tex 内容。")
-            references_text_block = parser.the_bibliography_content or extract_references_from_bbl(parser.main_file)
+            print("   └── 策略: 回退到解析 .bbl 或 thebibliography 内容（本地解析优先，LLM 兜底）。")
+            references_text_block = parser.the_bibliography_content or await executors.run_in_thread(
+                extract_references_from_bbl, parser.main_file, parser.file_index)
             if not references_text_block:
                 raise ValueError("在项目中找不到任何参考文献信息。")
-            all_references = await get_references_from_llm(agent, references_text_block)
+            if manifest is not None and (cached := manifest.cached_references(references_text_block)) is not None:
+                print("   └── 增量模式: 参考文献原文未变化，复用上次的解析结果。")
+                for i, ref in enumerate(cached, 1):
+                    ref['id'] = i
+                await emit(cached)
+            else:
+                parsed = []
+                async for chunk in iter_references_from_text_block(agent, references_text_block):
+                    # 下游会把分析结果写回这些字典：先留存一份解析结果的副本供清单记录
+                    parsed.extend(dict(ref) for ref in chunk)
+                    await emit(chunk)
+                if manifest is not None:
+                    manifest.record_references(references_text_block, sorted(parsed, key=lambda ref: ref['id']))
 
         if not all_references:
             raise ValueError("未能解析出任何参考文献。")
+        await output.put(pipeline.END_OF_STREAM)
+        timer.stop()
+        print(f"✅ 成功获得 {len(all_references)} 条结构化参考文献。")
+        return sorted(all_references, key=lambda ref: ref['id'])
 
-        for i, ref in enumerate(all_references, 1):
-            ref['id'] = i
-        total_refs = len(all_references)
-        print(f"✅ 成功获得 {total_refs} 条结构化参考文献。")
-
-        # Step 4 & 5: 并发分析引用上下文
-        print(f"\n步骤 4 & 5: 正在并发分析引用上下文...", flush=True)
-        tasks = [agent.run_extraction_batch(cleaned_latex_content, [ref]) for ref in all_references]
-        structured_data_chunks = await asyncio.gather(*tasks)
-
-        # Step 6: 合并结果并生成报告
-        print("\n步骤 6: 正在合并结果并生成报告...", flush=True)
-        final_data_map = {ref['key']: ref for ref in all_references}
-        successful_extractions = 0
-
-        for i, chunk in enumerate(structured_data_chunks):
-            ref_key = all_references[i]['key']
-            if chunk and (results_list := chunk.get("analysis_results")) and isinstance(results_list, list) and len(
-                    results_list) > 0:
-                result_data = results_list[0]
-                if (key := result_data.get('key')) in final_data_map:
-                    if result_data.get("citations"):
-                        successful_extractions += 1
-                    final_data_map[key].update(result_data)
-            else:
-                final_data_map[ref_key]['analysis_failed'] = True
 
-        print(f"--- 分析摘要: 在 {total_refs} 个参考文献中，有 {successful_extractions} 个成功找到了至少一处引用。---")
+async def _analyze_references_stage(agent: llm_agent.LLMAgent, parser: LatexProjectParser, cleaned_latex_content: str,
+                                    manifest: Optional[ProjectManifest], fingerprints: Dict[str, str],
+                                    source: asyncio.Queue, output: asyncio.Queue,
+                                    stage_timings: Optional[Dict[str, float]] = None) -> None:
+    """
+    流水线的第二阶段（步骤 4 & 5）：每从 source 取到一组参考文献即开始定位其引用上下文（本地索引优先，LLM 兜底），
+    每篇完成的参考文献放入 output 队列。同时最多 PIPELINE_MAX_INFLIGHT_CHUNKS 组处于分析中，超过时不再从 source 取新的一组。
+    增量模式下指纹未变化的参考文献直接复用上次的结果，各参考文献的指纹记录到 fingerprints 中。
+    """
+    with StageTimer(stage_timings) as timer:
+        slicer = await executors.run_compute(ContextSlicer, cleaned_latex_content)
+        citation_index = None
+        if USE_LOCAL_CITATION_LOCATOR:
+            citation_index = await executors.run_compute(build_citation_index, cleaned_latex_content)
+        # 指纹覆盖参考文献条目本身、LLM 提示词中实际包含的源码（引用段落及其前后 PROMPT_CONTEXT_RADIUS 个段落；
+        # 发送完整源码时则为整篇源码的摘要）以及影响结果的分析配置
+        config = (f"{llm_agent.EXTRACTION_CACHE_NAMESPACE}:{USE_LOCAL_CITATION_LOCATOR}:{PROMPT_CONTEXT_RADIUS}"
+                  f":{PROMPT_LAYOUT}")
+        use_excerpts = PROMPT_CONTEXT_RADIUS is not None and PROMPT_LAYOUT != "prefix"
+        full_source_digest = None if use_excerpts else await executors.run_compute(
+            cache_handler.content_digest, cleaned_latex_content)
+
+        async def chunks() -> AsyncIterator[List[Dict]]:
+            first = True
+            async for chunk in pipeline.iterate(source):
+                if first:
+                    first = False
+                    print(f"\n步骤 4 & 5: 正在分析引用上下文...", flush=True)
+                    timer.start("llm")
+                yield chunk
+
+        async def analyze_chunk(chunk: List[Dict]) -> None:
+            references_to_analyze = chunk
+            if manifest is not None:
+                chunk_fingerprints = await executors.run_compute(lambda: {
+                    ref['key']: manifest.reference_fingerprint(
+                        ref, slicer.slice_for_keys([ref['key']], radius=PROMPT_CONTEXT_RADIUS) if use_excerpts
+                        else full_source_digest, config)
+                    for ref in chunk})
+                fingerprints.update(chunk_fingerprints)
+                references_to_analyze = manifest.reuse_results(chunk, chunk_fingerprints)
+                reanalyzed_keys = {ref['key'] for ref in references_to_analyze}
+                reused = [ref for ref in chunk if ref['key'] not in reanalyzed_keys]
+                if citation_index is not None and reused:
+                    # 指纹只覆盖引用段落附近的摘录，摘录之前的内容变化会让复用结果中的行号过期：重新在本地定位以刷新 source_location
+                    await executors.run_compute(_locate_citations_locally, reused, citation_index, parser.document)
+                for ref in reused:
+                    await output.put(ref)
+            await analyze_reference_contexts(agent, references_to_analyze, cleaned_latex_content, slicer,
+                                             parser.document, on_complete=output.put, citation_index=citation_index)
+
+        await pipeline.for_each_concurrently(chunks(), analyze_chunk, PIPELINE_MAX_INFLIGHT_CHUNKS)
+        timer.stop()
+        await output.put(pipeline.END_OF_STREAM)
+
+
+def _add_to_report(writer: file_writer.StreamingReportWriter, references: List[Dict]) -> None:
+    for ref in references:
+        writer.add(ref)
+
+
+async def _render_stage(writer: file_writer.StreamingReportWriter, source: asyncio.Queue) -> int:
+    """
+    流水线的第三阶段：将分析完成的参考文献追加到流式报告中，返回写入的篇数。
+    每次取出队列中已积压的全部参考文献，在 I/O 线程中一并渲染与追加（每次追加都是数次文件系统调用）。
+    """
+    rendered = 0
+    async for references in pipeline.iterate_batches(source):
+        await executors.run_in_thread(_add_to_report, writer, references)
+        rendered += len(references)
+    return rendered
 
-        full_html = render_html_from_data(list(final_data_map.values()))
-        title = parser.paper_title if parser.paper_title != "未找到标题" else "未命名文档"
-        header = HTML_HEADER.format(title=title)
-        footer = HTML_FOOTER.format(timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        file_writer.save_html_report(header + full_html + footer, OUTPUT_HTML_FILE)
 
-        print(f"\n🎉 工作流程完成！请在浏览器中打开 '{OUTPUT_HTML_FILE}' 查看报告。")
+async def analyze_prepared_project(agent: llm_agent.LLMAgent, archive_path: str, parser: LatexProjectParser,
+                                   output_html_file: str, incremental: bool = False,
+                                   project_id: Optional[str] = None,
+                                   stage_timings: Optional[Dict[str, float]] = None) -> str:
+    """
+    对已解析的项目执行参考文献解析、引用上下文分析与报告生成（步骤 3 至 6）。
+    多个项目可以共用同一个 agent，从而共用同一个 LLM 调度队列。
+    步骤 3 至 5 是通过有界队列相连的流水线，端到端耗时约为最慢的单条链路，而不是各步骤耗时之和。
+    较大的同步步骤都不在事件循环中执行：规范化、.bib 解析、引用索引、批次规划与最终报告在计算线程中执行
+    （它们操作本进程中的大对象，送往进程池的序列化开销会超过计算本身），缓存、清单与结果库的读写在 I/O 线程池中执行。
+    若提供了 stage_timings，"normalize"、"bib"、"llm" 与 "render" 各阶段的耗时会累加到其中；
+    流水线中 "bib" 与 "llm" 的计时区间会相互重叠。
+
+    Returns:
+        str: 对 Agent 友好的结果摘要。
+    """
+    manifest = None
+    if incremental:
+        manifest = await executors.run_in_thread(ProjectManifest.load, project_id or default_project_id(archive_path))
+        file_digests = await executors.run_compute(digest_project_files, parser.file_index)
+        added, changed, removed = manifest.diff_files(file_digests)
+        print(f"   └── 增量模式 [{manifest.project_id}]: 新增 {len(added)} 个文件，修改 {len(changed)} 个，"
+              f"删除 {len(removed)} 个。")
+
+    with StageTimer(stage_timings) as timer:
+        print("   └── 正在对LaTeX源码进行预清理以优化分析...")
+        timer.start("normalize")
+        cleaned_latex_content = await executors.run_compute(lambda: parser.document.normalized)
+        if parser.document.citation_macros:
+            print(f"   └── 已展开 {len(parser.document.citation_macros)} 个自定义引用宏: "
+                  f"{', '.join(sorted(parser.document.citation_macros))}")
+        timer.stop()
+
+        # 步骤 3 至 5 以流水线方式执行：参考文献解析、引用上下文分析与报告写入是三个通过有界队列相连的并发阶段。
+        # 每组参考文献解析完成后立即进入分析，每篇分析完成后立即写入报告（HTML 与 JSON 旁路文件）
+        title = parser.paper_title if parser.paper_title != "未找到标题" else "未命名文档"
+        writer = file_writer.StreamingReportWriter(output_html_file, render_header(title),
+                                                   render_footer("报告生成中…"), render_reference_html,
+                                                   metadata={"title": title})
+        try:
+            reference_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+            render_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_RENDER_QUEUE_SIZE)
+            fingerprints: Dict[str, str] = {}
+            all_references, _, _ = await pipeline.run_stages(
+                _produce_references(agent, parser, cleaned_latex_content, manifest, reference_queue, stage_timings),
+                _analyze_references_stage(agent, parser, cleaned_latex_content, manifest, fingerprints, reference_queue,
+                                          render_queue, stage_timings),
+                _render_stage(writer, render_queue),
+            )
+            total_refs = len(all_references)
+            final_data_map = {ref['key']: ref for ref in all_references}
+            print(f"   └── {agent.scheduler.describe()}")
+            if manifest is not None:
+                print(f"   └── 增量模式: 复用 {manifest.reused_count} 条参考文献的上次结果，"
+                      f"重新分析 {total_refs - manifest.reused_count} 条。")
+
+            # Step 6: 合并结果并生成报告
+            print("\n步骤 6: 正在合并结果并生成报告...", flush=True)
+            timer.start("render")
+            if manifest is not None:
+                manifest.record_results(all_references, fingerprints)
+                await executors.run_in_thread(manifest.save)
+
+            successful_extractions = sum(1 for ref in final_data_map.values() if ref.get("citations"))
+            for namespace, ns_stats in sorted(cache_handler.cache_stats().items()):
+                print(f"   └── 缓存统计 [{namespace}]: 命中 {ns_stats.get('hits', 0)}，未命中 {ns_stats.get('misses', 0)}，"
+                      f"条目 {ns_stats.get('entries', '-')}")
+            memory_stats = cache_handler.memory_stats()
+            print(f"   └── 内存缓存: 命中 {memory_stats['hits']}，未命中 {memory_stats['misses']}，"
+                  f"合并并发请求 {memory_stats['coalesced']}")
+            print(f"--- 分析摘要: 在 {total_refs} 个参考文献中，有 {successful_extractions} 个成功找到了至少一处引用。---")
+
+            footer = render_footer(f"报告生成于: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            # 最终报告与导出文件以序列化为主，与其他计算一样放在计算线程中
+            await executors.run_compute(writer.close, list(final_data_map.values()), footer)
+        except BaseException as e:
+            # 分析中途失败（含取消）：关闭报告文件，把“生成中”的尾部换成失败说明，已写出的参考文献保留在报告中
+            writer.abort(render_footer(f"报告生成失败: {e or type(e).__name__}"))
+            raise
+
+        # 结构化导出：逐参考文献与逐引用的 JSONL（及可选的 Parquet），并追加到跨论文结果库
+        paper_id = project_id or default_project_id(archive_path)
+        exported = await executors.run_compute(result_export.export_results,
+                                               str(Path(output_html_file).with_suffix('')),
+                                               paper_id, title, list(final_data_map.values()))
+        print(f"   └── 已导出结构化结果: {', '.join(p.name for p in exported)}")
+        if result_export.RESULTS_STORE_FILE:
+            # 报告与导出文件此时均已写出：结果库写入失败只影响跨论文查询，不应让整个分析失败
+            try:
+                run_id = await executors.run_in_thread(_append_to_results_store, paper_id, title,
+                                                       list(final_data_map.values()), archive_path)
+                print(f"   └── 已追加到结果库 '{result_export.RESULTS_STORE_FILE}' (run {run_id})")
+            except Exception as e:
+                print(f"⚠️ 警告: 追加到结果库 '{result_export.RESULTS_STORE_FILE}' 失败: {e}")
+        timer.stop()
+
+        print(f"\n🎉 工作流程完成！请在浏览器中打开 '{output_html_file}' 查看报告。")
 
         # MODIFIED: 返回对 Agent 友好的字符串摘要
-        summary = f"✅ 成功完成对 '{archive_path}' 的分析。报告已保存至 '{OUTPUT_HTML_FILE}'。共找到并处理了 {len(all_references)} 条参考文獻。"
-        print(f"--- ✨ 工具执行成功 ---")
-        print(summary)
+        summary = f"✅ 成功完成对 '{archive_path}' 的分析。报告已保存至 '{output_html_file}'（结构化结果见 '{writer.json_path}'）。共找到并处理了 {len(all_references)} 条参考文獻。"
+        if manifest is not None:
+            summary += f"其中 {manifest.reused_count} 条复用了上一修订版的分析结果。"
         return summary
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        error_summary = f"❌ 在分析 '{archive_path}' 過程中發生嚴重錯誤: {e}"
-        print(f"--- 💥 工具执行时发生异常 ---")
-        print(error_summary)
-        return error_summary
+
+def _append_to_results_store(paper_id: str, title: str, references: List[Dict], archive_path: str) -> int:
+    with result_export.ResultsStore(result_export.RESULTS_STORE_FILE) as store:
+        return store.append(paper_id, title, references, archive=archive_path)
+
+
+def report_trace(tracer: tracing.Tracer, trace_file: Optional[str] = None) -> None:
+    """打印运行追踪的摘要表，并按 TRACE_OUTPUT_FILE 写出追踪文件。"""
+    tracer.close()
+    print(f"\n--- 运行追踪摘要（总耗时 {tracer.root.duration:.2f}s）---")
+    print(tracer.format_summary())
+    trace_file = TRACE_OUTPUT_FILE if trace_file is None else trace_file
+    if trace_file:
+        path = tracer.write(trace_file)
+        print(f"   └── 运行追踪已保存至 '{path}'（格式: {tracing.TRACE_FORMAT}）")
+
+
+# MODIFIED: 将原来的 main 函数重构为 LangChain Tool
+@tool(args_schema=LatexAnalysisInput)
+async def analyze_latex_references(archive_path: str, incremental: bool = False, project_id: Optional[str] = None) -> str:
+    """
+    分析指定的 LaTeX 項目歸檔文件，以提取所有參考文獻並找出它們在正文中的引用上下文。
+
+    此工具會執行以下操作：
+    1. 解壓歸檔文件。
+    2. 智能合併所有 .tex 源文件。
+    3. 解析參考文獻列表（來自 .bib 或 .bbl 文件）。
+    4. 使用本地引用索引一次性定位所有引用點及其上下文，僅對本地無法定位的參考文獻調用 LLM。
+    5. 生成一份詳細的 HTML 報告。
+
+    增量模式下會讀取該項目上一次分析的清單，只重新分析條目或引用段落發生變化的參考文獻。
+
+    成功時返回報告路徑和摘要；失敗時返回錯誤信息。
+    """
+    print(f"--- 🚀 LangChain Tool: 'analyze_latex_references' 已啟動 ---")
+    print(f"--- 🎯 輸入文件: {archive_path} ---")
+
+    load_dotenv(".env")
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    if not api_key:
+        error_msg = "错误：请在.env文件中设置DEEPSEEK_API_KEY。"
+        print(f"--- ❌ 工具执行失败 ---")
+        print(error_msg)
+        return error_msg
+
+    cache_handler.ensure_cache_dir_exists()
+    agent = llm_agent.LLMAgent(api_key=api_key)
+
+    with tracing.trace("analyze_latex_references", archive=archive_path) as tracer:
+        monitor = executors.LoopLagMonitor().start()
+        try:
+            parser = await prepare_project_async(archive_path, EXTRACT_DIR, 1)
+            summary = await analyze_prepared_project(agent, archive_path, parser, OUTPUT_HTML_FILE,
+                                                     incremental=incremental, project_id=project_id)
+            print(f"--- ✨ 工具执行成功 ---")
+            print(summary)
+            return summary
+
+        except Exception as e:
+            tracer.root.status = "error"
+            import traceback
+            traceback.print_exc()
+            error_summary = f"❌ 在分析 '{archive_path}' 過程中發生嚴重錯誤: {e}"
+            print(f"--- 💥 工具执行时发生异常 ---")
+            print(error_summary)
+            return error_summary
+
+        finally:
+            await monitor.stop()
+            tracer.root.set(**{f"loop_{name}": value for name, value in monitor.stats().items()})
+            print(f"   └── {monitor.describe()}")
+            report_trace(tracer)
 
 
 # MODIFIED: 更新 main block 以便直接测试新的 LangChain tool
@@ -0,0 +1,162 @@
+# merged_document.py
+
+import bisect
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from latex_preprocessor import CitationMacroExpander
+
+# 与旧版 main._clean_latex_for_llm 相同的两趟清理：行注释替换为换行，comment 环境整体删除
+_LINE_COMMENT_PATTERN = re.compile(r'(?<!\\)%.*\n')
+_COMMENT_ENV_PATTERN = re.compile(r'\\begin{comment}(.*?)\\end{comment}', re.DOTALL)
+
+
+class SourceLocation(NamedTuple):
+    """合并文档中某个位置对应的源文件位置（行号与列号均从 1 开始）。"""
+    file: str
+    line: int
+    column: int
+
+    def __str__(self) -> str:
+        return f"{self.file}:{self.line}"
+
+
+def _apply_spans(text: str, spans: List[Tuple[int, int, str]]) -> Tuple[str, List[int], List[int]]:
+    """
+    按顺序将互不重叠的 (起点, 终点, 替换文本) 应用到 text，同时返回偏移锚点：
+    new_anchors[i] 处的结果文本对应原文本的 old_anchors[i]，两个锚点之间的偏移线性对应。
+    """
+    pieces, new_anchors, old_anchors = [], [0], [0]
+    last, new_pos = 0, 0
+    for start, end, replacement in spans:
+        pieces.append(text[last:start])
+        new_pos += start - last
+        # 替换文本整体映射到被替换内容的起点
+        new_anchors.append(new_pos)
+        old_anchors.append(start)
+        pieces.append(replacement)
+        new_pos += len(replacement)
+        last = end
+        new_anchors.append(new_pos)
+        old_anchors.append(last)
+    pieces.append(text[last:])
+    return "".join(pieces), new_anchors, old_anchors
+
+
+def _substitute_with_map(text: str, pattern: re.Pattern, replacement: str) -> Tuple[str, List[int], List[int]]:
+    """等价于 pattern.sub(replacement, text)，同时返回偏移锚点。"""
+    return _apply_spans(text, [(m.start(), m.end(), replacement) for m in pattern.finditer(text)])
+
+
+def _map_back(position: int, new_anchors: List[int], old_anchors: List[int]) -> int:
+    i = bisect.bisect_right(new_anchors, position) - 1
+    return old_anchors[i] + (position - new_anchors[i])
+
+
+class MergedDocument:
+    """
+    按文档顺序合并的项目源码，只构建一次。
+    保存每个文件在合并文本中的起始偏移，可将任意位置映射回 (文件, 行, 列)；
+    行索引、去除注释后的视图以及展开引用宏后的规范化视图均在首次使用时计算并缓存。
+    """
+
+    SEPARATOR = "\n"
+
+    def __init__(self, parts: List[Tuple[Path, str]], base_dir: Optional[Path] = None):
+        """
+        Args:
+            parts (List[Tuple[Path, str]]): 按文档顺序排列的 (文件路径, 文件内容)。
+            base_dir (Path, optional): 项目根目录；提供时源文件位置以相对路径表示。
+        """
+        self.files: List[str] = []
+        self.file_starts: List[int] = []
+        offset = 0
+        for path, content in parts:
+            if base_dir is not None:
+                path = Path(path).relative_to(base_dir)
+            self.files.append(Path(path).as_posix())
+            self.file_starts.append(offset)
+            offset += len(content) + len(self.SEPARATOR)
+        self.text: str = self.SEPARATOR.join(content for _, content in parts)
+        self._line_starts: Optional[List[int]] = None
+        self._stripped: Optional[str] = None
+        self._stripped_maps: List[Tuple[List[int], List[int]]] = []
+        self._normalized: Optional[str] = None
+        self._normalized_map: Tuple[List[int], List[int]] = ([0], [0])
+        self.citation_macros: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def __str__(self) -> str:
+        return self.text
+
+    def slice(self, start: int, end: int) -> str:
+        return self.text[start:end]
+
+    @property
+    def line_starts(self) -> List[int]:
+        """每一行在合并文本中的起始偏移。"""
+        if self._line_starts is None:
+            self._line_starts = [0] + [m.end() for m in re.finditer('\n', self.text)]
+        return self._line_starts
+
+    def line_of(self, position: int) -> int:
+        """合并文本中某个位置所在的行号（从 0 开始）。"""
+        return bisect.bisect_right(self.line_starts, position) - 1
+
+    def locate(self, position: int) -> Optional[SourceLocation]:
+        """将合并文本中的位置映射为源文件位置。"""
+        if not self.files or not 0 <= position <= len(self.text):
+            return None
+        file_idx = bisect.bisect_right(self.file_starts, position) - 1
+        line = self.line_of(position)
+        file_first_line = self.line_of(self.file_starts[file_idx])
+        return SourceLocation(self.files[file_idx], line - file_first_line + 1,
+                              position - self.line_starts[line] + 1)
+
+    def _build_stripped(self) -> None:
+        text, self._stripped_maps = self.text, []
+        for pattern, replacement in ((_LINE_COMMENT_PATTERN, '\n'), (_COMMENT_ENV_PATTERN, '')):
+            text, new_anchors, old_anchors = _substitute_with_map(text, pattern, replacement)
+            self._stripped_maps.append((new_anchors, old_anchors))
+        self._stripped = text
+
+    @property
+    def comment_stripped(self) -> str:
+        """去除 LaTeX 注释后的视图（与旧版 _clean_latex_for_llm 的结果完全相同），只计算一次。"""
+        if self._stripped is None:
+            self._build_stripped()
+        return self._stripped
+
+    def locate_stripped(self, position: int) -> Optional[SourceLocation]:
+        """将去注释视图中的位置映射为源文件位置。"""
+        if self._stripped is None:
+            self._build_stripped()
+        for new_anchors, old_anchors in reversed(self._stripped_maps):
+            position = _map_back(position, new_anchors, old_anchors)
+        return self.locate(position)
+
+    def _build_normalized(self) -> None:
+        stripped = self.comment_stripped
+        expander = CitationMacroExpander.from_source(stripped)
+        self.citation_macros = {name: d.body for name, d in expander.macros.items()}
+        self._normalized, new_anchors, old_anchors = _apply_spans(stripped, expander.find_expansions(stripped))
+        self._normalized_map = (new_anchors, old_anchors)
+
+    @property
+    def normalized(self) -> str:
+        """
+        规范化视图：在去注释视图的基础上展开用户定义的引用宏并移除其定义，
+        使 \\citeref{a} 之类的写法以标准引用命令的形式出现。只计算一次。
+        """
+        if self._normalized is None:
+            self._build_normalized()
+        return self._normalized
+
+    def locate_normalized(self, position: int) -> Optional[SourceLocation]:
+        """将规范化视图中的位置映射为源文件位置。"""
+        if self._normalized is None:
+            self._build_normalized()
+        return self.locate_stripped(_map_back(position, *self._normalized_map))
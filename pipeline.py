@@ -0,0 +1,69 @@
+# pipeline.py
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Set, TypeVar
+
+T = TypeVar("T")
+
+# 队列结束标记：上游阶段产出完毕后放入，下游的 iterate() 随即结束
+END_OF_STREAM = object()
+
+
+async def iterate(queue: asyncio.Queue) -> AsyncIterator[Any]:
+    """逐个取出队列中的条目，直到遇到 END_OF_STREAM。"""
+    while (item := await queue.get()) is not END_OF_STREAM:
+        yield item
+
+
+async def iterate_batches(queue: asyncio.Queue) -> AsyncIterator[List[Any]]:
+    """每次取出队列中当前已有的全部条目（至少一个）作为一批产出，直到遇到 END_OF_STREAM。"""
+    while True:
+        batch = [await queue.get()]
+        while not queue.empty() and batch[-1] is not END_OF_STREAM:
+            batch.append(queue.get_nowait())
+        if batch[-1] is END_OF_STREAM:
+            if len(batch) > 1:
+                yield batch[:-1]
+            return
+        yield batch
+
+
+async def for_each_concurrently(items: AsyncIterator[T], func: Callable[[T], Awaitable[None]], limit: int) -> None:
+    """
+    对 items 中的每个条目并发执行 func，同时最多 limit 个。
+    达到上限时暂停从 items 取新条目，从而经由有界队列向上游施加背压。任一调用失败时取消其余调用并抛出该异常。
+    """
+    running: Set[asyncio.Future] = set()
+    try:
+        async for item in items:
+            while len(running) >= limit:
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            running.add(asyncio.ensure_future(func(item)))
+        while running:
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+async def run_stages(*stages: Awaitable[Any]) -> List[Any]:
+    """
+    并发运行流水线的各个阶段（通过有界 asyncio.Queue 相连的协程），按传入顺序返回各阶段的结果。
+    任一阶段失败时取消其余阶段并抛出该异常，避免上游阻塞在已满的队列上、下游永远等待结束标记。
+    """
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+        return [task.result() for task in tasks]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 LATEX_REFERENCE_PARSER_PROMPT = """
 # 角色
 你是一个高精度的LaTeX `thebibliography` 解析引擎。你唯一的功能是将 `\bibitem` 条目转换为结构化的JSON对象。
@@ -27,39 +29,46 @@ LATEX_REFERENCE_PARSER_PROMPT = """
 最终命令
 立即生成JSON对象。在JSON之前或之后，不要包含任何文本、解释或Markdown格式。
 """
-def get_latex_extraction_prompt(start_key: str, end_key: str) -> str:
+def get_latex_extraction_prompt(start_key: Optional[str] = None, end_key: Optional[str] = None) -> str:
 # --- MODIFIED: 最终强化版的主提取Prompt ---
+    # 不提供键时返回与批次无关的共享版本：所有批次的系统提示词字节完全相同，可被服务端的前缀缓存复用
+    if start_key is None:
+        batch_scope = "完整列表见用户消息末尾的参考文献批次"
+        example_key = "citation_key"
+    else:
+        batch_scope = f"从 {start_key} 到 {end_key}，完整列表见用户消息中的参考文献批次"
+        example_key = start_key
     return f"""
     角色
     你是一位顶尖的LaTeX学术研究助理AI，专注于极致精确的数据提取和高度一致的格式化输出。
     核心任务
-    你的唯一任务是，对一个完整的LaTeX项目源码，为指定的参考文献（{start_key}），进行地毯式、穷尽式的搜索，找出每一个引用上下文，并生成一份结构化的JSON分析报告。
+    你的唯一任务是，对一个完整的LaTeX项目源码，为当前批次中的每一篇参考文献（{batch_scope}），进行地毯式、穷尽式的搜索，找出每一个引用上下文，并生成一份结构化的JSON分析报告。
     强制搜索与提取方法论 (必须严格遵守)
-    全文档扫描: 对于参考文献 {start_key}，必须从源码的第一个字符扫描到最后一个字符。
+    全文档扫描: 对于批次中的每一篇参考文献，必须从源码的第一个字符扫描到最后一个字符。
     识别所有引用命令变体: \\cite, \\citep, \\citet, \\cite*, \\citep*, \\citet*, \\Citet, \\Citep, \\autocite, \\parencite, \\textcite 等。
     上下文提取规则 (至关重要):
     定义句子: 一个句子严格地从一个大写字母开始，到第一个句号(.)、问号(?)或感叹号(!)结束。绝不能包含多个句子。
-    引文句 (citation_sentence): 包含对 {start_key} 引用命令的那一个完整的句子。
+    引文句 (citation_sentence): 包含对当前参考文献引用命令的那一个完整的句子。
     前文 (pre_context): 紧邻“引文句”之前的那个完整、独立的句子。如果引文句是段落的第一句，则此字段为空字符串 ""。
     后文 (post_context): 紧邻“引文句”之后的那个完整、独立的句子。如果引文句是段落的最后一句，则此字段为空字符串 ""。
     确保无重叠: “前文”、“引文句”、“后文”三者之间绝不得有任何内容重叠。
     章节定位: 向上追溯源码，找到最近的 \\section{{...}} 或 \\subsection{{...}} 命令，提取其纯文本标题作为 section 字段。如果找不到，则使用 "Unknown Section"。
     内容清理与格式:
     清理所有上下文文本中的LaTeX格式化命令（如 \\textit{{...}}），但保留数学公式。
-    关键: 必须完整保留所有的引用命令本身（如 \\cite{{{start_key}}}），绝不能将它们渲染成最终的文本格式 (如 "(Author, Year)")。
+    关键: 必须完整保留所有的引用命令本身（如 \\cite{{{example_key}}}），绝不能将它们渲染成最终的文本格式 (如 "(Author, Year)")。
     过滤规则: 忽略任何在 LaTeX 注释行 (% 开头) 或 comment 环境中的引用。
-    多重引用处理: 如果一个引用命令 (例如 \\cite{{{start_key}}}, key2}}) 包含了多个键，你必须为当前正在处理的 {start_key} 生成一条独立的 citation 记录。
+    多重引用处理: 如果一个引用命令 (例如 \\cite{{{example_key}, key2}}) 包含了多个键，你必须为批次中涉及的每一个键分别生成一条独立的 citation 记录。
     输出格式 (Output Format)
     至关重要: 你的输出必须是且仅是一个单一、有效的JSON对象。
-    JSON对象必须有一个根键 "analysis_results"，其值为一个列表。
-    如果文献 {start_key} 在正文中绝对没有有效引用，则其 citations 列表应为空 []。
+    JSON对象必须有一个根键 "analysis_results"，其值为一个列表，批次中的每一篇参考文献对应列表中的一个对象，顺序与批次一致。
+    如果某篇文献在正文中绝对没有有效引用，则其 citations 列表应为空 []，但该文献的对象仍必须出现在列表中。
     JSON 结构示例:
     code
     JSON
     {{
       "analysis_results": [
         {{
-          "key": "{start_key}",
+          "key": "{example_key}",
           "inferred_author": "推断出的作者",
           "inferred_title": "推断出的标题",
           "inferred_source": "推断出的来源",
@@ -67,7 +76,7 @@ def get_latex_extraction_prompt(start_key: str, end_key: str) -> str:
             {{
               "section": "Introduction",
               "pre_context": "这是一个前文句子。",
-              "citation_sentence": "这是包含引用的句子 \\\\cite{{{start_key}}}。",
+              "citation_sentence": "这是包含引用的句子 \\\\cite{{{example_key}}}。",
               "post_context": "这是一个后文句子。"
             }}
           ]
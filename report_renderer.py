@@ -0,0 +1,148 @@
+# report_renderer.py
+
+import html
+import re
+from functools import lru_cache
+from typing import Any, FrozenSet, Iterable, Tuple
+
+from citation_locator import build_citation_pattern
+
+# 报告中用于高亮引文句里引用命令的正则（与本地引用索引识别同一组引用命令），整个进程只编译一次
+_CITATION_REGEX = re.compile(build_citation_pattern())
+# 缓存的不同引文句（及上下文段落）数上限；同一句引用多篇文献时，各篇共享一次扫描与转义的结果
+HIGHLIGHT_CACHE_SIZE = 8192
+
+# --- HTML 模板 ---
+HTML_HEADER = """
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>参考文献分析报告 - {title}</title>
+    <style>
+        body {{ font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif; line-height: 1.6; color: #333; background-color: #f8f9fa; margin: 0; padding: 20px; }}
+        .container {{ max-width: 900px; margin: 0 auto; background-color: #fff; padding: 2rem; border-radius: 8px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1); }}
+        h1, h2, h3 {{ color: #0056b3; }}
+        h1 {{ border-bottom: 2px solid #dee2e6; padding-bottom: 0.5rem; margin-bottom: 1rem; text-align: center; }}
+        h2 em {{ font-weight: normal; color: #555; font-size: 0.8em; }}
+        .references {{ display: flex; flex-direction: column; }}
+        .reference-item {{ margin-bottom: 2rem; padding: 1.5rem; border: 1px solid #e9ecef; border-radius: 6px; background-color: #ffffff; transition: box-shadow 0.3s ease; }}
+        .reference-item:hover {{ box-shadow: 0 8px 16px rgba(0,0,0,0.1); }}
+        blockquote {{ margin: 0; padding: 1rem; background-color: #f8f9fa; border-left: 5px solid #007bff; }}
+        ul {{ padding-left: 20px; }}
+        li {{ margin-bottom: 0.5rem; }}
+        code {{ background-color: #e9ecef; color: #d63384; padding: 2px 4px; border-radius: 3px; }}
+        .citation-context li strong:first-child {{ color: #28a745; }}
+        .citation-context strong {{ color: #d9534f; }}
+        .footer {{ text-align: center; margin-top: 2rem; font-size: 0.9em; color: #6c757d; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>参考文献上下文分析报告</h1>
+        <h2>论文: <em>{title}</em></h2>
+        <div class="references">
+"""
+HTML_FOOTER = """
+        </div>
+    </div>
+    <div class="footer">
+        <p>{status}</p>
+    </div>
+</body>
+</html>
+"""
+
+# 单篇参考文献与单处引用的模板：模块加载时取出绑定的 format 方法，渲染时只做一次填充
+_render_reference = (
+    '<div class="reference-item" style="order: {order}"><h3>参考文献: <code>{key}</code></h3>'
+    '<blockquote><p><strong>作者:</strong> {author}</p><p><strong>标题:</strong> {title}</p>'
+    '<p><strong>来源:</strong> {source}</p></blockquote><h4>引用位置:</h4>{body}</div>'
+).format
+_render_citation = (
+    '<li><strong>位置 {index}:</strong>{location}<ul class="citation-context">'
+    '<li><strong>章节:</strong> {section}</li><li><strong>前文:</strong> {pre_context}</li>'
+    '<li><strong>引文句:</strong> {sentence}</li><li><strong>后文:</strong> {post_context}</li></ul></li>'
+).format
+_render_location = ' <code>{}</code>'.format
+_ANALYSIS_FAILED_HTML = '<p><em style="color: red;">此参考文献的上下文分析失败。</em></p>'
+_NO_CITATIONS_HTML = '<p><em>正文中未找到有效引用。</em></p>'
+
+
+@lru_cache(maxsize=HIGHLIGHT_CACHE_SIZE)
+def _escape_text(text: str) -> str:
+    # 前后文段落通常被同一段中的多处引用共享，转义结果按文本缓存
+    return html.escape(text)
+
+
+def _escape(value: Any) -> str:
+    """转义来自源码或模型输出的文本；None 渲染为空串。"""
+    return "" if value is None else _escape_text(str(value))
+
+
+@lru_cache(maxsize=HIGHLIGHT_CACHE_SIZE)
+def _citation_segments(sentence: str) -> Tuple[Tuple[str, FrozenSet[str]], ...]:
+    """
+    单次扫描引文句，将其切分为已转义的片段。
+    引用命令片段附带其引用的键集合，普通文本片段的键集合为空。
+    """
+    segments, last = [], 0
+    for match in _CITATION_REGEX.finditer(sentence):
+        segments.append((html.escape(sentence[last:match.start()]), frozenset()))
+        keys = frozenset(k.strip() for k in match.group('cite_keys').split(',') if k.strip())
+        segments.append((html.escape(match.group(0)), keys))
+        last = match.end()
+    segments.append((html.escape(sentence[last:]), frozenset()))
+    return tuple(segments)
+
+
+def highlight_citation(sentence: Any, key: str) -> str:
+    """转义引文句，并加粗其中引用了 key 的引用命令。"""
+    if not sentence:
+        return ""
+    return "".join(f'<strong>{text}</strong>' if key in keys else text
+                   for text, keys in _citation_segments(str(sentence)))
+
+
+def render_header(title: str) -> str:
+    return HTML_HEADER.format(title=_escape(title))
+
+
+def render_footer(status: str) -> str:
+    return HTML_FOOTER.format(status=_escape(status))
+
+
+def render_reference_html(item: dict) -> str:
+    """渲染单篇参考文献的 HTML 块；order 样式使流式追加的块仍按 id 显示。"""
+    key = item.get("key", "N/A")
+    if item.get("analysis_failed"):
+        body = _ANALYSIS_FAILED_HTML
+    elif not item.get("citations"):
+        body = _NO_CITATIONS_HTML
+    else:
+        body = '<ul>' + "".join(
+            _render_citation(
+                index=i,
+                location=_render_location(_escape(location)) if (location := citation.get("source_location")) else '',
+                section=_escape(citation.get("section", "Unknown Section")),
+                pre_context=_escape(citation.get("pre_context", "")),
+                sentence=highlight_citation(citation.get("citation_sentence", ""), key),
+                post_context=_escape(citation.get("post_context", "")),
+            )
+            for i, citation in enumerate(item["citations"], 1)
+        ) + '</ul>'
+    return _render_reference(
+        order=_escape(item.get("id", 0)),
+        key=_escape(key),
+        author=_escape(item.get("inferred_author", "作者信息未提取")),
+        title=_escape(item.get("inferred_title", item.get("title", "N/A"))),
+        source=_escape(item.get("inferred_source", item.get("content", ""))),
+        body=body,
+    )
+
+
+def render_html_from_data(all_references_data: Iterable[dict]) -> str:
+    """按 id 顺序渲染全部参考文献的 HTML 块。"""
+    sorted_data = sorted(all_references_data, key=lambda x: x.get('id', 0))
+    return "".join(render_reference_html(item) for item in sorted_data)
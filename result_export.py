@@ -0,0 +1,280 @@
+# result_export.py
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet 导出为可选功能
+    pyarrow = None
+
+import cache_handler
+
+# 导出格式: 逗号分隔的 "jsonl" / "parquet"；parquet 需要安装 pyarrow，未安装时自动跳过
+RESULTS_EXPORT_FORMATS = tuple(f.strip() for f in os.getenv("RESULTS_EXPORT_FORMATS", "jsonl,parquet").split(",")
+                               if f.strip())
+# 跨论文结果库（SQLite）的路径，默认与 LLM 缓存一起放在缓存目录中；设为空字符串则不写入
+RESULTS_STORE_FILE = os.getenv("RESULTS_STORE_FILE", str(cache_handler.CACHE_DIR / "results.sqlite3"))
+
+REFERENCE_FIELDS = ("paper_id", "paper_title", "ref_id", "ref_key", "title", "author", "source",
+                    "analysis_failed", "citation_count")
+CITATION_FIELDS = ("paper_id", "ref_key", "position", "section", "pre_context", "citation_sentence",
+                   "post_context", "source_location")
+
+
+def flatten_results(paper_id: str, paper_title: str,
+                    references: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    将分析结果展开为两张扁平的表：每篇参考文献一行，以及每处引用一行。
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: (参考文献记录, 引用记录)，按参考文献 id 排序。
+    """
+    reference_rows, citation_rows = [], []
+    for ref in sorted(references, key=lambda r: r.get('id', 0)):
+        citations = [c for c in ref.get("citations") or [] if isinstance(c, dict)]
+        reference_rows.append({
+            "paper_id": paper_id,
+            "paper_title": paper_title,
+            "ref_id": ref.get("id"),
+            "ref_key": ref.get("key"),
+            "title": ref.get("inferred_title", ref.get("title")),
+            "author": ref.get("inferred_author"),
+            "source": ref.get("inferred_source", ref.get("content")),
+            "analysis_failed": bool(ref.get("analysis_failed")),
+            "citation_count": len(citations),
+        })
+        for position, citation in enumerate(citations, 1):
+            citation_rows.append({
+                "paper_id": paper_id,
+                "ref_key": ref.get("key"),
+                "position": position,
+                "section": citation.get("section"),
+                "pre_context": citation.get("pre_context"),
+                "citation_sentence": citation.get("citation_sentence"),
+                "post_context": citation.get("post_context"),
+                "source_location": citation.get("source_location"),
+            })
+    return reference_rows, citation_rows
+
+
+def _replace_atomically(path: Path, write) -> None:
+    tmp_path = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_jsonl(path: Path, rows: List[Dict[str, Any]]) -> None:
+    """以每行一个 JSON 对象的形式写出记录（原子替换）。"""
+    def write(tmp_path: Path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')))
+                f.write('\n')
+    _replace_atomically(path, write)
+
+
+def _arrow_schema(fields: Tuple[str, ...]):
+    types = {"ref_id": pyarrow.int64(), "position": pyarrow.int64(), "citation_count": pyarrow.int64(),
+             "analysis_failed": pyarrow.bool_()}
+    return pyarrow.schema([(name, types.get(name, pyarrow.string())) for name in fields])
+
+
+def write_parquet(path: Path, rows: List[Dict[str, Any]], fields: Tuple[str, ...]) -> bool:
+    """写出 Parquet 文件；未安装 pyarrow 时返回 False。"""
+    if pyarrow is None:
+        return False
+    table = pyarrow.Table.from_pylist(rows, schema=_arrow_schema(fields))
+    _replace_atomically(path, lambda tmp_path: pyarrow.parquet.write_table(table, str(tmp_path)))
+    return True
+
+
+def export_results(output_prefix: str, paper_id: str, paper_title: str, references: Iterable[Dict[str, Any]],
+                   formats: Iterable[str] = RESULTS_EXPORT_FORMATS) -> List[Path]:
+    """
+    导出结构化结果：<prefix>.references.<ext> 与 <prefix>.citations.<ext>。
+
+    Args:
+        output_prefix (str): 输出文件的路径前缀（通常为 HTML 报告去掉扩展名）。
+        paper_id (str): 论文 ID，写入每条记录以便跨论文聚合。
+        paper_title (str): 论文标题。
+        references (Iterable[Dict[str, Any]]): 分析完成的参考文献。
+        formats (Iterable[str]): 导出格式，支持 "jsonl" 与 "parquet"。
+
+    Returns:
+        List[Path]: 实际写出的文件。
+    """
+    reference_rows, citation_rows = flatten_results(paper_id, paper_title, references)
+    prefix = Path(output_prefix)
+    prefix.parent.mkdir(parents=True, exist_ok=True)
+    written = []
+    for fmt in formats:
+        for table, rows, fields in (("references", reference_rows, REFERENCE_FIELDS),
+                                    ("citations", citation_rows, CITATION_FIELDS)):
+            path = prefix.with_name(f"{prefix.name}.{table}.{fmt}")
+            if fmt == "jsonl":
+                write_jsonl(path, rows)
+            elif fmt == "parquet":
+                if not write_parquet(path, rows, fields):
+                    print("   └── 未安装 pyarrow，跳过 Parquet 导出。")
+                    break
+            else:
+                print(f"   └── 不支持的导出格式: {fmt}")
+                break
+            written.append(path)
+    return written
+
+
+class ResultsStore:
+    """
+    跨论文的只追加结果库（SQLite，WAL 模式）。
+    每次分析写入一个新的 run；历史 run 从不修改或删除，查询默认只看每篇论文最新的一次 run。
+    参考文献与引用表按论文、参考文献键与章节建立索引，语料增长后跨论文查询仍然只需走索引。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            paper_id TEXT NOT NULL,
+            paper_title TEXT,
+            archive TEXT,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS reference_results (
+            run_id INTEGER NOT NULL REFERENCES runs (run_id),
+            paper_id TEXT NOT NULL,
+            ref_id INTEGER,
+            ref_key TEXT,
+            title TEXT,
+            author TEXT,
+            source TEXT,
+            analysis_failed INTEGER NOT NULL,
+            citation_count INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS citation_results (
+            run_id INTEGER NOT NULL REFERENCES runs (run_id),
+            paper_id TEXT NOT NULL,
+            ref_key TEXT,
+            position INTEGER NOT NULL,
+            section TEXT,
+            pre_context TEXT,
+            citation_sentence TEXT,
+            post_context TEXT,
+            source_location TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_runs_paper ON runs (paper_id, run_id);
+        CREATE INDEX IF NOT EXISTS idx_reference_results_run ON reference_results (run_id);
+        CREATE INDEX IF NOT EXISTS idx_reference_results_paper ON reference_results (paper_id, ref_key);
+        CREATE INDEX IF NOT EXISTS idx_reference_results_key ON reference_results (ref_key);
+        CREATE INDEX IF NOT EXISTS idx_citation_results_run ON citation_results (run_id);
+        CREATE INDEX IF NOT EXISTS idx_citation_results_paper ON citation_results (paper_id, ref_key);
+        CREATE INDEX IF NOT EXISTS idx_citation_results_key ON citation_results (ref_key);
+        CREATE INDEX IF NOT EXISTS idx_citation_results_section ON citation_results (section);
+        CREATE VIEW IF NOT EXISTS latest_runs AS
+            SELECT MAX(run_id) AS run_id, paper_id FROM runs GROUP BY paper_id;
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+
+    def __enter__(self) -> "ResultsStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def append(self, paper_id: str, paper_title: str, references: Iterable[Dict[str, Any]],
+               archive: Optional[str] = None) -> int:
+        """在一个事务中追加一次分析的全部结果，返回新的 run_id。"""
+        reference_rows, citation_rows = flatten_results(paper_id, paper_title, references)
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (paper_id, paper_title, archive, created_at) VALUES (?, ?, ?, ?)",
+                (paper_id, paper_title, archive, time.time()))
+            run_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO reference_results (run_id, paper_id, ref_id, ref_key, title, author, source, "
+                "analysis_failed, citation_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, r["paper_id"], r["ref_id"], r["ref_key"], r["title"], r["author"], r["source"],
+                  int(r["analysis_failed"]), r["citation_count"]) for r in reference_rows])
+            self._conn.executemany(
+                "INSERT INTO citation_results (run_id, paper_id, ref_key, position, section, pre_context, "
+                "citation_sentence, post_context, source_location) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, c["paper_id"], c["ref_key"], c["position"], c["section"], c["pre_context"],
+                  c["citation_sentence"], c["post_context"], c["source_location"]) for c in citation_rows])
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return run_id
+
+    def query_citations(self, paper_id: Optional[str] = None, ref_key: Optional[str] = None,
+                        section: Optional[str] = None, latest_only: bool = True,
+                        limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        按论文、参考文献键与章节（均为精确匹配，None 表示不限）查询引用记录。
+
+        Args:
+            latest_only (bool): 只返回每篇论文最新一次 run 的结果。
+            limit (int, optional): 最多返回的记录数。
+        """
+        conditions, params = [], []
+        for column, value in (("paper_id", paper_id), ("ref_key", ref_key), ("section", section)):
+            if value is not None:
+                conditions.append(f"c.{column} = ?")
+                params.append(value)
+        if latest_only:
+            conditions.append("c.run_id IN (SELECT run_id FROM latest_runs)")
+        sql = "SELECT c.* FROM citation_results AS c"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY c.run_id, c.ref_key, c.position"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def citing_papers(self, ref_key: str) -> List[Dict[str, Any]]:
+        """返回（最新 run 中）引用了某个参考文献键的论文及各自的引用次数。"""
+        rows = self._conn.execute(
+            "SELECT r.paper_id, runs.paper_title, r.citation_count FROM reference_results AS r "
+            "JOIN runs ON runs.run_id = r.run_id "
+            "WHERE r.ref_key = ? AND r.run_id IN (SELECT run_id FROM latest_runs) ORDER BY r.paper_id",
+            (ref_key,))
+        return [dict(row) for row in rows]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="查询跨论文的引用上下文结果库。")
+    arg_parser.add_argument("--db", default=RESULTS_STORE_FILE, help="结果库路径。")
+    arg_parser.add_argument("--paper", help="论文 ID。")
+    arg_parser.add_argument("--key", help="参考文献键。")
+    arg_parser.add_argument("--section", help="章节标题。")
+    arg_parser.add_argument("--all-runs", action="store_true", help="包含历史 run 的结果。")
+    arg_parser.add_argument("--limit", type=int, default=50, help="最多输出的记录数。")
+    args = arg_parser.parse_args()
+
+    with ResultsStore(args.db) as store:
+        for row in store.query_citations(args.paper, args.key, args.section,
+                                         latest_only=not args.all_runs, limit=args.limit):
+            print(json.dumps(row, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
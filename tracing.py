@@ -0,0 +1,226 @@
+# tracing.py
+
+import contextvars
+import json
+import os
+import secrets
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# 运行追踪的输出格式: "json" 为本项目的扁平 span 列表；"otlp" 为 OpenTelemetry OTLP/JSON（可直接导入 Jaeger 等工具）
+TRACE_FORMAT = os.getenv("TRACE_FORMAT", "json")
+# 为 True 时不再打印热路径上的逐请求/逐缓存条目日志（调用 LLM、token 用量、命中缓存等），只保留阶段进度、警告与摘要
+QUIET_MODE = os.getenv("QUIET_MODE", "0") == "1"
+# 摘要表中按求和方式汇总的数值属性
+SUMMED_ATTRIBUTES = ("prompt_tokens", "prompt_cache_hit_tokens", "completion_tokens", "retries",
+                     "queue_seconds", "cache_hits", "cache_misses", "cost")
+
+_current_tracer: contextvars.ContextVar[Optional["Tracer"]] = contextvars.ContextVar("tracer", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+
+
+def detail(message: str) -> None:
+    """打印热路径上的细节日志；QUIET_MODE 下直接丢弃。"""
+    if not QUIET_MODE:
+        print(message)
+
+
+class Span:
+    """一次计时的操作：阶段、LLM 请求等。属性为可 JSON 序列化的标量。"""
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "start_unix", "attributes", "status", "_token")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.start_unix = time.time()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.status = "ok"
+        self._token: Optional[contextvars.Token] = None
+
+    @property
+    def duration(self) -> float:
+        return ((self.end if self.end is not None else time.perf_counter()) - self.start)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, name: str, amount: float = 1) -> None:
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "span_id": self.span_id, "parent_id": self.parent_id,
+                "start": round(self.start_unix, 6), "duration": round(self.duration, 6),
+                "status": self.status, "attributes": self.attributes}
+
+
+class Tracer:
+    """
+    收集一次运行（一篇论文）的全部 span。
+
+    当前 tracer 与当前 span 保存在 contextvars 中：asyncio 任务创建时复制上下文，
+    因此并发的 LLM 请求会自动挂到创建它们的阶段 span 之下，多篇论文并发分析时也互不干扰。
+    """
+
+    def __init__(self, name: str, **attributes: Any):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self.root = self._open(name, None, attributes)
+
+    def _open(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Span:
+        span = Span(name, parent.span_id if parent else None, attributes)
+        self.spans.append(span)
+        return span
+
+    def close(self) -> None:
+        if self.root.end is None:
+            self.root.end = time.perf_counter()
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"trace_id": self.trace_id, "name": self.root.name, "duration": round(self.root.duration, 6),
+                "summary": self.summary(), "spans": [span.to_dict() for span in self.spans]}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """转换为 OTLP/JSON（ExportTraceServiceRequest）结构。"""
+        def attribute(key: str, value: Any) -> Dict[str, Any]:
+            if isinstance(value, bool):
+                typed = {"boolValue": value}
+            elif isinstance(value, int):
+                typed = {"intValue": str(value)}
+            elif isinstance(value, float):
+                typed = {"doubleValue": value}
+            else:
+                typed = {"stringValue": str(value)}
+            return {"key": key, "value": typed}
+
+        spans = []
+        for span in self.spans:
+            start_ns = int(span.start_unix * 1e9)
+            spans.append({
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "kind": 3 if span.name.startswith("llm.") else 1,  # SPAN_KIND_CLIENT / SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(start_ns + int(span.duration * 1e9)),
+                "attributes": [attribute(k, v) for k, v in span.attributes.items()],
+                "status": {"code": 1 if span.status == "ok" else 2},
+            })
+        return {"resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", "llm-latex-check")]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+        }]}
+
+    def write(self, path: str, trace_format: str = TRACE_FORMAT) -> Path:
+        """将追踪写为 JSON 文件；trace_format 为 "otlp" 时写 OTLP/JSON。"""
+        self.close()
+        payload = self.to_otlp() if trace_format == "otlp" else self.to_json()
+        output = Path(path)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        return output
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """按 span 名汇总: 次数、总耗时（秒）与各数值属性之和。"""
+        rows: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            row = rows.setdefault(span.name, {"count": 0, "seconds": 0.0, "errors": 0})
+            row["count"] += 1
+            row["seconds"] = round(row["seconds"] + span.duration, 6)
+            row["errors"] += span.status != "ok"
+            for name in SUMMED_ATTRIBUTES:
+                if isinstance(value := span.attributes.get(name), (int, float)):
+                    row[name] = row.get(name, 0) + value
+        return rows
+
+    def format_summary(self) -> str:
+        """生成在运行结束时打印的摘要表。"""
+        columns = (("count", "次数"), ("seconds", "耗时(s)"), ("prompt_tokens", "输入token"),
+                   ("prompt_cache_hit_tokens", "前缀命中"), ("completion_tokens", "输出token"),
+                   ("retries", "重试"), ("queue_seconds", "排队(s)"), ("cache_hits", "缓存命中"),
+                   ("cache_misses", "缓存未命中"), ("cost", "费用"), ("errors", "失败"))
+        lines = [f"{'span':<24}" + "".join(f"{title:>12}" for _, title in columns)]
+        for name, row in self.summary().items():
+            cells = []
+            for key, _ in columns:
+                value = row.get(key)
+                if value is None:
+                    cells.append(f"{'-':>12}")
+                elif key in ("seconds", "queue_seconds"):
+                    cells.append(f"{value:>12.3f}")
+                elif key == "cost":
+                    cells.append(f"{value:>12.4f}")
+                else:
+                    cells.append(f"{int(value):>12}")
+            lines.append(f"{name:<24}" + "".join(cells))
+        return "\n".join(lines)
+
+
+@contextmanager
+def trace(name: str, **attributes: Any) -> Iterator[Tracer]:
+    """开始一次运行追踪；其作用域内的 start_span/span 调用都会被记录到返回的 Tracer 中。"""
+    tracer = Tracer(name, **attributes)
+    tracer_token = _current_tracer.set(tracer)
+    span_token = _current_span.set(tracer.root)
+    try:
+        yield tracer
+    except BaseException:
+        tracer.root.status = "error"
+        raise
+    finally:
+        tracer.close()
+        _current_span.reset(span_token)
+        _current_tracer.reset(tracer_token)
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _current_tracer.get()
+
+
+def start_span(name: str, **attributes: Any) -> Optional[Span]:
+    """
+    开始一个子 span 并将其设为当前 span；未处于追踪中时返回 None（所有操作退化为空操作）。
+    必须在同一上下文中用 end_span 结束。
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        return None
+    span = tracer._open(name, _current_span.get(), attributes)
+    span._token = _current_span.set(span)
+    return span
+
+
+def end_span(span: Optional[Span], error: Optional[BaseException] = None) -> None:
+    if span is None or span.end is not None:
+        return
+    span.end = time.perf_counter()
+    if error is not None:
+        span.status = "error"
+        span.attributes["error"] = type(error).__name__
+    if span._token is not None:
+        _current_span.reset(span._token)
+        span._token = None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """以上下文管理器的形式记录一个 span。"""
+    current = start_span(name, **attributes)
+    try:
+        yield current
+    except BaseException as e:
+        end_span(current, e)
+        raise
+    end_span(current)
+
+
+def count(name: str, amount: float = 1) -> None:
+    """为当前 span 的计数属性（如 cache_hits、retries）累加 amount；未处于追踪中时什么也不做。"""
+    if (current := _current_span.get()) is not None:
+        current.add(name, amount)